@@ -1,29 +1,34 @@
 import json
 from collections import defaultdict
-from datetime import date
+from datetime import date, datetime
 
 import jwt
 import jwt.exceptions
 from allauth.account.models import EmailAddress
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core import signing
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models import Q, prefetch_related_objects
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.views.generic import DetailView, ListView, View
 from django.views.generic.detail import SingleObjectMixin
 
 import ws.utils.geardb as geardb_utils
 import ws.utils.perms as perm_utils
 import ws.utils.signups as signup_utils
-from ws import enums, models
+from ws import enums, models, tasks
 from ws.decorators import group_required
 from ws.templatetags.avatar_tags import avatar_url
 from ws.utils.api import jwt_token_from_headers
-from ws.views import AllLeadersView, TripLeadersOnlyView
+from ws.utils.prefix_cache import PrefixCache
+from ws.views import AllLeadersView, TripLeadersOnlyView, TripListView
 
 
 class SimpleSignupsView(DetailView):
@@ -62,22 +67,79 @@ class SimpleSignupsView(DetailView):
 
 
 class FormatSignupMixin:
-    def describe_signup(self, signup, trip_participants, other_trips):
+    def describe_signups(self, trip, signups, trip_participants=None):
+        """Describe each of the trip's signups for the participant-selecting modal.
+
+        Everything needed to describe the signups is loaded for all of them
+        at once, making for the same handful of queries no matter how many
+        signups there are (waitlists on Winter School trips can be long!).
+
+        :param trip: The trip to which all signups belong
+        :param signups: models.SignUp instances (either on trip or waitlisted)
+        :param trip_participants: All Participants that are on the same trip
+                                  (by default, the participants of `signups`)
+        """
+        signups = list(signups)
+        if not signups:
+            return []
+
+        # Identifies reciprocal pairings (no queries if already selected)
+        prefetch_related_objects(
+            signups, 'participant__lotteryinfo__paired_with__lotteryinfo'
+        )
+        participants = [s.participant for s in signups]
+        par_pks = [par.pk for par in participants]
+        if trip_participants is None:
+            trip_participants = set(participants)
+
+        feedback_by_par = defaultdict(list)
+        for feedback in models.Feedback.objects.filter(
+            participant_id__in=par_pks
+        ).select_related('leader', 'trip'):
+            feedback_by_par[feedback.participant_id].append(feedback)
+
+        missed_lectures = set(
+            models.Participant.objects.filter(pk__in=par_pks)
+            .missed_lectures_for(trip)
+            .values_list('pk', flat=True)
+        )
+        other_trips_by_par = dict(
+            trip.other_trips_by_participant(for_participants=participants)
+        )
+
+        return [
+            self.describe_signup(
+                signup,
+                trip_participants,
+                other_trips_by_par[signup.participant_id],
+                feedback=feedback_by_par[signup.participant_id],
+                missed_lectures=signup.participant_id in missed_lectures,
+            )
+            for signup in signups
+        ]
+
+    def describe_signup(
+        self, signup, trip_participants, other_trips, feedback, missed_lectures
+    ):
         """Yield everything used in the participant-selecting modal.
 
         The signup object should come with related models already selected,
-        or this could result in a _lot_ of extra queries.
+        or this could result in a _lot_ of extra queries. Use
+        `describe_signups()`, which loads everything needed in bulk.
 
         :param signup: An models.SignUp instance (either on trip or waitlisted)
         :param trip_participants: All Participants that are on the same trip
         :param other_trips: Other trips they're on this weekend(ish)
+        :param feedback: All (recent) feedback given to the participant
+        :param missed_lectures: If the participant missed lectures for the trip
         """
         par = signup.participant
 
         # In rare cases, a trip creator can be a participant on their own trip
         # Be sure we hide feedback from them if this is the case
         hide_feedback = signup.participant == self.request.participant
-        feedback = [] if hide_feedback else par.feedback_set.all()
+        if hide_feedback:
+            feedback = []
 
         try:
             lotteryinfo = par.lotteryinfo
@@ -94,7 +156,7 @@ class FormatSignupMixin:
         return {
             'id': signup.id,
             'participant': {'id': par.id, 'name': par.name, 'email': par.email},
-            'missed_lectures': par.missed_lectures_for(signup.trip),
+            'missed_lectures': missed_lectures,
             'feedback': [
                 {
                     'showed_up': f.showed_up,
@@ -217,6 +279,7 @@ class AdminTripSignupsView(SingleObjectMixin, FormatSignupMixin, TripLeadersOnly
         # Clear the trip first (delete removals, set others to not on trip)
         # Both methods (update and skip_signals) ignore waitlist-bumping
         keep_on_trip.update(on_trip=False)
+        models.Trip.objects.filter(pk=trip.pk).recount_on_trip()
         for kill_signup in to_delete:
             kill_signup.skip_signals = True
             kill_signup.delete()
@@ -228,36 +291,17 @@ class AdminTripSignupsView(SingleObjectMixin, FormatSignupMixin, TripLeadersOnly
             signup_utils.trip_or_wait(signup, trip_must_be_open=False)
             signup_utils.next_in_order(signup, order)
 
-    def get_signups(self):
-        """Trip signups with selected models for use in describe_signup."""
-        trip = self.get_object()
-        return (
-            trip.on_trip_or_waitlisted.select_related(
-                'participant', 'participant__lotteryinfo__paired_with__lotteryinfo'
-            )
-            .prefetch_related(
-                'participant__feedback_set',
-                'participant__feedback_set__leader',
-                'participant__feedback_set__trip',
-            )
-            .order_by('-on_trip', 'waitlistsignup', 'last_updated')
-        )
+    def get_signups(self, trip):
+        """Trip signups with selected models for use in describe_signups."""
+        return trip.on_trip_or_waitlisted.select_related(
+            'participant', 'participant__lotteryinfo__paired_with__lotteryinfo'
+        ).order_by('-on_trip', 'waitlistsignup', 'last_updated')
 
     def describe_all_signups(self):
         """Get information about the trip's signups."""
-        trip = self.get_object()
-        signups = self.get_signups()
-        trip_participants = {s.participant for s in signups}
-
-        other_trips_by_par = dict(trip.other_trips_by_participant())
-
+        trip = self.object = self.get_object()
         return {
-            'signups': [
-                self.describe_signup(
-                    s, trip_participants, other_trips_by_par[s.participant_id]
-                )
-                for s in self.get_signups()
-            ],
+            'signups': self.describe_signups(trip, self.get_signups(trip)),
             'leaders': list(trip.leaders.values('name', 'email')),
             'creator': {'name': trip.creator.name, 'email': trip.creator.email},
         }
@@ -309,38 +353,148 @@ class LeaderParticipantSignupView(
             for s in trip.on_trip_or_waitlisted.select_related('participant')
         }
 
-        other_trips_by_par = dict(
-            trip.other_trips_by_participant(for_participants=[par])
-        )
-        other_trips = other_trips_by_par[par.pk]
+        (description,) = self.describe_signups(trip, [signup], trip_participants)
 
         # signup: descriptor, agnostic of presence on the trip or waiting list
         # on_trip: a boolean to place this signup in the right place
         #          (either at the bottom of the trip list or waiting list)
         return JsonResponse(
             {
-                'signup': self.describe_signup(signup, trip_participants, other_trips),
+                'signup': description,
                 'on_trip': signup.on_trip,
             },
             status=201,
         )
 
 
+class JsonTripsView(TripListView):
+    """Stream trips (optionally after a given date), newest first, a page at a time.
+
+    Pages use keyset pagination: every page ends with a cursor identifying
+    its last trip, and the next page resumes just past that trip. Unlike
+    offsets, this stays cheap arbitrarily deep into history, and trips created
+    between requests never shift or duplicate results on later pages.
+    """
+
+    ordering = ["-trip_date", "-time_created", "-pk"]
+    page_size = 100
+    max_page_size = 500
+
+    cursor_salt = 'ws.api_views.JsonTripsView'
+
+    @classmethod
+    def cursor_for(cls, trip):
+        """Return an opaque token identifying the trip's place in the listing."""
+        return signing.dumps(
+            [trip.trip_date.isoformat(), trip.time_created.isoformat(), trip.pk],
+            salt=cls.cursor_salt,
+        )
+
+    @classmethod
+    def trips_after_cursor(cls, trips, cursor):
+        """Filter to trips listed after the one identified by the cursor.
+
+        Raises:
+            signing.BadSignature: The cursor was not one we issued.
+        """
+        trip_date, time_created, pk = signing.loads(cursor, salt=cls.cursor_salt)
+        trip_date = date.fromisoformat(trip_date)
+        time_created = datetime.fromisoformat(time_created)
+        return trips.filter(trip_date__lte=trip_date).filter(
+            Q(trip_date__lt=trip_date)
+            | Q(trip_date=trip_date, time_created__lt=time_created)
+            | Q(trip_date=trip_date, time_created=time_created, pk__lt=pk)
+        )
+
+    @staticmethod
+    def describe_trip(trip):
+        return {
+            'id': trip.pk,
+            'name': trip.name,
+            'program': trip.program,
+            'trip_type': trip.trip_type,
+            'trip_date': trip.trip_date,
+            'level': trip.level,
+            'maximum_participants': trip.maximum_participants,
+            'num_signups': trip.num_signups,
+            'signups_on_trip': trip.signups_on_trip,
+            'leaders': (
+                trip.summary.leaders_with_rating if hasattr(trip, 'summary') else []
+            ),
+        }
+
+    def _page_size(self):
+        try:
+            page_size = int(self.request.GET.get('page_size', self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def _stream_page(self, trips, page_size):
+        """Yield a JSON document of the page's trips, serializing one at a time."""
+        yield '{"trips": ['
+        last_trip = None
+        # Fetch one extra trip just to learn if there's another page
+        for i, trip in enumerate(trips[: page_size + 1].iterator()):
+            if i == page_size:
+                break
+            if last_trip:
+                yield ', '
+            yield json.dumps(self.describe_trip(trip), cls=DjangoJSONEncoder)
+            last_trip = trip
+        else:
+            last_trip = None  # Final page; there's nothing left to resume from
+
+        cursor = last_trip and self.cursor_for(last_trip)
+        yield f'], "next": {json.dumps(cursor)}}}'
+
+    def get(self, request, *args, **kwargs):
+        trips = self.get_queryset()
+
+        on_or_after_date, date_invalid = self._optionally_filter_from_args()
+        if date_invalid:
+            return JsonResponse({'message': 'Invalid date'}, status=400)
+        if on_or_after_date:
+            trips = trips.filter(trip_date__gte=on_or_after_date)
+
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                trips = self.trips_after_cursor(trips, cursor)
+            except signing.BadSignature:
+                return JsonResponse({'message': 'Invalid cursor'}, status=400)
+
+        return StreamingHttpResponse(
+            self._stream_page(trips, self._page_size()),
+            content_type='application/json',
+        )
+
+
+# Results of the most common searches (e.g. first few keystrokes) are reused
+participant_search_cache = PrefixCache(maxsize=settings.PARTICIPANT_SEARCH_CACHE_SIZE)
+
+
 class JsonParticipantsView(ListView):
     model = models.Participant
 
-    def top_matches(self, search=None, exclude_self=False, max_results=20):
-        participants = self.get_queryset()
+    max_results = 20
+
+    def _search(self, text):
+        # Fetch one extra, in case the viewer must be excluded from matches
+        participants = self.get_queryset().search(text)[: self.max_results + 1]
+        return list(self._serialize_participants(participants))
+
+    def top_matches(self, search=None, exclude_self=False):
         if search:
-            # This search is not indexed, or particularly advanced
-            # TODO: Use Postgres FTS, either in raw SQL or through ORM
-            # (Django 1.10 introduces support for full-text search)
-            match = Q(name__icontains=search) | Q(email__icontains=search)
-            participants = participants.filter(match)
-        if exclude_self:
-            participants = participants.exclude(pk=self.request.participant.pk)
+            matches = participant_search_cache.get_or_search(search, self._search)
+        else:
+            participants = self.get_queryset()[: self.max_results + 1]
+            matches = list(self._serialize_participants(participants))
 
-        yield from self._serialize_participants(participants[:max_results])
+        if exclude_self:
+            self_pk = self.request.participant.pk
+            matches = [par for par in matches if par['id'] != self_pk]
+        yield from matches[: self.max_results]
 
     def from_pk(self, participant_ids):
         participants = self.get_queryset().filter(pk__in=participant_ids)
@@ -548,6 +702,56 @@ class UserRentalsView(UserView):
         return JsonResponse({'rentals': rented_items})
 
 
+class TripRentalsView(SingleObjectMixin, View):
+    """Describe all items rented by the trip's leaders & participants.
+
+    Rentals come only from the cache, so this never waits on the gear database.
+    If any cached rentals are missing or stale, they're cached anew in the
+    background (and the response indicates that they're being refreshed).
+    """
+
+    model = models.Trip
+
+    def get(self, request, *args, **kwargs):
+        trip = self.object
+        rentals_by_par, stale = geardb_utils.cached_trip_rentals(trip)
+        if stale:
+            tasks.update_trip_rentals.delay(trip.pk)
+
+        return JsonResponse(
+            {
+                'rentals': [
+                    {
+                        'participant': {'id': par.pk, 'name': par.name},
+                        'items': [
+                            {
+                                'id': r.id,
+                                'name': r.name,
+                                'cost': r.cost,
+                                'checkedout': r.checkedout,
+                                'overdue': r.overdue,
+                            }
+                            for r in rentals
+                        ],
+                    }
+                    for par, rentals in rentals_by_par
+                ],
+                'refreshing': stale,
+            }
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        """Only leaders (or the trip's chairs) may see rentals."""
+        trip = self.object = self.get_object()
+        if not (
+            perm_utils.leader_on_trip(request.participant, trip, True)
+            or perm_utils.is_leader(request.user)
+            or perm_utils.chair_or_admin(request.user, trip.required_activity_enum())
+        ):
+            return JsonResponse({}, status=403)
+        return super().dispatch(request, *args, **kwargs)
+
+
 class JWTView(View):
     """Superclass for views that use JWT's for auth & signed payloads."""
 
@@ -578,10 +782,18 @@ class UpdateMembershipView(JWTView):
     def post(self, request, *args, **kwargs):
         """Receive a message that the user's membership was updated."""
 
-        participant = models.Participant.from_email(self.payload['email'])
+        email = self.payload['email']
+        participant = models.Participant.from_email(email)
         if not participant:  # Not in our system, nothing to do
+            geardb_utils.membership_cache.invalidate([email])
             return JsonResponse({})
 
+        # The membership may have been found under any of the user's emails.
+        # (Other processes instead notice the membership's new `last_cached`)
+        geardb_utils.membership_cache.invalidate(
+            [email, *geardb_utils.verified_emails(participant.user)]
+        )
+
         keys = ('membership_expires', 'waiver_expires')
         update_fields = {
             key: date.fromisoformat(self.payload[key])
@@ -593,6 +805,18 @@ class UpdateMembershipView(JWTView):
         return JsonResponse({}, status=201 if created else 200)
 
 
+class UpdateRentalsView(JWTView):
+    def post(self, request, *args, **kwargs):
+        """Receive a message that the user's rentals changed, and cache them anew."""
+
+        participant = models.Participant.from_email(self.payload['email'])
+        if not participant:  # Not in our system, nothing to do
+            return JsonResponse({})
+
+        tasks.update_participant_rentals.delay(participant.pk)
+        return JsonResponse({}, status=202)
+
+
 class OtherVerifiedEmailsView(JWTView):
     def get(self, request, *args, **kwargs):
         """Return any other verified emails that tie to the same user."""
@@ -623,14 +847,30 @@ class MembershipStatusesView(View):
 
         # Span databases to map from participants -> users -> email addresses
         participants = models.Participant.objects.filter(pk__in=par_pks)
-        user_to_par = dict(participants.values_list('user_id', 'pk'))
+        user_to_par = {}
+        membership_updated_at = {}  # Key: user ID
+        for user_id, par_pk, last_cached in participants.values_list(
+            'user_id', 'pk', 'membership__last_cached'
+        ):
+            user_to_par[user_id] = par_pk
+            if last_cached:
+                membership_updated_at[user_id] = last_cached
         email_addresses = EmailAddress.objects.filter(
             user_id__in=user_to_par, verified=True
         )
         email_to_user = dict(email_addresses.values_list('email', 'user_id'))
 
         # Gives email -> membership info for all matches
-        matches = geardb_utils.matching_memberships(email_to_user)
+        # (Leaders load these often, so we're fine with results cached briefly,
+        # so long as the gear database hasn't since reported an update)
+        matches = geardb_utils.membership_cache.matching_memberships(
+            email_to_user,
+            updated_at={
+                email: membership_updated_at[user_id]
+                for email, user_id in email_to_user.items()
+                if user_id in membership_updated_at
+            },
+        )
 
         # Default to blank memberships in case not found
         participant_memberships = {
@@ -653,12 +893,40 @@ class MembershipStatusesView(View):
         return super().dispatch(request, *args, **kwargs)
 
 
+def _membership_stats_etag(request, *args, **kwargs):
+    last_cached = (
+        models.MembershipStats.objects.filter(pk=1)
+        .values_list('last_cached', flat=True)
+        .first()
+    )
+    return last_cached and f'membership-stats-{last_cached.timestamp()}'
+
+
 class RawMembershipStatsView(View):
-    @staticmethod
-    def get(request, *args, **kwargs):
-        return JsonResponse(
-            {'members': list(geardb_utils.membership_information().values())}
-        )
+    """Give stats about all current members, as last computed.
+
+    Stats are computed on a schedule (they take full scans of both the gear
+    database and all trips). If they've never been computed, computation is
+    started and clients are told to retry later. Clients may revalidate with
+    `If-None-Match`, and are told that stats have not changed without sending
+    them again.
+    """
+
+    @method_decorator(condition(etag_func=_membership_stats_etag))
+    def get(self, request, *args, **kwargs):
+        try:
+            stats = models.MembershipStats.objects.get(pk=1)
+        except models.MembershipStats.DoesNotExist:  # (Only before the first run)
+            # Computing stats takes a while; don't tie up this request doing so.
+            tasks.update_membership_stats.delay()
+            response = JsonResponse({}, status=503)
+            response['Retry-After'] = 60
+            return response
+
+        response = JsonResponse({'members': stats.members})
+        # Cache, but check back every time (stats may be computed again at any time)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
     @method_decorator(group_required('leaders'))
     def dispatch(self, request, *args, **kwargs):
@@ -0,0 +1,31 @@
+"""
+Authentication backends which load the user along with what most requests need.
+
+We do a lot of group-centric logic - if the user's groups aren't prefetched,
+then we can easily have n+1 queries. Most views also need the participant, and
+every page checks their membership & password quality. Every request loads its
+user with `get_user()`, so we load all of that there (in just two queries).
+"""
+from allauth.account import auth_backends
+from django.contrib.auth import backends
+from django.contrib.auth.models import User
+
+
+class RequestUserMixin:
+    def get_user(self, user_id):
+        users = User.objects.select_related(
+            'participant__membership', 'participant__passwordquality'
+        ).prefetch_related('groups')
+        try:
+            user = users.get(pk=user_id)
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class ModelBackend(RequestUserMixin, backends.ModelBackend):
+    pass
+
+
+class AuthenticationBackend(RequestUserMixin, auth_backends.AuthenticationBackend):
+    pass
@@ -33,3 +33,6 @@ PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
 # As a workaround, just use the default storage instead.
 # TODO: Figure out what's going on here, ideally after moving off django-pipeline
 STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+# Search results cached in-process would outlive each test's data.
+PARTICIPANT_SEARCH_CACHE_SIZE = 0
@@ -1,5 +1,5 @@
-from collections import defaultdict
-from typing import List
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Set, Tuple
 
 from ws import models
 
@@ -55,18 +55,46 @@ class Cycle:
 
 
 class SeparationGraph:
+    """A directed graph of participants, with edges from initiator to recipient.
+
+    Participants are indexed by primary key, with both forward (who a participant
+    blocks) and reverse (who blocks a participant) adjacency. Removing a participant
+    is thus proportional to their number of blocks, not the size of the graph.
+    """
+
     def __init__(self, relevant_participants):
         """Create the graph, ignores blocks by or against any excluded participants.
 
         This allows us to easily ignore participants who have a separation request
         in place, but have not signed up for trips on a given Winter School week.
         """
+        self._participants: Dict[int, models.Participant] = {}
+        # initiator -> recipients, and recipient -> initiators
+        self._blocks: Dict[int, Set[int]] = defaultdict(set)
+        self._blocked_by: Dict[int, Set[int]] = defaultdict(set)
+
+        # Strongly-connected components are computed lazily. When the graph changes,
+        # only participants who could be affected by the change must be revisited.
+        self._components: Dict[int, _Component] = {}
+        self._stale: Set[int] = set()
+
         # Start with all relevant blocks. We'll remove nodes as we continue
-        self._graph = self._make_graph(relevant_participants)
+        for initiator, recipient in self._relevant_blocks(relevant_participants):
+            self.add_block(initiator, recipient)
+
+    @classmethod
+    def from_blocks(
+        cls, blocks: Iterable[Tuple[models.Participant, models.Participant]]
+    ):
+        """Create a graph directly from (initiator, recipient) pairs."""
+        graph = cls([])
+        for initiator, recipient in blocks:
+            graph.add_block(initiator, recipient)
+        return graph
 
     @staticmethod
-    def _make_graph(participants):
-        """Express all separations as a directed graph of participants.
+    def _relevant_blocks(participants):
+        """Express all separations as edges of a directed graph of participants.
 
         This graph may be a tree (a directed acyclic graph, or DAG) or it could have cycles.
 
@@ -78,51 +106,168 @@ class SeparationGraph:
         relevant_blocks = models.LotterySeparation.objects.filter(
             initiator__in=participants,
             recipient__in=participants,
-        )
-        mapping = defaultdict(set)
-        for block in relevant_blocks:
-            mapping[block.initiator].add(block.recipient)
-        return dict(mapping)
+        ).select_related('initiator', 'recipient')
+        return [(block.initiator, block.recipient) for block in relevant_blocks]
+
+    def add_block(self, initiator: models.Participant, recipient: models.Participant):
+        self._participants[initiator.pk] = initiator
+        self._participants[recipient.pk] = recipient
+        self._blocks[initiator.pk].add(recipient.pk)
+        self._blocked_by[recipient.pk].add(initiator.pk)
+        if self._components:
+            self._stale.update(self._ancestors(initiator.pk))
+        self._stale.update([initiator.pk, recipient.pk])
 
     @property
     def participants_affected_by_blocks(self):
-        seen_recipients = set()
-        for initiator, blocked in self._graph.items():
-            yield initiator
-            for recipient in blocked:
-                if recipient not in self._graph and recipient not in seen_recipients:
-                    yield recipient
-                seen_recipients.add(recipient)
+        for pk in self._blocks.keys() | self._blocked_by.keys():
+            yield self._participants[pk]
 
     @property
-    def current_graph(self):
-        return self._graph
+    def current_graph(self) -> Dict[models.Participant, Set[models.Participant]]:
+        """Map each participant still blocking others to the participants they block."""
+        return {
+            self._participants[initiator]: {self._participants[pk] for pk in blocked}
+            for initiator, blocked in self._blocks.items()
+        }
+
+    def blocked_by(self, par) -> Set[models.Participant]:
+        """Return all (unhandled) participants who blocked this participant."""
+        return {self._participants[pk] for pk in self._blocked_by.get(par.pk, ())}
+
+    def blocks(self, par) -> Set[models.Participant]:
+        """Return all (unhandled) participants this participant has blocked."""
+        return {self._participants[pk] for pk in self._blocks.get(par.pk, ())}
+
+    def _ancestors(self, pk: int) -> Set[int]:
+        """Return the participant, and all participants who can reach them."""
+        ancestors = {pk}
+        frontier = [pk]
+        while frontier:
+            for initiator in self._blocked_by.get(frontier.pop(), ()):
+                if initiator not in ancestors:
+                    ancestors.add(initiator)
+                    frontier.append(initiator)
+        return ancestors
 
     def remove(self, par):
         """Mark a participant as handled, so remove them from the graph."""
+        # Only those who could reach this participant might have their component change
+        if self._components:
+            self._stale.update(self._ancestors(par.pk))
+
         # None of the blocks made by this participant are relevant anymore!
-        self._graph.pop(par, None)
+        for recipient in self._blocks.pop(par.pk, set()):
+            self._blocked_by[recipient].discard(par.pk)
+            if not self._blocked_by[recipient]:
+                del self._blocked_by[recipient]
 
+        # Similarly, we don't need to consider any blocks by people towards this par.
         # There may be people blocking only this participant. We can remove them from the graph.
-        participants_now_blocking_nobody = set()
-
-        # Similarly, we don't need to consider any blocks by people towards this par
-        for initiator, recipients in self._graph.items():
-            recipients.discard(par)
-            if not recipients:
-                participants_now_blocking_nobody.add(initiator)
-
-        for initiator in participants_now_blocking_nobody:
-            self._graph.pop(initiator)
+        for initiator in self._blocked_by.pop(par.pk, set()):
+            self._blocks[initiator].discard(par.pk)
+            if not self._blocks[initiator]:
+                del self._blocks[initiator]
 
     @property
     def empty(self) -> bool:
         """Return true if all participants have been handled."""
-        # TODO: Should also allow a key with an empty set?
-        return not bool(self._graph)
+        return not self._blocks
+
+    def _in_graph(self, pk: int) -> bool:
+        return pk in self._blocks or pk in self._blocked_by
+
+    def _update_components(self):
+        """Identify strongly-connected components with a single pass of Tarjan's algorithm.
+
+        Only stale participants are visited. Any participant who cannot reach a
+        stale participant is unaffected by the change, so keeps their component.
+        (Likewise, a stale participant never shares a component with a fresh one)
+
+        Components are also annotated with whether or not they can reach a terminus
+        (a participant who blocks nobody). Tarjan's algorithm identifies components
+        in reverse topological order, so all reachable components are already known.
+        """
+        stale, self._stale = self._stale, set()
+        for pk in stale:
+            self._components.pop(pk, None)
+        components = self._components
+
+        index: Dict[int, int] = {}
+        lowlink: Dict[int, int] = {}
+        stack: List[int] = []
+        on_stack: Set[int] = set()
+
+        for root in stale:
+            if root in index or not self._in_graph(root):
+                continue
+            # Iterative, since deep recursion could exceed Python's stack limit.
+            work = [(root, iter(self._blocks.get(root, ())))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                node, children = work[-1]
+                child = next(children, None)
+                if child is not None:
+                    if child in components:
+                        pass  # Either fresh, or in an already-identified component
+                    elif child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(self._blocks.get(child, ()))))
+                    elif child in on_stack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] != index[node]:
+                    continue
+
+                members: Set[int] = set()
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    members.add(member)
+                    if member == node:
+                        break
+                component = _Component(members)
+                for member in members:
+                    successors = self._blocks.get(member, ())
+                    if not successors:
+                        component.reaches_terminus = True
+                    for successor in successors:
+                        if (
+                            successor not in members
+                            and components[successor].reaches_terminus
+                        ):
+                            component.reaches_terminus = True
+                for member in members:
+                    components[member] = component
+
+    def _shortest_cycle(self, start: int, members: Set[int]) -> Cycle:
+        """Breadth-first search for the shortest cycle through `start` (in its component)."""
+        came_from: Dict[int, int] = {}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for child in self._blocks[node]:
+                if child == start:
+                    path = [node]
+                    while path[-1] != start:
+                        path.append(came_from[path[-1]])
+                    return Cycle([self._participants[pk] for pk in reversed(path)])
+                if child in members and child not in came_from:
+                    came_from[child] = node
+                    queue.append(child)
+        raise ValueError("Participant is not part of a cycle")
 
     def isolated_cycles(self, start_par) -> List[Cycle]:
-        r""" Return any directed cycles containing this participant (with no terminal nodes reachable)
+        r""" Return the shortest directed cycle with this participant (if no termini reachable)
 
         If cycles are detected, we will eventually need to place one of the participants
         to break a potential race condition wherein all participants are waiting for
@@ -178,42 +323,21 @@ class SeparationGraph:
             |         |
             +--< C <--+
         """
-        if start_par not in self._graph:
+        if start_par.pk not in self._blocks:
             return []
 
-        termini = set()
-
-        seen = {start_par}
-        path = []
+        if self._stale:
+            self._update_components()
 
-        def dfs(par):
-            """Depth-first search, starting with the participant
-
-            Yield any found cycles, note if a terminal node is found.
-            """
-            nonlocal path, termini
-
-            blocked_participants = self._graph.get(par, set())
-
-            seen.add(par)
-            path.append(par)
+        component = self._components[start_par.pk]
+        if component.reaches_terminus or len(component.members) < 2:
+            return []
+        return [self._shortest_cycle(start_par.pk, component.members)]
 
-            if not blocked_participants:
-                termini.add(par)
-            for child in blocked_participants:
-                if child not in seen:
-                    yield from dfs(child)
-                elif child in path:  # Current path contains a cycle!
-                    # Make sure we report "A -> B -> C" if `child` is D in this scenario:
-                    #   A ------> B <--- D
-                    #   ^         v
-                    #   +--< C <--+
-                    just_cycle_subpath = path[path.index(child) :]
-                    yield Cycle(just_cycle_subpath)
 
-            path.pop()
+class _Component:
+    """A strongly-connected component of the graph (every member can reach all others)."""
 
-        # Importantly, ignore any cycles that do not directly involve this participant.
-        # (Also, exhaust the generator now, so as to set `termini`)
-        member_cycles = [cycle for cycle in dfs(start_par) if start_par in cycle]
-        return [] if termini else member_cycles
+    def __init__(self, members: Set[int]):
+        self.members = members
+        self.reaches_terminus = False
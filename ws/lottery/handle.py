@@ -1,9 +1,10 @@
 from datetime import date
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from django.db.models import Q
 
 from ws import enums, models
+from ws.lottery.log import event
 from ws.utils.signups import add_to_waitlist
 
 
@@ -28,21 +29,107 @@ def ranked_signups(participant, after: date):
 def place_on_trip(signup, logger):
     trip = signup.trip
     slots = 'slot' if trip.open_slots == 1 else 'slots'
-    logger.info(f"{trip} has {trip.open_slots} {slots}, adding {signup.participant}")
+    logger.info(
+        f"{trip} has {trip.open_slots} {slots}, adding {signup.participant}",
+        extra=event('placed', signup.participant, trip),
+    )
     signup.on_trip = True
     signup.save()
 
 
-class ParticipantHandler:
-    """Class to handle placement of a single participant or pair."""
+class DatabaseStore:
+    """Read & write the lottery's signups, trips, and waitlists in the database.
+
+    Handlers place participants only through the methods below (and by saving
+    signups). `WinterSchoolLotterySimulation` offers the very same methods,
+    which lets one handler place participants either directly in the database
+    or entirely in memory.
+    """
 
     is_driver_q = Q(participant__lotteryinfo__car_status__in=['own', 'rent'])
 
-    def __init__(self, participant, runner, min_drivers=2, allow_pairs=True):
+    def __init__(self, runner):
+        self.runner = runner
+
+    @staticmethod
+    def is_driver(participant) -> bool:
+        return par_is_driver(participant)
+
+    @staticmethod
+    def paired_par(participant):
+        try:
+            return participant.lotteryinfo.paired_with
+        except models.LotteryInfo.DoesNotExist:
+            return None
+
+    @staticmethod
+    def reciprocally_paired(participant) -> bool:
+        """Return if the participant is reciprocally paired with another.
+
+        (cannot use `reciprocally_paired`, since that's a rank-annotated prop)
+        """
+        try:
+            lotteryinfo = participant.lotteryinfo
+        except models.LotteryInfo.DoesNotExist:
+            return False  # Definitely not paired.
+        return bool(lotteryinfo.reciprocally_paired_with)
+
+    @staticmethod
+    def ranked_signups(participant, after: date):
+        return ranked_signups(participant, after)
+
+    @staticmethod
+    def signup_for(participant, trip):
+        return models.SignUp.objects.get(participant=participant, trip=trip)
+
+    @staticmethod
+    def signups_shared_with(signups, partner):
+        """Of the given signups, return those for trips the partner signed up for."""
+        return signups.filter(trip__in=partner.trip_set.all())
+
+    def count_drivers_on_trip(self, trip) -> int:
+        participant_drivers = trip.signup_set.filter(self.is_driver_q, on_trip=True)
+        lottery_leaders = trip.leaders.filter(lotteryinfo__isnull=False)
+        num_leader_drivers = sum(
+            leader.lotteryinfo.is_driver for leader in lottery_leaders
+        )
+        return participant_drivers.count() + num_leader_drivers
+
+    def waiting_drivers(self, trip):
+        """Return participants of all drivers signed up for, but not on, the trip."""
+        driver_signups = models.SignUp.objects.filter(
+            self.is_driver_q,
+            trip=trip,
+            on_trip=False,  # If on the trip, we know they're handled.
+            # TODO (Django 2): Exclude reciprocally-paired participants where both are signed up.
+            # These participants cannot bump.
+            # This is simpler in Django 2 (see `annotate_reciprocally_paired()`)
+        ).select_related('participant')
+        return [signup.participant for signup in driver_signups]
+
+    def signup_to_bump(self, trip):
+        return self.runner.signup_to_bump(trip)
+
+    @staticmethod
+    def add_to_waitlist(signup, prioritize=False):
+        return add_to_waitlist(signup, prioritize=prioritize)
+
+
+class ParticipantHandler:
+    """Class to handle placement of a single participant or pair."""
+
+    def __init__(
+        self, participant, runner, min_drivers=2, allow_pairs=True, store=None
+    ):
+        """
+        :param store: Where signups & trips are read and modified (the database
+            unless given a `WinterSchoolLotterySimulation`)
+        """
         self.participant = participant
         self.runner = runner
         self.min_drivers = min_drivers
         self.allow_pairs = allow_pairs
+        self.store = DatabaseStore(runner) if store is None else store
 
         self.slots_needed = len(self.to_be_placed)
 
@@ -53,7 +140,7 @@ class ParticipantHandler:
 
     @property
     def is_driver(self) -> bool:
-        return any(par_is_driver(par) for par in self.to_be_placed)
+        return any(self.store.is_driver(par) for par in self.to_be_placed)
 
     @property
     def paired(self) -> bool:
@@ -70,10 +157,7 @@ class ParticipantHandler:
 
     @property
     def paired_par(self):
-        try:
-            return self.participant.lotteryinfo.paired_with
-        except models.LotteryInfo.DoesNotExist:
-            return None
+        return self.store.paired_par(self.participant)
 
     @property
     def to_be_placed(self):
@@ -88,26 +172,20 @@ class ParticipantHandler:
     def place_all_on_trip(self, signup):
         place_on_trip(signup, self.logger)
         if self.paired:
-            par_signup = models.SignUp.objects.get(
-                participant=self.paired_par, trip=signup.trip
-            )
+            par_signup = self.store.signup_for(self.paired_par, signup.trip)
             place_on_trip(par_signup, self.logger)
 
-    def _count_drivers_on_trip(self, trip) -> int:
-        participant_drivers = trip.signup_set.filter(self.is_driver_q, on_trip=True)
-        lottery_leaders = trip.leaders.filter(lotteryinfo__isnull=False)
-        num_leader_drivers = sum(
-            leader.lotteryinfo.is_driver for leader in lottery_leaders
-        )
-        return participant_drivers.count() + num_leader_drivers
-
     def _num_drivers_needed(self, trip) -> int:
-        num_drivers = self._count_drivers_on_trip(trip)
+        num_drivers = self.store.count_drivers_on_trip(trip)
         return max(self.min_drivers - num_drivers, 0)
 
     def bump_participant(self, signup):
-        add_to_waitlist(signup, prioritize=True)
-        self.logger.info("Moved %s to the top of the waitlist", signup)
+        self.store.add_to_waitlist(signup, prioritize=True)
+        self.logger.info(
+            "Moved %s to the top of the waitlist",
+            signup,
+            extra=event('prioritized', signup.participant, signup.trip),
+        )
 
     def _try_to_place(self, signup: models.SignUp) -> bool:
         """Try to place participant (and partner) on the trip.
@@ -126,13 +204,17 @@ class ParticipantHandler:
                 self.logger.info(
                     "%r is full, but lacks %d drivers", trip.name, self.min_drivers
                 )
-                signup_to_bump = self.runner.signup_to_bump(trip)
+                signup_to_bump = self.store.signup_to_bump(trip)
                 if not signup_to_bump:
                     self.logger.info("Trip does not have a non-driver to bump")
                     return False
-                self.bump_participant(signup_to_bump)
+                with self.runner.profiler.phase('driver_bumps'):
+                    self.bump_participant(signup_to_bump)
                 self.logger.info(
-                    "Adding driver %s to %r", signup.participant.name, trip.name
+                    "Adding driver %s to %r",
+                    signup.participant.name,
+                    trip.name,
+                    extra=event('placed_driver', signup.participant, trip),
                 )
                 signup.on_trip = True
                 signup.save()
@@ -173,25 +255,28 @@ class SingleTripParticipantHandler(ParticipantHandler):
                 return
 
         # Try to place all participants, otherwise add them to the waitlist
-        signup = models.SignUp.objects.get(participant=self.participant, trip=self.trip)
+        signup = self.store.signup_for(self.participant, self.trip)
         if not self._try_to_place(signup):
             for par in self.to_be_placed:
-                self.logger.info(f"Adding {par.name} to the waitlist")
-                add_to_waitlist(
-                    models.SignUp.objects.get(trip=self.trip, participant=par)
+                self.logger.info(
+                    f"Adding {par.name} to the waitlist",
+                    extra=event('waitlisted', par, self.trip),
                 )
+                self.store.add_to_waitlist(self.store.signup_for(par, self.trip))
         self.runner.mark_handled(self.participant)
         if self.paired_par:
             self.runner.mark_handled(self.paired_par)
 
 
 class WinterSchoolParticipantHandler(ParticipantHandler):
-    def __init__(self, participant, runner):
+    def __init__(self, participant, runner, store=None):
         """
         :param runner: An instance of LotteryRunner
         """
         self.lottery_rundate = runner.execution_datetime.date()
-        super().__init__(participant, runner, min_drivers=2, allow_pairs=True)
+        super().__init__(
+            participant, runner, min_drivers=2, allow_pairs=True, store=store
+        )
 
     def bump_participant(self, signup):
         """Try to place a bumped participant on a trip before waitlisting them.
@@ -207,24 +292,25 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
         assert signup.on_trip
         par = signup.participant
 
-        self.logger.info("Bumping %s off %s", par.name, signup.trip.name)
+        self.logger.info(
+            "Bumping %s off %s",
+            par.name,
+            signup.trip.name,
+            extra=event('bumped', par, signup.trip),
+        )
 
         # Paired participants would generally prefer to stick together
-        try:
-            lotteryinfo = par.lotteryinfo
-        except models.LotteryInfo.DoesNotExist:
-            pass  # Definitely not paired.
-        else:
-            # Choose to just stay on the waitlist in hopes of joining their partner
-            # NOTE: (cannot use `reciprocally_paired`, since that's a rank-annotated prop)
-            if lotteryinfo.reciprocally_paired_with:
-                super().bump_participant(signup)
-                return
+        # Choose to just stay on the waitlist in hopes of joining their partner
+        if self.store.reciprocally_paired(par):
+            super().bump_participant(signup)
+            return
 
         self.logger.debug("Searching all signups for a potentially open trip.")
         # Do not bother being picky about potentially being bumped by a driver
-        future_signups = ranked_signups(par, after=self.lottery_rundate)
-        for other_signup in future_signups.exclude(pk=signup.pk):
+        future_signups = self.store.ranked_signups(par, after=self.lottery_rundate)
+        for other_signup in future_signups:
+            if other_signup.pk == signup.pk:
+                continue
             if not other_signup.trip.open_slots:
                 self.logger.debug("%r is full", other_signup.trip.name)
                 continue
@@ -238,7 +324,7 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
         super().bump_participant(signup)
 
     def _future_signups(self):
-        return ranked_signups(self.participant, after=self.lottery_rundate)
+        return self.store.ranked_signups(self.participant, after=self.lottery_rundate)
 
     def _desired_signups(self, signups):
         """Of a collection of signups, filter down to just those desired.
@@ -250,7 +336,7 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
         """
         if self.paired:  # Restrict signups to those both signed up for
             # TODO: If paired par has no signups, consider only trips where leading!
-            signups = signups.filter(trip__in=self.paired_par.trip_set.all())
+            signups = self.store.signups_shared_with(signups, self.paired_par)
         return signups
 
     def place_participant(self) -> Optional[Dict]:
@@ -317,17 +403,15 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
 
         # At this point, potential drivers could bump some of the last signups!
         # If other unhandled participants ranked this trip, consider it jeopardized
-        driver_signups = models.SignUp.objects.filter(
-            trip=signup.trip,
-            on_trip=False,  # If on the trip, we know they're handled.
-            participant__lotteryinfo__car_status__in=['own', 'rent'],
-            # TODO (Django 2): Exclude reciprocally-paired participants where both are signed up.
-            # These participants cannot bump.
-            # This is simpler in Django 2 (see `annotate_reciprocally_paired()`)
-        ).exclude(participant_id__in=self.to_be_placed)
+        if self.runner.unhandled_drivers is not None:
+            # (We're placing non-drivers, so they can't be among the unhandled drivers)
+            return self.runner.unhandled_drivers[signup.trip.pk] > 0
 
+        to_be_placed = {par.pk for par in self.to_be_placed}
         return any(
-            not self.runner.handled(signup.participant) for signup in driver_signups
+            not self.runner.handled(driver)
+            for driver in self.store.waiting_drivers(signup.trip)
+            if driver.pk not in to_be_placed
         )
 
     def _place_or_waitlist(self, future_signups, desired_signups):
@@ -351,13 +435,15 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
             return info
 
         # Try to place participants on their first choice available trip
-        skipped_to_avoid_driver_bump: List[Tuple[int, models.SignUp]] = []
+        skipped_to_avoid_driver_bump: List[Tuple[int, Any]] = []
         for rank, signup in enumerate(future_signups, start=1):
             if signup not in desired_signups:
                 self.logger.debug("Ignoring undesired signup %s", signup)
                 continue
             trip_name = signup.trip.name
-            if self._placement_would_jeopardize_driver_bump(signup):
+            with self.runner.profiler.phase('driver_bump_checks'):
+                jeopardized = self._placement_would_jeopardize_driver_bump(signup)
+            if jeopardized:
                 self.logger.debug("Placing on %r risks bump from a driver", trip_name)
                 skipped_to_avoid_driver_bump.append((rank, signup))
                 continue
@@ -375,13 +461,15 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
                 return {**info, 'placed_on_choice': rank}
 
         self.logger.info(f"None of {self._par_text}'s desired trips are open.")
-        favorite_trip = desired_signups.first().trip
-        for participant in self.to_be_placed:
-            favorite_signup = models.SignUp.objects.get(
-                participant=participant, trip=favorite_trip
-            )
-            add_to_waitlist(favorite_signup)
-            with_email = f"{self._par_text} ({participant.email})"
-            self.logger.info(f"Waitlisted {with_email} on {favorite_trip.name}")
+        favorite_trip = desired_signups[0].trip
+        with self.runner.profiler.phase('waitlist_inserts'):
+            for participant in self.to_be_placed:
+                favorite_signup = self.store.signup_for(participant, favorite_trip)
+                self.store.add_to_waitlist(favorite_signup)
+                with_email = f"{self._par_text} ({participant.email})"
+                self.logger.info(
+                    f"Waitlisted {with_email} on {favorite_trip.name}",
+                    extra=event('waitlisted', participant, favorite_trip),
+                )
 
         return {**info, 'waitlisted': True}
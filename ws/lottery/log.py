@@ -0,0 +1,56 @@
+"""Structured lottery logs.
+
+Lottery runs log a human-readable account of every decision made. That same
+log may instead be written as JSON lines, with each record identifying the
+action taken, the participant and trip involved, and the participant's rank.
+Records are written as they're made (rather than buffered for the whole run),
+and the familiar text log can be derived from them at any time.
+"""
+import json
+import logging
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# The keys present in every structured record (missing values are null)
+EVENT_KEYS = ('action', 'participant', 'trip', 'rank')
+
+
+def event(
+    action: str,
+    participant=None,
+    trip=None,
+    rank: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Describe a lottery action, for use as a log record's `extra`."""
+    return {
+        'lottery_event': {
+            'action': action,
+            'participant': participant and participant.pk,
+            'trip': trip and trip.pk,
+            'rank': rank,
+        }
+    }
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """Format each record as a single line of JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'level': record.levelname,
+            'message': record.getMessage(),
+            **dict.fromkeys(EVENT_KEYS),
+            **getattr(record, 'lottery_event', {}),
+        }
+        return json.dumps(entry)
+
+
+def read_entries(lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Parse each record in a structured log (skipping blank lines)."""
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def text_log(lines: Iterable[str]) -> str:
+    """Derive the text log (exactly as it'd be written by a plain handler)."""
+    return ''.join(f"{entry['message']}\n" for entry in read_entries(lines))
@@ -0,0 +1,120 @@
+"""Instrumentation for lottery runs.
+
+A Winter School lottery run does a lot of work (ranking over a thousand
+participants, placing each one, then opening trips for first-come, first-serve).
+To know where that time goes (and to compare one week's run to the next), the
+runner records wall time, query counts, and rows touched per phase of the run,
+along with how long it takes to handle each participant.
+"""
+import json
+import math
+from contextlib import contextmanager
+from pathlib import Path
+from time import monotonic
+from typing import Any, Dict, List, Optional
+
+from django.db import connection
+
+
+def percentile(ordered: List[float], pct: float) -> Optional[float]:
+    """Return the given percentile of already-sorted values (nearest-rank method)."""
+    if not ordered:
+        return None
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+class PhaseTotals:
+    """Cumulative resources used by every invocation of a single phase."""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'seconds': round(self.seconds, 6),
+            'queries': self.queries,
+            'rows': self.rows,
+        }
+
+
+class LotteryProfiler:
+    """Record per-phase wall time, query counts, and rows touched.
+
+    Phases may be entered many times (totals accumulate) and may be nested
+    (in which case, an outer phase's totals include those of its inner phases).
+    Queries are only counted while within `profile()`.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, PhaseTotals] = {}
+        self.handler_seconds: List[float] = []
+        self.seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+
+    def _count_query(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        self.queries += 1
+        # For SELECTs, this is the number of rows returned (for writes, rows affected)
+        rowcount = context['cursor'].rowcount
+        if rowcount > 0:
+            self.rows += rowcount
+        return result
+
+    @contextmanager
+    def profile(self):
+        """Count all queries made in this block, and time its execution."""
+        start = monotonic()
+        try:
+            with connection.execute_wrapper(self._count_query):
+                yield self
+        finally:
+            self.seconds += monotonic() - start
+
+    @contextmanager
+    def phase(self, name: str):
+        totals = self.phases.setdefault(name, PhaseTotals())
+        start, queries, rows = monotonic(), self.queries, self.rows
+        try:
+            yield
+        finally:
+            totals.calls += 1
+            totals.seconds += monotonic() - start
+            totals.queries += self.queries - queries
+            totals.rows += self.rows - rows
+
+    @contextmanager
+    def handling_participant(self):
+        """Time the handling of a single participant (or pair)."""
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.handler_seconds.append(monotonic() - start)
+
+    def handler_latency(self) -> Dict[str, Any]:
+        ordered = sorted(self.handler_seconds)
+        return {
+            'count': len(ordered),
+            **{f'p{pct}': percentile(ordered, pct) for pct in [50, 90, 95, 99]},
+            'max': ordered[-1] if ordered else None,
+        }
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'seconds': round(self.seconds, 6),
+            'queries': self.queries,
+            'rows': self.rows,
+            'phases': {name: totals.to_dict() for name, totals in self.phases.items()},
+            'handler_latency': self.handler_latency(),
+        }
+
+    def write(self, path: Path, **extra):
+        """Write the report (with any extra top-level keys) as JSON."""
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump({**extra, **self.report()}, report_file, indent=2)
@@ -1,6 +1,7 @@
 import random
-from collections import namedtuple
+from collections import Counter, defaultdict, namedtuple
 from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set
 
 from django.db.models import Q
 from mitoc_const import affiliations
@@ -69,7 +70,33 @@ def seed_for(participant, lottery_key):
     """
     if not participant.pk:
         raise ValueError("Can only get seed for participants saved to db!")
-    return f"{participant.pk}-{lottery_key}-{settings.PRNG_SEED_SECRET}"
+    return _seed(participant.pk, lottery_key)
+
+
+def _seed(participant_pk: int, lottery_key: str) -> str:
+    return f"{participant_pk}-{lottery_key}-{settings.PRNG_SEED_SECRET}"
+
+
+def random_keys(participant_pks: Iterable[int], lottery_key) -> Dict[int, float]:
+    """Return a deterministic pseudo-random float for each participant.
+
+    Each participant gets their own `random.Random` instance (seeded exactly as
+    `seed_for` describes), so the global random state is never modified. Values
+    are identical to those produced by seeding the global PRNG.
+    """
+    keys = {}
+    for pk in participant_pks:
+        if not pk:
+            raise ValueError("Can only get seed for participants saved to db!")
+        keys[pk] = random.Random(_seed(pk, lottery_key)).random()
+    return keys
+
+
+def affiliation_weighted_rands(participants, lottery_key) -> Dict[int, float]:
+    """Return `affiliation_weighted_rand()` for many participants at once (by pk)."""
+    participants = list(participants)
+    rands = random_keys([par.pk for par in participants], lottery_key)
+    return {par.pk: rands[par.pk] - WEIGHTS[par.affiliation] for par in participants}
 
 
 def affiliation_weighted_rand(participant, lottery_key):
@@ -81,8 +108,8 @@ def affiliation_weighted_rand(participant, lottery_key):
 
     See `seed_for` for a full explanation of `lottery_key`.
     """
-    random.seed(seed_for(participant, lottery_key))
-    return random.random() - WEIGHTS[participant.affiliation]
+    rand = random.Random(seed_for(participant, lottery_key)).random()
+    return rand - WEIGHTS[participant.affiliation]
 
 
 class ParticipantRanker:
@@ -96,11 +123,16 @@ class ParticipantRanker:
         Each participant is decorated with an attribute that says if they've
         reciprocally paired themselves with another participant.
         """
-        participants = annotate_reciprocally_paired(self.participants_to_handle())
-        with_keys = ((self.priority_key(par), par) for par in participants)
+        participants = self.annotated_participants()
+        keys_by_pk = self.priority_keys(participants)
+        with_keys = ((keys_by_pk[par.pk], par) for par in participants)
         for priority_key, participant in sorted(with_keys):
             yield participant, priority_key
 
+    def annotated_participants(self) -> List[models.Participant]:
+        """All participants to be ranked, annotated with `reciprocally_paired`."""
+        return list(annotate_reciprocally_paired(self.participants_to_handle()))
+
     def participants_to_handle(self):
         """QuerySet of participants to be ranked."""
         raise NotImplementedError
@@ -109,14 +141,38 @@ class ParticipantRanker:
         """Return a key that can be used to sort the participant."""
         raise NotImplementedError
 
+    def priority_keys(self, participants):
+        """Return priority keys for many participants at once (keyed by pk).
+
+        By default, this just computes each key in turn. Rankers that must
+        query for each participant's key should override this to do so in bulk.
+        """
+        return {par.pk: self.priority_key(par) for par in participants}
+
 
 class SingleTripParticipantRanker(ParticipantRanker):
-    def __init__(self, trip):
+    def __init__(self, trip, participants: Optional[List[models.Participant]] = None):
+        """
+        :param participants: If already loaded, all participants signed up for the
+            trip (each must be annotated with `reciprocally_paired`)
+        """
         self.trip = trip
+        self.preloaded_participants = participants
+
+    def annotated_participants(self) -> List[models.Participant]:
+        if self.preloaded_participants is not None:
+            return list(self.preloaded_participants)
+        return super().annotated_participants()
+
+    @property
+    def lottery_key(self) -> str:
+        return f"trip-{self.trip.pk}"
 
     def priority_key(self, participant):
-        lottery_key = f"trip-{self.trip.pk}"
-        return affiliation_weighted_rand(participant, lottery_key)
+        return affiliation_weighted_rand(participant, self.lottery_key)
+
+    def priority_keys(self, participants):
+        return affiliation_weighted_rands(participants, self.lottery_key)
 
     def participants_to_handle(self):
         return models.Participant.objects.filter(signup__trip=self.trip)
@@ -141,6 +197,9 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
         self.jan_1st = self.today.replace(month=1, day=1)
         self.lottery_key = f"ws-{today.isoformat()}"
 
+        # Keys never change within a run, so they're computed just once.
+        self.priority_key_cache: Dict[int, WinterSchoolPriorityRank] = {}
+
     def get_rank_override(self, participant):
         if not hasattr(self, 'adjustments_by_participant'):
             adjustments = models.LotteryAdjustment.objects.filter(
@@ -168,19 +227,63 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
         4. affiliation (MIT affiliated is higher priority)
         5. randomness (factored into an affiliation weighting, breaks ties)
         """
+        return self._priority_key(
+            participant,
+            trip_counts=self.number_ws_trips(participant),
+            num_trips_led=self.number_trips_led(participant),
+            affiliation_weight=affiliation_weighted_rand(participant, self.lottery_key),
+        )
+
+    def priority_keys(self, participants):
+        """Return the priority key for each participant, with a fixed number of queries.
+
+        Ranking each participant individually takes several queries per
+        participant. With over 1,000 participants in a typical week of
+        Winter School, it's much faster to aggregate all counts up front.
+
+        Keys are identical to those given by `priority_key()`.
+        """
+        par_pks = [par.pk for par in participants]
+        counts_by_par = self.bulk_number_ws_trips(par_pks)
+        trips_led_by_par = self.bulk_number_trips_led(par_pks)
+        rands_by_par = affiliation_weighted_rands(participants, self.lottery_key)
+
+        keys = {
+            par.pk: self._priority_key(
+                par,
+                trip_counts=counts_by_par[par.pk],
+                num_trips_led=trips_led_by_par[par.pk],
+                affiliation_weight=rands_by_par[par.pk],
+            )
+            for par in participants
+        }
+        self.priority_key_cache.update(keys)
+        return keys
+
+    def cached_priority_key(self, participant) -> WinterSchoolPriorityRank:
+        """Return the participant's priority key, only computing it if not yet known."""
+        if participant.pk not in self.priority_key_cache:
+            self.priority_key_cache[participant.pk] = self.priority_key(participant)
+        return self.priority_key_cache[participant.pk]
+
+    def _priority_key(
+        self,
+        participant,
+        trip_counts: TripCounts,
+        num_trips_led: int,
+        affiliation_weight: float,
+    ) -> WinterSchoolPriorityRank:
         override = self.get_rank_override(participant)
 
-        flake_factor = self.flake_factor(participant)
         # If we use raw flake factor, participants who've been on trips
         # will have an advantage over those who've been on none
-        flaky_or_neutral = max(flake_factor, 0)
+        flaky_or_neutral = max(self._flake_factor(trip_counts), 0)
 
         # If the leader led more trips, give them a bump
-        leader_bump = -self.trips_led_balance(participant)
+        leader_bump = -self._trips_led_balance(trip_counts, num_trips_led)
 
-        # Ties are resolved by a random number
+        # Ties are resolved by a random number, `affiliation_weight`
         # (MIT students/affiliates are more likely to come first)
-        affiliation_weight = affiliation_weighted_rand(participant, self.lottery_key)
 
         # Lower = higher in the list
         return WinterSchoolPriorityRank(
@@ -192,8 +295,11 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
 
         A lower score indicates a more reliable participant.
         """
-        attended, flaked, _ = self.number_ws_trips(participant)
-        return (flaked * 5) - (2 * attended)
+        return self._flake_factor(self.number_ws_trips(participant))
+
+    @staticmethod
+    def _flake_factor(trip_counts: TripCounts) -> int:
+        return (trip_counts.flaked * 5) - (2 * trip_counts.attended)
 
     @staticmethod
     def trips_flaked(participant):
@@ -206,6 +312,11 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
             .distinct()
         )
 
+    @property
+    def _within_last_year(self) -> Q:
+        last_year = self.today - timedelta(days=365)
+        return Q(trip_date__gt=last_year, trip_date__lt=self.today)
+
     def number_trips_led(self, participant):
         """Return the number of trips the participant has recently led.
 
@@ -213,9 +324,15 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
         participants could easily jump the queue every Winter School if they
         just lead a few trips once and then stop).
         """
-        last_year = self.today - timedelta(days=365)
-        within_last_year = Q(trip_date__gt=last_year, trip_date__lt=self.today)
-        return participant.trips_led.filter(within_last_year).count()
+        return participant.trips_led.filter(self._within_last_year).count()
+
+    def bulk_number_trips_led(self, par_pks: List[int]) -> Dict[int, int]:
+        """Return the number of trips recently led by each participant."""
+        led_trips = models.Trip.objects.filter(
+            self._within_last_year, leaders__in=par_pks
+        ).values_list('leaders', flat=True)
+        trips_led_by_par = Counter(led_trips)
+        return {par_pk: trips_led_by_par[par_pk] for par_pk in par_pks}
 
     def number_ws_trips(self, participant):
         """Count trips the participant attended, flaked, and the total.
@@ -236,7 +353,41 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
             .values_list('pk', flat=True)
         )
         flaked = set(self.trips_flaked(participant))
+        return self._trip_counts(marked_on_trip, flaked)
+
+    def bulk_number_ws_trips(self, par_pks: List[int]) -> Dict[int, TripCounts]:
+        """Count trips attended, flaked, and the total for each participant.
 
+        See `number_ws_trips()` for a full explanation of what is counted.
+        """
+        marked_on_trip: Dict[int, Set[int]] = defaultdict(set)
+        on_trip_signups = models.SignUp.objects.filter(
+            participant_id__in=par_pks,
+            on_trip=True,
+            trip__program=enums.Program.WINTER_SCHOOL.value,
+            trip__trip_date__gt=self.jan_1st,
+            trip__trip_date__lt=self.today,
+        )
+        for par_pk, trip_pk in on_trip_signups.values_list('participant_id', 'trip_id'):
+            marked_on_trip[par_pk].add(trip_pk)
+
+        # Use the default manager, just as `participant.feedback_set` does.
+        flaked: Dict[int, Set[int]] = defaultdict(set)
+        flake_feedback = models.Feedback.objects.filter(
+            participant_id__in=par_pks,
+            showed_up=False,
+            trip__program=enums.Program.WINTER_SCHOOL.value,
+        )
+        for par_pk, trip_pk in flake_feedback.values_list('participant_id', 'trip_id'):
+            flaked[par_pk].add(trip_pk)
+
+        return {
+            par_pk: self._trip_counts(marked_on_trip[par_pk], flaked[par_pk])
+            for par_pk in par_pks
+        }
+
+    @staticmethod
+    def _trip_counts(marked_on_trip: Set[int], flaked: Set[int]) -> TripCounts:
         # Some leaders mark flakes, but don't remove participants
         # To calculate total, we can't double-count trips
         total = marked_on_trip.union(flaked)
@@ -246,16 +397,29 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
 
     def trips_led_balance(self, participant):
         """Especially active leaders get priority."""
-        _, _, total = self.number_ws_trips(participant)
-        surplus = self.number_trips_led(participant) - total
+        return self._trips_led_balance(
+            self.number_ws_trips(participant), self.number_trips_led(participant)
+        )
+
+    @staticmethod
+    def _trips_led_balance(trip_counts: TripCounts, num_trips_led: int) -> int:
+        surplus = num_trips_led - trip_counts.total
         return max(surplus, 0)  # Don't penalize anybody for a negative balance
 
     def lowest_non_driver(self, trip):
-        """Return the lowest priority non-driver on the trip."""
+        """Return the lowest priority non-driver on the trip.
+
+        Priority keys are cached, but this still issues one query (for the
+        trip's on-trip non-drivers) per bump. Only the in-memory lottery avoids
+        that, by keeping each trip's non-drivers in a heap as they're placed
+        (see `simulate.SimulatedTrip.lowest_non_driver`).
+        """
         no_car = Q(participant__lotteryinfo__isnull=True) | Q(
             participant__lotteryinfo__car_status='none'
         )
-        non_drivers = trip.signup_set.filter(no_car, on_trip=True)
+        non_drivers = trip.signup_set.filter(no_car, on_trip=True).select_related(
+            'participant'
+        )
 
         # If the trip is *only* made up of drivers (or is empty) will be None.
         # For Winter School, this can happen on a trip with 1 participant that's a driver)
@@ -263,5 +427,6 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
             return None
 
         return max(
-            non_drivers, key=lambda signup: self.priority_key(signup.participant)
+            non_drivers,
+            key=lambda signup: self.cached_priority_key(signup.participant),
         )
@@ -1,17 +1,23 @@
 import io
 import json
 import logging
+from collections import Counter, defaultdict
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, TypedDict
 
 from mitoc_const import affiliations
 
 from ws import enums, models, settings
+from ws.lottery import annotate_reciprocally_paired
 from ws.lottery.handle import (
     SingleTripParticipantHandler,
     WinterSchoolParticipantHandler,
 )
+from ws.lottery.log import JSONLinesFormatter, event, text_log
+from ws.lottery.profiling import LotteryProfiler
 from ws.lottery.rank import SingleTripParticipantRanker, WinterSchoolParticipantRanker
+from ws.lottery.simulate import WinterSchoolLotterySimulation
 from ws.utils.dates import closest_wed_at_noon, local_now
 
 AFFILIATION_MAPPING = {
@@ -21,6 +27,37 @@ AFFILIATION_MAPPING = {
 }
 
 
+class PreloadedParticipant(TypedDict):
+    """All that's needed to rank a participant in a single-trip lottery (JSON-serializable)."""
+
+    pk: int
+    name: str
+    email: str
+    affiliation: str
+    reciprocally_paired: bool
+
+
+def preload_single_trip_participants(
+    trip_pks: Iterable[int],
+) -> Dict[int, List[PreloadedParticipant]]:
+    """Load the participants for many single-trip lotteries at once (keyed by trip).
+
+    When many lotteries run at the same time, this replaces each runner's own
+    query for participants (and the output can be passed to Celery tasks).
+    """
+    by_trip: Dict[int, List[PreloadedParticipant]] = {pk: [] for pk in trip_pks}
+    participants = annotate_reciprocally_paired(
+        models.Participant.objects.filter(signup__trip_id__in=by_trip)
+    ).values(
+        'pk', 'name', 'email', 'affiliation', 'reciprocally_paired', 'signup__trip_id'
+    )
+    for par in participants:
+        by_trip[par.pop('signup__trip_id')].append(
+            {**par, 'reciprocally_paired': bool(par['reciprocally_paired'])}
+        )
+    return by_trip
+
+
 class LotteryRunner:
     """Parent class for a lottery executor.
 
@@ -36,6 +73,12 @@ class LotteryRunner:
         self.participants_seen = {}  # Key: pk, gives boolean if number came up
         self.participants_handled = {}  # Key: pk, gives boolean if handled
 
+        # Once tracked, the number of unhandled drivers with a signup (off the trip)
+        self.unhandled_drivers: Optional[Counter] = None  # Key: trip pk
+        self._driver_trip_pks: Dict[int, List[int]] = {}  # Key: driver pk
+
+        self.profiler = LotteryProfiler()
+
     @property
     def logger_id(self) -> str:
         """Get a unique logger object per each instance."""
@@ -48,7 +91,27 @@ class LotteryRunner:
         return self.participants_seen.get(participant.pk, False)
 
     def mark_handled(self, participant, handled=True):
+        was_handled = self.handled(participant)
         self.participants_handled[participant.pk] = handled
+        if self.unhandled_drivers is not None and handled != was_handled:
+            for trip_pk in self._driver_trip_pks.get(participant.pk, ()):
+                self.unhandled_drivers[trip_pk] += -1 if handled else 1
+
+    def track_unhandled_drivers(self, driver_signups: Iterable[Tuple[int, int]]):
+        """Start counting (per trip) the drivers who have yet to be handled.
+
+        Counts are kept current as participants are marked handled, so that
+        whether a trip still has drivers to come can be known without a query.
+
+        :param driver_signups: (participant pk, trip pk) of each signup by a
+            driver who is not yet on that trip
+        """
+        self.unhandled_drivers = Counter()
+        self._driver_trip_pks = defaultdict(list)
+        for par_pk, trip_pk in driver_signups:
+            self._driver_trip_pks[par_pk].append(trip_pk)
+            if not self.participants_handled.get(par_pk, False):
+                self.unhandled_drivers[trip_pk] += 1
 
     def mark_seen(self, participant, seen=True):
         self.participants_seen[participant.pk] = seen
@@ -69,8 +132,21 @@ class LotteryRunner:
 class SingleTripLotteryRunner(LotteryRunner):
     """Place participants vying for spots on a single trip."""
 
-    def __init__(self, trip):
+    def __init__(
+        self,
+        trip,
+        participants: Optional[List[PreloadedParticipant]] = None,
+        structured_log: bool = False,
+    ):
+        """
+        :param participants: If given, all participants signed up for the trip
+            (otherwise, participants are queried when the lottery is run)
+        :param structured_log: Also stream the log as JSON lines to a file in
+            `WS_LOTTERY_LOG_DIR` (the trip's text log is derived from that file)
+        """
         self.trip = trip
+        self.participants = participants
+        self.structured_log = structured_log
         super().__init__()
         self.configure_logger()
 
@@ -81,26 +157,66 @@ class SingleTripLotteryRunner(LotteryRunner):
 
     def configure_logger(self):
         """Configure a stream to save the log to the trip."""
-        self.log_stream = io.StringIO()
-
-        self.handler = logging.StreamHandler(stream=self.log_stream)
+        self.log_stream: Optional[io.StringIO] = None
+        self.structured_log_filename: Optional[Path] = None
+
+        if self.structured_log:
+            datestring = datetime.strftime(local_now(), "%Y-%m-%dT:%H:%M:%S")
+            self.structured_log_filename = Path(
+                settings.WS_LOTTERY_LOG_DIR, f"trip_{self.trip.pk}_{datestring}.jsonl"
+            )
+            # (Delayed, so that trips no longer in lottery mode leave no file)
+            self.handler = logging.FileHandler(
+                self.structured_log_filename, encoding='utf-8', delay=True
+            )
+            self.handler.setFormatter(JSONLinesFormatter())
+        else:
+            self.log_stream = io.StringIO()
+            self.handler = logging.StreamHandler(stream=self.log_stream)
         self.handler.setLevel(logging.DEBUG)
         self.logger.addHandler(self.handler)
 
+    def close_log(self):
+        self.handler.close()
+        self.logger.removeHandler(self.handler)
+        if self.log_stream:
+            self.log_stream.close()
+
+    def _preloaded_participants(self) -> Optional[List[models.Participant]]:
+        if self.participants is None:
+            return None
+        preloaded = []
+        for data in self.participants:
+            par = models.Participant(
+                pk=data['pk'],
+                name=data['name'],
+                email=data['email'],
+                affiliation=data['affiliation'],
+            )
+            par.reciprocally_paired = data['reciprocally_paired']
+            preloaded.append(par)
+        return preloaded
+
     def _make_fcfs(self):
         """After lottery execution, mark the trip FCFS & write out the log."""
         self.trip.algorithm = 'fcfs'
-        self.trip.lottery_log = self.log_stream.getvalue()
-        self.log_stream.close()
+        if self.structured_log_filename:
+            self.handler.close()
+            with open(self.structured_log_filename, encoding='utf-8') as jsonl:
+                self.trip.lottery_log = text_log(jsonl)
+        else:
+            self.trip.lottery_log = self.log_stream.getvalue()
+        self.close_log()
         self.trip.save()
 
     def __call__(self):
         if self.trip.algorithm != 'lottery':
-            self.log_stream.close()
+            self.close_log()
             return
 
         self.logger.info("Randomly ordering (preference to MIT affiliates)...")
-        ranked_participants = list(SingleTripParticipantRanker(self.trip))
+        ranker = SingleTripParticipantRanker(self.trip, self._preloaded_participants())
+        ranked_participants = list(ranker)
 
         if not ranked_participants:
             self.logger.info("No participants signed up.")
@@ -113,7 +229,10 @@ class SingleTripLotteryRunner(LotteryRunner):
         for i, (par, key) in enumerate(ranked_participants, start=1):
             affiliation = par.get_affiliation_display()
             # pylint: disable=logging-format-interpolation,logging-fstring-interpolation
-            self.logger.info(f"{i:3}. {par.name:{max_len + 3}} ({affiliation}, {key})")
+            self.logger.info(
+                f"{i:3}. {par.name:{max_len + 3}} ({affiliation}, {key})",
+                extra=event('ranked', par, self.trip, rank=i),
+            )
 
         self.logger.info(50 * '-')
         for participant, _ in ranked_participants:
@@ -123,8 +242,24 @@ class SingleTripLotteryRunner(LotteryRunner):
 
 
 class WinterSchoolLotteryRunner(LotteryRunner):
-    def __init__(self, execution_datetime=None):
+    def __init__(
+        self,
+        execution_datetime=None,
+        in_memory=True,
+        structured_log=False,
+        log_dir: Optional[Path] = None,
+    ):
+        """
+        :param in_memory: Place participants in memory, saving results at the end.
+            (Otherwise, each placement, bump, & waitlisting is written as it occurs)
+        :param structured_log: Also write the log as JSON lines (`.jsonl`),
+            next to the text log
+        :param log_dir: Where to write logs & profiles (default: `WS_LOTTERY_LOG_DIR`)
+        """
         self.execution_datetime = execution_datetime or local_now()
+        self.in_memory = in_memory
+        self.structured_log = structured_log
+        self.log_dir = Path(log_dir or settings.WS_LOTTERY_LOG_DIR)
         self.ranker = WinterSchoolParticipantRanker(self.execution_datetime)
         super().__init__()
         self.configure_logger()
@@ -132,18 +267,45 @@ class WinterSchoolLotteryRunner(LotteryRunner):
     def configure_logger(self):
         """Configure a stream to save the log to the trip."""
         datestring = datetime.strftime(local_now(), "%Y-%m-%dT:%H:%M:%S")
-        filename = Path(settings.WS_LOTTERY_LOG_DIR, f"ws_{datestring}.log")
+        filename = self.log_dir / f"ws_{datestring}.log"
+        self.log_filename = filename
+        self.profile_filename = filename.with_name(f"ws_{datestring}.profile.json")
         self.handler = logging.FileHandler(filename)
         self.handler.setLevel(logging.DEBUG)
         self.logger.addHandler(self.handler)
 
+        self.structured_log_filename: Optional[Path] = None
+        self.structured_handler: Optional[logging.Handler] = None
+        if self.structured_log:
+            self.structured_log_filename = filename.with_name(f"ws_{datestring}.jsonl")
+            self.structured_handler = logging.FileHandler(
+                self.structured_log_filename, encoding='utf-8'
+            )
+            self.structured_handler.setLevel(logging.DEBUG)
+            self.structured_handler.setFormatter(JSONLinesFormatter())
+            self.logger.addHandler(self.structured_handler)
+
+    def close_log(self):
+        for handler in [self.handler, self.structured_handler]:
+            if handler:
+                handler.close()
+                self.logger.removeHandler(handler)
+
     def __call__(self):
         self.logger.info(
             "Running the Winter School lottery for %s", self.execution_datetime
         )
-        self.assign_trips()
-        self.free_for_all()
-        self.handler.close()
+        with self.profiler.profile():
+            with self.profiler.phase('assign_trips'):
+                self.assign_trips()
+            with self.profiler.phase('free_for_all'):
+                self.free_for_all()
+        self.close_log()
+        self.profiler.write(
+            self.profile_filename,
+            execution_datetime=self.execution_datetime.isoformat(),
+            in_memory=self.in_memory,
+        )
 
     def free_for_all(self):
         """Make trips first-come, first-serve.
@@ -160,22 +322,85 @@ class WinterSchoolLotteryRunner(LotteryRunner):
     def signup_to_bump(self, trip):
         return self.ranker.lowest_non_driver(trip)
 
+    def driver_signups(self):
+        """Return (participant pk, trip pk) for each driver's signup not on the trip."""
+        return models.SignUp.objects.filter(
+            on_trip=False,
+            trip__algorithm='lottery',
+            trip__trip_date__gt=self.execution_datetime.date(),
+            trip__program=enums.Program.WINTER_SCHOOL.value,
+            participant__lotteryinfo__car_status__in=['own', 'rent'],
+        ).values_list('participant_id', 'trip_id')
+
+    def _log_handling_header(self, participant, key, global_rank):
+        # get_affiliation_display() includes extra explanatory text we don't need
+        affiliation = AFFILIATION_MAPPING[participant.affiliation]
+        handling_header = [f"\nHandling {participant}", f"({affiliation}, {key})"]
+        self.logger.debug(
+            '\n'.join(handling_header),
+            extra=event('handling', participant, rank=global_rank),
+        )
+        self.logger.debug('-' * max(len(line) for line in handling_header))
+
+    def _log_result(self, participant, json_result, global_rank, key):
+        if json_result is not None:
+            json_result.update(
+                {'global_rank': global_rank, 'has_flaked': key.flake_factor > 0}
+            )
+            self.logger.debug(
+                "RESULT: %s",
+                json.dumps(json_result),
+                extra=event('result', participant, rank=global_rank),
+            )
+
+    def simulate(self) -> WinterSchoolLotterySimulation:
+        """Place all participants in memory, without writing anything to the db.
+
+        The returned simulation may be inspected (a "dry run" of the lottery),
+        or saved to commit its placements.
+        """
+        self.participants_seen.clear()
+        self.participants_handled.clear()
+
+        with self.profiler.phase('rank'):
+            ranked_participants = list(self.ranker)
+        with self.profiler.phase('load'):
+            simulation = WinterSchoolLotterySimulation(self, ranked_participants)
+            self.track_unhandled_drivers(simulation.driver_signups())
+        with self.profiler.phase('place'):
+            for global_rank, (participant, key) in enumerate(
+                ranked_participants, start=1
+            ):
+                self._log_handling_header(participant, key, global_rank)
+                par_handler = WinterSchoolParticipantHandler(
+                    simulation.participant(participant.pk), self, store=simulation
+                )
+                with self.profiler.handling_participant():
+                    json_result = par_handler.place_participant()
+                self._log_result(participant, json_result, global_rank, key)
+        return simulation
+
     def assign_trips(self):
         num_participants = self.ranker.participants_to_handle().count()
         self.logger.info(
             "%s participants signed up for trips this week", num_participants
         )
-        for global_rank, (participant, key) in enumerate(self.ranker, start=1):
-            # get_affiliation_display() includes extra explanatory text we don't need
-            affiliation = AFFILIATION_MAPPING[participant.affiliation]
-            handling_header = [f"\nHandling {participant}", f"({affiliation}, {key})"]
-            self.logger.debug('\n'.join(handling_header))
-            self.logger.debug('-' * max(len(line) for line in handling_header))
-            par_handler = WinterSchoolParticipantHandler(participant, self)
-
-            json_result = par_handler.place_participant()
-            if json_result is not None:
-                json_result.update(
-                    {'global_rank': global_rank, 'has_flaked': key.flake_factor > 0}
-                )
-                self.logger.debug("RESULT: %s", json.dumps(json_result))
+        if self.in_memory:
+            simulation = self.simulate()
+            with self.profiler.phase('save'):
+                simulation.save()
+            return
+
+        with self.profiler.phase('rank'):
+            ranked_participants = list(self.ranker)
+        with self.profiler.phase('load'):
+            self.track_unhandled_drivers(self.driver_signups())
+        with self.profiler.phase('place'):
+            for global_rank, (participant, key) in enumerate(
+                ranked_participants, start=1
+            ):
+                self._log_handling_header(participant, key, global_rank)
+                par_handler = WinterSchoolParticipantHandler(participant, self)
+                with self.profiler.handling_participant():
+                    json_result = par_handler.place_participant()
+                self._log_result(participant, json_result, global_rank, key)
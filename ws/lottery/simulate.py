@@ -0,0 +1,502 @@
+"""Run the Winter School lottery entirely in memory.
+
+By default, `WinterSchoolParticipantHandler` places participants by modifying
+`SignUp` and `WaitListSignup` rows one at a time. Every check of a trip's open
+slots, every count of drivers, and every bump goes back to the database. With
+over a thousand participants signed up for dozens of trips, that's a lot of queries.
+
+Objects in this module load everything the lottery reads exactly once. The
+simulation offers the same operations as `handle.DatabaseStore`, so the very
+same handler can place participants in memory, after which the final
+placements are written back in a single transaction. Since nothing is written
+until the very end, a lottery can also be "dry run" as many times as is desired.
+"""
+import heapq
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from ws import enums, models
+
+
+class LotteryParticipant(NamedTuple):
+    """The (immutable) information about a participant that the lottery needs."""
+
+    pk: int
+    name: str
+    email: str
+    affiliation: str
+    is_driver: bool
+    # The requested partner (who may or may not have reciprocated)
+    paired_with_id: Optional[int]
+    reciprocally_paired: bool
+    # Only unranked participants (requested partners without signups) lack a key
+    priority_key: Optional[Tuple]
+
+    def __str__(self):
+        return self.name
+
+
+class SimulatedWaitListSignup:
+    def __init__(
+        self,
+        signup: 'SimulatedSignUp',
+        time_created: datetime,
+        manual_order: Optional[int] = None,
+        pk: Optional[int] = None,
+    ):
+        self.signup = signup
+        self.time_created = time_created
+        self.manual_order = manual_order
+        self.pk = pk
+        self.modified = pk is None
+
+    def sort_key(self):
+        """Order just as `WaitList.signups` does (NULL manual orders last)."""
+        no_manual_order = self.manual_order is None
+        return (no_manual_order, -(self.manual_order or 0), self.time_created)
+
+
+class SimulatedSignUp:
+    def __init__(
+        self,
+        pk: int,
+        participant: LotteryParticipant,
+        trip: 'SimulatedTrip',
+        order: Optional[int],
+        time_created: datetime,
+        on_trip: bool,
+    ):
+        self.pk = pk
+        self.participant = participant
+        self.trip = trip
+        self.order = order
+        self.time_created = time_created
+        self._on_trip = False
+        self.on_trip = on_trip
+
+        self.last_updated: Optional[datetime] = None  # Only set once modified
+        self.waitlistsignup: Optional[SimulatedWaitListSignup] = None
+
+    def __str__(self):
+        return f"{self.participant.name} on {self.trip}"
+
+    @property
+    def trip_id(self) -> int:
+        return self.trip.pk
+
+    @property
+    def on_trip(self) -> bool:
+        return self._on_trip
+
+    @on_trip.setter
+    def on_trip(self, on_trip: bool):
+        if on_trip != self._on_trip:
+            self.trip.num_on_trip += 1 if on_trip else -1
+        self._on_trip = on_trip
+        if on_trip and not self.participant.is_driver:
+            self.trip.add_non_driver(self)
+
+    @property
+    def modified(self) -> bool:
+        return self.last_updated is not None
+
+    def save(self):
+        self.last_updated = timezone.now()
+
+    def rank_key(self):
+        """Order just as `ranked_signups()` does (NULL orders last)."""
+        return (self.order is None, self.order or 0, self.time_created, self.pk)
+
+
+class SimulatedTrip:
+    def __init__(
+        self,
+        pk: int,
+        name: str,
+        maximum_participants: int,
+        waitlist_id: int,
+        num_leader_drivers: int,
+    ):
+        self.pk = pk
+        self.name = name
+        self.maximum_participants = maximum_participants
+        self.waitlist_id = waitlist_id
+        self.num_leader_drivers = num_leader_drivers
+
+        self.num_on_trip = 0
+        self.signups: List[SimulatedSignUp] = []
+        self.waitlist: List[SimulatedWaitListSignup] = []
+
+        # Max-heap of on-trip non-drivers, lowest priority (highest key) first.
+        # Entries for signups since removed from the trip are discarded lazily.
+        self._non_drivers: List[Tuple[Tuple, int, SimulatedSignUp]] = []
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def open_slots(self) -> int:
+        return self.maximum_participants - self.num_on_trip
+
+    def add_non_driver(self, signup: SimulatedSignUp):
+        inverted_key = tuple(-value for value in signup.participant.priority_key)
+        heapq.heappush(self._non_drivers, (inverted_key, signup.pk, signup))
+
+    def lowest_non_driver(self) -> Optional[SimulatedSignUp]:
+        """Return the lowest priority non-driver on the trip, in O(log n)."""
+        while self._non_drivers and not self._non_drivers[0][-1].on_trip:
+            heapq.heappop(self._non_drivers)
+        return self._non_drivers[0][-1] if self._non_drivers else None
+
+    @property
+    def on_trip(self) -> List[SimulatedSignUp]:
+        return [signup for signup in self.signups if signup.on_trip]
+
+    @property
+    def first_of_priority(self) -> int:
+        """The 'manual_order' value to be first in the waitlist.
+
+        See `WaitList.first_of_priority`
+        """
+        if not self.waitlist:
+            return 10
+        first = min(self.waitlist, key=SimulatedWaitListSignup.sort_key)
+        return (first.manual_order or 0) + 1
+
+    @property
+    def last_of_priority(self) -> int:
+        """The 'manual_order' value to be below all manual orders, but above non-ordered.
+
+        See `WaitList.last_of_priority`
+        """
+        manual_orders = [
+            wl_signup.manual_order
+            for wl_signup in self.waitlist
+            if wl_signup.manual_order is not None
+        ]
+        if not manual_orders:
+            return 10
+        return min(manual_orders) - 1
+
+
+class WinterSchoolLotterySimulation:
+    """All the state that a Winter School lottery run reads, held in memory."""
+
+    def __init__(self, runner, ranked_participants):
+        """Load trips, signups, and car/pairing info for the ranked participants.
+
+        :param runner: An instance of WinterSchoolLotteryRunner
+        :param ranked_participants: (participant, priority_key) tuples, ranked
+        """
+        self.runner = runner
+        self.lottery_rundate = runner.execution_datetime.date()
+
+        self.priority_keys = {par.pk: key for par, key in ranked_participants}
+        self.participants = self._load_participants(
+            [par for par, _ in ranked_participants]
+        )
+        self.trips = self._load_trips()
+
+        self.signups_by_par: Dict[int, List[SimulatedSignUp]] = defaultdict(list)
+        self._load_signups()
+
+    def _load_participants(self, ranked) -> Dict[int, LotteryParticipant]:
+        lotteryinfo_by_par = {
+            par_pk: (car_status, paired_with_id)
+            for par_pk, car_status, paired_with_id in models.LotteryInfo.objects.filter(
+                participant_id__in=[par.pk for par in ranked]
+            ).values_list('participant_id', 'car_status', 'paired_with_id')
+        }
+
+        participants = {}
+        for par in ranked:
+            car_status, paired_with_id = lotteryinfo_by_par.get(par.pk, ('none', None))
+            participants[par.pk] = LotteryParticipant(
+                pk=par.pk,
+                name=par.name,
+                email=par.email,
+                affiliation=par.affiliation,
+                is_driver=car_status in ['own', 'rent'],
+                paired_with_id=paired_with_id,
+                reciprocally_paired=bool(par.reciprocally_paired),
+                priority_key=self.priority_keys[par.pk],
+            )
+
+        # Requested partners may not have signed up for any trips this week.
+        unranked_partners = models.Participant.objects.filter(
+            pk__in={par.paired_with_id for par in participants.values()}
+        ).exclude(pk__in=participants)
+        for pk, name, email, affiliation in unranked_partners.values_list(
+            'pk', 'name', 'email', 'affiliation'
+        ):
+            participants[pk] = LotteryParticipant(
+                pk=pk,
+                name=name,
+                email=email,
+                affiliation=affiliation,
+                is_driver=False,
+                paired_with_id=None,
+                reciprocally_paired=False,
+                priority_key=None,
+            )
+        return participants
+
+    def _load_trips(self) -> Dict[int, SimulatedTrip]:
+        trips = models.Trip.objects.filter(
+            algorithm='lottery',
+            trip_date__gt=self.lottery_rundate,
+            program=enums.Program.WINTER_SCHOOL.value,
+        )
+        leader_drivers = Counter(
+            models.Trip.leaders.through.objects.filter(
+                trip__in=trips,
+                participant__lotteryinfo__car_status__in=['own', 'rent'],
+            ).values_list('trip_id', flat=True)
+        )
+        return {
+            pk: SimulatedTrip(
+                pk=pk,
+                name=name,
+                maximum_participants=maximum_participants,
+                waitlist_id=waitlist_id,
+                num_leader_drivers=leader_drivers[pk],
+            )
+            for pk, name, maximum_participants, waitlist_id in trips.values_list(
+                'pk', 'name', 'maximum_participants', 'waitlist'
+            )
+        }
+
+    def _load_signups(self):
+        signups = models.SignUp.objects.filter(trip_id__in=self.trips).values_list(
+            'pk',
+            'participant_id',
+            'trip_id',
+            'order',
+            'time_created',
+            'on_trip',
+            'waitlistsignup__pk',
+            'waitlistsignup__manual_order',
+            'waitlistsignup__time_created',
+        )
+        for (
+            pk,
+            par_pk,
+            trip_pk,
+            order,
+            time_created,
+            on_trip,
+            wl_pk,
+            wl_manual_order,
+            wl_time_created,
+        ) in signups:
+            trip = self.trips[trip_pk]
+            signup = SimulatedSignUp(
+                pk=pk,
+                participant=self._ranked_participant(par_pk),
+                trip=trip,
+                order=order,
+                time_created=time_created,
+                on_trip=on_trip,
+            )
+            if wl_pk is not None:
+                signup.waitlistsignup = SimulatedWaitListSignup(
+                    signup,
+                    time_created=wl_time_created,
+                    manual_order=wl_manual_order,
+                    pk=wl_pk,
+                )
+                trip.waitlist.append(signup.waitlistsignup)
+            trip.signups.append(signup)
+            self.signups_by_par[par_pk].append(signup)
+
+        for par_signups in self.signups_by_par.values():
+            par_signups.sort(key=SimulatedSignUp.rank_key)
+
+    def _ranked_participant(self, par_pk: int) -> LotteryParticipant:
+        """Return the participant with the given pk, verifying they were ranked.
+
+        Bumping a non-driver compares priority keys, so every participant with
+        a signup must have a complete key (unlike unranked partners).
+        """
+        participant = self.participants.get(par_pk)
+        key = participant and participant.priority_key
+        if key is None or None in key:
+            raise ValueError(f"Participant {par_pk} has signups, but was not ranked")
+        return participant
+
+    def driver_signups(self) -> List[Tuple[int, int]]:
+        """Return (participant pk, trip pk) for each driver's signup not on the trip."""
+        return [
+            (signup.participant.pk, trip.pk)
+            for trip in self.trips.values()
+            for signup in trip.signups
+            if signup.participant.is_driver and not signup.on_trip
+        ]
+
+    def participant(self, par_pk: int) -> LotteryParticipant:
+        return self.participants[par_pk]
+
+    # The methods below mirror those of `handle.DatabaseStore`
+
+    @staticmethod
+    def is_driver(participant: LotteryParticipant) -> bool:
+        return participant.is_driver
+
+    def paired_par(self, participant: LotteryParticipant):
+        if participant.paired_with_id is None:
+            return None
+        return self.participant(participant.paired_with_id)
+
+    @staticmethod
+    def reciprocally_paired(participant: LotteryParticipant) -> bool:
+        return participant.reciprocally_paired
+
+    def ranked_signups(
+        self, participant, after: Optional[date] = None
+    ) -> List[SimulatedSignUp]:
+        """Return all future WS signups for the participant (not already on a trip).
+
+        Only trips after the lottery's run date were ever loaded.
+        """
+        assert after in {None, self.lottery_rundate}
+        return [s for s in self.signups_by_par[participant.pk] if not s.on_trip]
+
+    def signup_for(self, participant, trip: SimulatedTrip) -> SimulatedSignUp:
+        return next(s for s in self.signups_by_par[participant.pk] if s.trip is trip)
+
+    def signups_shared_with(
+        self, signups: List[SimulatedSignUp], partner
+    ) -> List[SimulatedSignUp]:
+        """Of the given signups, return those for trips the partner signed up for."""
+        partner_trips = {s.trip for s in self.signups_by_par[partner.pk]}
+        return [s for s in signups if s.trip in partner_trips]
+
+    @staticmethod
+    def count_drivers_on_trip(trip: SimulatedTrip) -> int:
+        participant_drivers = [s for s in trip.on_trip if s.participant.is_driver]
+        return len(participant_drivers) + trip.num_leader_drivers
+
+    @staticmethod
+    def waiting_drivers(trip: SimulatedTrip) -> List[LotteryParticipant]:
+        """Return participants of all drivers signed up for, but not on, the trip."""
+        return [
+            s.participant
+            for s in trip.signups
+            if s.participant.is_driver and not s.on_trip
+        ]
+
+    @staticmethod
+    def signup_to_bump(trip: SimulatedTrip) -> Optional[SimulatedSignUp]:
+        """Return the lowest priority non-driver on the trip.
+
+        See `WinterSchoolParticipantRanker.lowest_non_driver`
+        """
+        return trip.lowest_non_driver()
+
+    def add_to_waitlist(
+        self, signup: SimulatedSignUp, prioritize=False, top_spot=False
+    ) -> SimulatedWaitListSignup:
+        """Add the given signup to the waitlist (see `utils.signups.add_to_waitlist`)."""
+        signup.on_trip = False
+        signup.save()
+
+        wl_signup = signup.waitlistsignup
+        if wl_signup is None:
+            wl_signup = SimulatedWaitListSignup(signup, time_created=timezone.now())
+            signup.waitlistsignup = wl_signup
+            signup.trip.waitlist.append(wl_signup)
+
+        if prioritize:
+            trip = signup.trip
+            if top_spot:
+                wl_signup.manual_order = trip.first_of_priority
+            else:
+                wl_signup.manual_order = trip.last_of_priority
+            wl_signup.modified = True
+        return wl_signup
+
+    def placements(self) -> Dict[int, bool]:
+        """Map each signup's primary key to whether or not it's on the trip."""
+        return {
+            signup.pk: signup.on_trip
+            for trip in self.trips.values()
+            for signup in trip.signups
+        }
+
+    def waitlists(self) -> Dict[int, List[int]]:
+        """Map each trip's primary key to its waitlisted signups (in order)."""
+        return {
+            trip.pk: [
+                wl_signup.signup.pk
+                for wl_signup in sorted(
+                    trip.waitlist, key=SimulatedWaitListSignup.sort_key
+                )
+            ]
+            for trip in self.trips.values()
+        }
+
+    @transaction.atomic
+    def save(self):
+        """Write all placements & waitlist changes back to the database."""
+        modified_signups: List[SimulatedSignUp] = []
+        modified_wl_signups: List[SimulatedWaitListSignup] = []
+        for trip in self.trips.values():
+            modified_signups.extend(s for s in trip.signups if s.modified)
+            modified_wl_signups.extend(wl for wl in trip.waitlist if wl.modified)
+
+        models.SignUp.objects.bulk_update(
+            [
+                models.SignUp(
+                    pk=signup.pk,
+                    on_trip=signup.on_trip,
+                    last_updated=signup.last_updated,
+                )
+                for signup in modified_signups
+            ],
+            ['on_trip', 'last_updated'],
+        )
+        models.Trip.objects.filter(pk__in=self.trips).recount_on_trip()
+
+        new_wl_signups: List[Tuple[SimulatedWaitListSignup, models.WaitListSignup]] = [
+            (
+                wl_signup,
+                models.WaitListSignup(
+                    signup_id=wl_signup.signup.pk,
+                    waitlist_id=wl_signup.signup.trip.waitlist_id,
+                ),
+            )
+            for wl_signup in modified_wl_signups
+            if wl_signup.pk is None
+        ]
+        models.WaitListSignup.objects.bulk_create(
+            [wl_signup for _, wl_signup in new_wl_signups]
+        )
+        for simulated, created in new_wl_signups:
+            simulated.pk = created.pk
+
+        # `time_created` is set automatically on creation; `bulk_update` overrides it.
+        # (The order in which participants were waitlisted must be preserved)
+        models.WaitListSignup.objects.bulk_update(
+            [
+                models.WaitListSignup(
+                    pk=wl_signup.pk,
+                    manual_order=wl_signup.manual_order,
+                    time_created=wl_signup.time_created,
+                )
+                for wl_signup in modified_wl_signups
+            ],
+            ['manual_order', 'time_created'],
+        )
+        models.WaitListSignup.objects.filter(
+            pk__in=[wl_signup.pk for wl_signup in modified_wl_signups]
+        ).reindex()
+
+        for signup in modified_signups:
+            signup.last_updated = None
+        for wl_signup in modified_wl_signups:
+            wl_signup.modified = False
+
@@ -0,0 +1,303 @@
+"""Snapshots of exactly the data read by the Winter School lottery.
+
+Before each Winter School lottery, we do a test run to make sure results are
+deterministic. Restoring a full copy of the production database just to do so
+is slow; instead, a snapshot holds only what the lottery reads (a compact list
+of rows per table). A snapshot can be replayed into an empty database in just
+a few seconds, and the placements compared against those of another run.
+
+Participants are ranked by a seed that includes `PRNG_SEED_SECRET`, so replays
+only match production if run with the same secret.
+"""
+import json
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from mitoc_const import affiliations
+
+from ws import enums, models
+from ws.lottery.rank import WinterSchoolParticipantRanker
+from ws.lottery.run import WinterSchoolLotteryRunner
+
+VERSION = 1
+
+# The columns exported (in order) for each table in the snapshot
+COLUMNS: Dict[str, Tuple[str, ...]] = {
+    'participants': ('pk', 'name', 'email', 'affiliation'),
+    'lottery_info': ('participant_id', 'car_status', 'paired_with_id'),
+    'trips': (
+        'pk',
+        'name',
+        'program',
+        'algorithm',
+        'trip_date',
+        'maximum_participants',
+    ),
+    'leaders': ('trip_id', 'participant_id'),
+    'signups': ('pk', 'participant_id', 'trip_id', 'order', 'time_created', 'on_trip'),
+    'waitlist_signups': ('signup_id', 'manual_order', 'time_created'),
+    'flakes': ('participant_id', 'trip_id'),
+    'adjustments': ('participant_id', 'adjustment', 'expires'),
+    'separations': ('initiator_id', 'recipient_id'),
+}
+
+# Replay results: placements by participant, waitlisted participants by trip
+# (Keys are strings, so results survive a round trip through JSON unchanged)
+Results = Dict[str, Dict[str, List[int]]]
+
+
+def _rows(queryset, table: str) -> List[Tuple]:
+    return list(queryset.values_list(*COLUMNS[table]).distinct())
+
+
+def export_snapshot(execution_datetime: datetime) -> Dict[str, Any]:
+    """Gather everything the lottery would read if run at the given time."""
+    ranker = WinterSchoolParticipantRanker(execution_datetime)
+    today, last_year = ranker.today, ranker.today - timedelta(days=365)
+
+    lottery_trips = models.Trip.objects.filter(
+        algorithm='lottery',
+        trip_date__gt=today,
+        program=enums.Program.WINTER_SCHOOL.value,
+    )
+    par_pks = set(ranker.participants_to_handle().values_list('pk', flat=True))
+
+    # Past trips are needed only to rank participants (attendance, trips led)
+    past_ws_signups = models.SignUp.objects.filter(
+        participant_id__in=par_pks,
+        on_trip=True,
+        trip__program=enums.Program.WINTER_SCHOOL.value,
+        trip__trip_date__gt=ranker.jan_1st,
+        trip__trip_date__lt=today,
+    )
+    flakes = models.Feedback.objects.filter(
+        participant_id__in=par_pks,
+        showed_up=False,
+        trip__program=enums.Program.WINTER_SCHOOL.value,
+    )
+    leaders = models.Trip.leaders.through.objects.filter(
+        trip__in=lottery_trips
+    ) | models.Trip.leaders.through.objects.filter(
+        participant_id__in=par_pks,
+        trip__trip_date__gt=last_year,
+        trip__trip_date__lt=today,
+    )
+    trips = models.Trip.objects.filter(
+        pk__in={
+            *lottery_trips.values_list('pk', flat=True),
+            *past_ws_signups.values_list('trip_id', flat=True),
+            *flakes.values_list('trip_id', flat=True),
+            *leaders.values_list('trip_id', flat=True),
+        }
+    )
+
+    # Partners (even those without signups) & lottery trip leaders are read, too
+    partners = models.LotteryInfo.objects.filter(
+        participant_id__in=par_pks, paired_with__isnull=False
+    ).values_list('paired_with_id', flat=True)
+    trip_leaders = leaders.filter(trip__in=lottery_trips).values_list(
+        'participant_id', flat=True
+    )
+    all_par_pks = par_pks | set(partners) | set(trip_leaders)
+
+    snapshot = {
+        'version': VERSION,
+        'execution_datetime': execution_datetime,
+        'participants': _rows(
+            models.Participant.objects.filter(pk__in=all_par_pks), 'participants'
+        ),
+        'lottery_info': [
+            # (A partner's own partner may not be in the lottery at all)
+            (par_pk, car_status, paired_with if paired_with in all_par_pks else None)
+            for par_pk, car_status, paired_with in _rows(
+                models.LotteryInfo.objects.filter(participant_id__in=all_par_pks),
+                'lottery_info',
+            )
+        ],
+        'trips': _rows(trips, 'trips'),
+        'leaders': _rows(leaders, 'leaders'),
+        'signups': _rows(
+            models.SignUp.objects.filter(trip__in=lottery_trips) | past_ws_signups,
+            'signups',
+        ),
+        'waitlist_signups': _rows(
+            models.WaitListSignup.objects.filter(signup__trip__in=lottery_trips),
+            'waitlist_signups',
+        ),
+        'flakes': _rows(flakes, 'flakes'),
+        'adjustments': _rows(
+            models.LotteryAdjustment.objects.filter(
+                participant_id__in=par_pks, expires__gt=execution_datetime
+            ),
+            'adjustments',
+        ),
+        'separations': _rows(
+            models.LotterySeparation.objects.filter(
+                initiator_id__in=par_pks, recipient_id__in=par_pks
+            ),
+            'separations',
+        ),
+    }
+    # Round-trip through JSON, so a snapshot is identical whether or not it's saved
+    return json.loads(json.dumps(snapshot, cls=DjangoJSONEncoder))
+
+
+def _records(snapshot: Dict[str, Any], table: str) -> Iterable[Dict[str, Any]]:
+    for row in snapshot[table]:
+        yield dict(zip(COLUMNS[table], row))
+
+
+def _set_time_created(model, objects: List, times: List[str]):
+    """Set creation times (`auto_now_add` overrides any value on creation)."""
+    for obj, time_created in zip(objects, times):
+        obj.time_created = parse_datetime(time_created)
+    model.objects.bulk_update(objects, ['time_created'])
+
+
+def load_snapshot(snapshot: Dict[str, Any]):
+    """Write all rows in the snapshot (into what should be an empty database!)."""
+    if snapshot['version'] != VERSION:
+        raise ValueError(f"Unsupported snapshot version {snapshot['version']}")
+
+    participants = list(_records(snapshot, 'participants'))
+
+    # Trips & adjustments require a creator (who plays no part in the lottery)
+    creator_pk = max((par['pk'] for par in participants), default=0) + 1
+    participants.append(
+        {
+            'pk': creator_pk,
+            'name': "Lottery Replay",
+            'email': 'lottery-replay@example.com',
+            'affiliation': affiliations.NON_AFFILIATE.CODE,
+        }
+    )
+
+    # Participants require a user & emergency info (neither is read by the lottery)
+    users = models.User.objects.bulk_create(
+        models.User(username=f"lottery-replay-{par['pk']}") for par in participants
+    )
+    infos = models.EmergencyInfo.objects.bulk_create(
+        models.EmergencyInfo(emergency_contact=contact)
+        for contact in models.EmergencyContact.objects.bulk_create(
+            models.EmergencyContact() for _ in participants
+        )
+    )
+    models.Participant.objects.bulk_create(
+        models.Participant(user_id=user.pk, emergency_info=info, **par)
+        for par, user, info in zip(participants, users, infos)
+    )
+    models.LotteryInfo.objects.bulk_create(
+        models.LotteryInfo(**info) for info in _records(snapshot, 'lottery_info')
+    )
+
+    trips = models.Trip.objects.bulk_create(
+        models.Trip(creator_id=creator_pk, **trip)
+        for trip in _records(snapshot, 'trips')
+    )
+    waitlist_by_trip = {
+        waitlist.trip_id: waitlist
+        for waitlist in models.WaitList.objects.bulk_create(
+            models.WaitList(trip=trip) for trip in trips
+        )
+    }
+    models.Trip.leaders.through.objects.bulk_create(
+        models.Trip.leaders.through(**leader)
+        for leader in _records(snapshot, 'leaders')
+    )
+
+    signup_records = list(_records(snapshot, 'signups'))
+    signups = models.SignUp.objects.bulk_create(
+        models.SignUp(**signup) for signup in signup_records
+    )
+    _set_time_created(
+        models.SignUp, signups, [signup['time_created'] for signup in signup_records]
+    )
+    models.Trip.objects.filter(pk__in=[trip.pk for trip in trips]).recount_on_trip()
+    trip_by_signup = {signup.pk: signup.trip_id for signup in signups}
+    wl_records = list(_records(snapshot, 'waitlist_signups'))
+    wl_signups = models.WaitListSignup.objects.bulk_create(
+        models.WaitListSignup(
+            signup_id=wl_signup['signup_id'],
+            waitlist=waitlist_by_trip[trip_by_signup[wl_signup['signup_id']]],
+            manual_order=wl_signup['manual_order'],
+        )
+        for wl_signup in wl_records
+    )
+    _set_time_created(
+        models.WaitListSignup,
+        wl_signups,
+        [wl_signup['time_created'] for wl_signup in wl_records],
+    )
+    models.WaitListSignup.objects.filter(
+        pk__in=[wl_signup.pk for wl_signup in wl_signups]
+    ).reindex()
+
+    models.Feedback.objects.bulk_create(
+        models.Feedback(leader_id=creator_pk, showed_up=False, **flake)
+        for flake in _records(snapshot, 'flakes')
+    )
+    models.LotteryAdjustment.objects.bulk_create(
+        models.LotteryAdjustment(creator_id=creator_pk, **adjustment)
+        for adjustment in _records(snapshot, 'adjustments')
+    )
+    models.LotterySeparation.objects.bulk_create(
+        models.LotterySeparation(creator_id=creator_pk, **separation)
+        for separation in _records(snapshot, 'separations')
+    )
+
+
+def summarize(simulation) -> Results:
+    """Summarize where a simulated lottery placed (or waitlisted) participants."""
+    signups = {
+        signup.pk: signup
+        for trip in simulation.trips.values()
+        for signup in trip.signups
+    }
+    placements: Dict[str, List[int]] = defaultdict(list)
+    for signup_pk, on_trip in simulation.placements().items():
+        if on_trip:
+            signup = signups[signup_pk]
+            placements[str(signup.participant.pk)].append(signup.trip.pk)
+    return {
+        'placements': {par: sorted(trips) for par, trips in placements.items()},
+        'waitlists': {
+            str(trip_pk): [signups[pk].participant.pk for pk in signup_pks]
+            for trip_pk, signup_pks in simulation.waitlists().items()
+        },
+    }
+
+
+def replay(snapshot: Dict[str, Any]) -> Results:
+    """Run the lottery against the snapshot, returning its results.
+
+    Nothing is left behind in the database (all rows are rolled back), nor
+    among the logs of real lottery runs (the replay's log is discarded).
+    """
+    with transaction.atomic(), tempfile.TemporaryDirectory() as log_dir:
+        load_snapshot(snapshot)
+        runner = WinterSchoolLotteryRunner(
+            parse_datetime(snapshot['execution_datetime']), log_dir=Path(log_dir)
+        )
+        simulation = runner.simulate()
+        runner.close_log()
+        transaction.set_rollback(True)
+
+    return summarize(simulation)
+
+
+def diff_results(expected: Results, actual: Results) -> List[str]:
+    """Describe each way in which two lottery results differ."""
+    differences = []
+    for key, label in [('placements', "Participant"), ('waitlists', "Trip")]:
+        keys: Set[str] = {*expected[key], *actual[key]}
+        for pk in sorted(keys, key=int):
+            before, after = expected[key].get(pk, []), actual[key].get(pk, [])
+            if before != after:
+                differences.append(f"{label} {pk} {key[:-1]}: {before} != {after}")
+    return differences
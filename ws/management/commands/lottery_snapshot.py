@@ -0,0 +1,89 @@
+import json
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+
+from ws.lottery import snapshot
+from ws.utils.dates import local_now
+
+
+class Command(BaseCommand):
+    help = (
+        "Export a snapshot of Winter School lottery data, replay it, or compare runs."
+    )
+
+    def add_arguments(self, parser):
+        actions = parser.add_subparsers(dest='action', required=True)
+
+        export = actions.add_parser('export', help="Save what the lottery would read.")
+        export.add_argument('snapshot', help="Path for the snapshot (JSON)")
+        export.add_argument(
+            '--at',
+            dest='execution_datetime',
+            help="When the lottery will run (ISO 8601, defaults to now)",
+        )
+
+        replay = actions.add_parser(
+            'replay', help="Run the lottery on a snapshot (in an isolated database)."
+        )
+        replay.add_argument('snapshot', help="Path to a snapshot")
+        replay.add_argument('--output', help="Path to save results (JSON)")
+        replay.add_argument('--compare', help="Results of another run, to diff")
+
+        diff = actions.add_parser('diff', help="Compare the results of two runs.")
+        diff.add_argument('expected', help="Path to results")
+        diff.add_argument('actual', help="Path to results")
+
+    @contextmanager
+    def isolated_database(self):
+        """Use a separate, empty database (reused between replays, if possible)."""
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, keepdb=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=True)
+
+    @staticmethod
+    def _load(path):
+        with open(path, encoding='utf-8') as json_file:
+            return json.load(json_file)
+
+    @staticmethod
+    def _save(path, data):
+        with open(path, 'w', encoding='utf-8') as json_file:
+            json.dump(data, json_file)
+
+    def _report(self, expected, actual):
+        differences = snapshot.diff_results(expected, actual)
+        for difference in differences:
+            self.stdout.write(difference)
+        if differences:
+            raise CommandError(f"Results differ in {len(differences)} ways")
+        self.stdout.write(self.style.SUCCESS("Results are identical"))
+
+    def handle(self, *args, **options):
+        if options['action'] == 'export':
+            execution_datetime = local_now()
+            if options['execution_datetime']:
+                execution_datetime = parse_datetime(options['execution_datetime'])
+                if execution_datetime is None:
+                    raise CommandError("Invalid datetime given for --at")
+            data = snapshot.export_snapshot(execution_datetime)
+            self._save(options['snapshot'], data)
+            self.stdout.write(
+                f"Exported {len(data['participants'])} participants "
+                f"& {len(data['signups'])} signups to {options['snapshot']}"
+            )
+        elif options['action'] == 'replay':
+            data = self._load(options['snapshot'])
+            with self.isolated_database():
+                results = snapshot.replay(data)
+            if options['output']:
+                self._save(options['output'], results)
+            if options['compare']:
+                self._report(self._load(options['compare']), results)
+        else:
+            self._report(self._load(options['expected']), self._load(options['actual']))
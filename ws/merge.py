@@ -43,6 +43,7 @@ EXPECTED_PARTICIPANT_TABLES: Dict[str, Tuple[str, ...]] = {
     'ws_signup': ('participant_id',),
     'ws_passwordquality': ('participant_id',),
     'ws_membershipreminder': ('participant_id',),
+    'ws_cachedrentals': ('participant_id',),
 }
 
 # An enumeration of user FK columns that we explicitly intend to migrate
@@ -206,6 +207,11 @@ def _migrate_participant(old_pk, new_pk):
     simple_updates.pop('ws_passwordquality')
     models.PasswordQuality.objects.filter(participant_id=old_pk).delete()
 
+    # Rentals are cached under each participant's emails, which are merged.
+    # Just discard cached rentals (they'll be cached anew when next needed).
+    simple_updates.pop('ws_cachedrentals')
+    models.CachedRentals.objects.filter(participant_id__in=[old_pk, new_pk]).delete()
+
     # We want to be very sure that we don't notify the same human twice in one year.
     # (We also can have only one row per participant)
     # If two reminders are found, just keep the most recent one.
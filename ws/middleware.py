@@ -1,41 +1,24 @@
-from django.contrib.auth.models import User
-
+import ws.utils.perms as perm_utils
 from ws.messages import security
-from ws.models import Participant
 
 
-class PrefetchGroupsMiddleware:
-    """Prefetch the user's groups for use in the requset.
+class UserMiddleware:
+    """Include the user's participant (used in most views), and their permissions.
 
-    We do a lot of group-centric logic - if the user's groups aren't
-    prefetched, then we can easily have n+1 queries. This middleware
-    prevents n+1 queries, at the cost of 1 extra query.
+    The user is loaded with their groups and participant (with membership &
+    password quality) in just two queries - see `ws.auth_backends`.
 
-    This is a slight hack - the proper way to implement this is with
-    a custom authentication backend where we implement the get_user()
-    method to do the prefetching (we would obviously extend all-auth).
-    For now, this cuts down on query time and execution.
+    Finally, the user's permission context is built from those groups
+    (and reused for any permission checks made while handling the request).
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            filtered_user = User.objects.filter(pk=request.user.pk)
-            request.user = filtered_user.prefetch_related('groups').get()
-        return self.get_response(request)
-
-
-class ParticipantMiddleware:
-    """Include the user's participant (used in most views)"""
-
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        # TODO: We check for `password_quality` on every request. We should join that.
-        request.participant = Participant.from_user(request.user)
+        # Anonymous users (and users yet to create a participant) have none
+        request.participant = getattr(request.user, 'participant', None)
+        request.permissions = perm_utils.permissions(request.user)
         return self.get_response(request)
 
 
@@ -43,7 +26,7 @@ class CustomMessagesMiddleware:
     """Render some custom messages on every page load.
 
     Caution: *must* be installed after both:
-    - ParticipantMiddleware (to access participant info for messages)
+    - UserMiddleware (to access participant info for messages)
     - MessagesMiddleware (to render messages)
     """
 
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:37
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_signups_on_trip(apps, schema_editor):
+    Trip = apps.get_model('ws', 'Trip')
+    SignUp = apps.get_model('ws', 'SignUp')
+
+    on_trip = (
+        SignUp.objects.filter(trip=OuterRef('pk'), on_trip=True)
+        .order_by()
+        .values('trip')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    Trip.objects.update(on_trip_count=Coalesce(Subquery(on_trip), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0039_send_reminder_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='on_trip_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            count_signups_on_trip, reverse_code=migrations.RunPython.noop
+        ),
+    ]
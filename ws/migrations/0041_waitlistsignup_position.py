@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:45
+
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+
+def number_waitlist_positions(apps, schema_editor):
+    WaitListSignup = apps.get_model('ws', 'WaitListSignup')
+
+    ranked = WaitListSignup.objects.annotate(
+        rank=Window(
+            RowNumber(),
+            partition_by=[F('waitlist')],
+            order_by=[
+                F('manual_order').desc(nulls_last=True),
+                F('time_created').asc(),
+                F('pk').asc(),
+            ],
+        )
+    ).values_list('pk', 'rank')
+    WaitListSignup.objects.bulk_update(
+        [WaitListSignup(pk=pk, position=rank * 1024) for pk, rank in ranked],
+        ['position'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0040_trip_on_trip_count'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='waitlistsignup',
+            options={'ordering': ['position', 'pk']},
+        ),
+        migrations.AddField(
+            model_name='waitlistsignup',
+            name='position',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            number_waitlist_positions, reverse_code=migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='waitlistsignup',
+            index=models.Index(
+                fields=['waitlist', 'position'], name='ws_waitlist_waitlis_d02467_idx'
+            ),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:49
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+from ws import enums
+from ws.utils.dates import late_at_night
+
+
+def _name_with_rating(leader, trip):
+    """Mirrors `Participant.name_with_rating` (unavailable on historical models)."""
+    required_activity = enums.Program(trip.program).required_activity()
+    if required_activity is None:
+        return leader.name
+
+    at_time = late_at_night(trip.trip_date - timedelta(days=1))
+    ratings = [
+        rating
+        for rating in leader.leaderrating_set.all()
+        if rating.activity == required_activity.value and rating.time_created <= at_time
+    ]
+    if not ratings:
+        return leader.name
+    rating = max(ratings, key=lambda rating: rating.time_created).rating
+    return f"{leader.name} ({rating})" if rating else leader.name
+
+
+def summarize_trips(apps, schema_editor):
+    Trip = apps.get_model('ws', 'Trip')
+    TripSummary = apps.get_model('ws', 'TripSummary')
+
+    trips = Trip.objects.annotate(num_signups=Count('signup')).prefetch_related(
+        'leaders', 'leaders__leaderrating_set'
+    )
+    TripSummary.objects.bulk_create(
+        [
+            TripSummary(
+                trip=trip,
+                num_signups=trip.num_signups,
+                leaders_with_rating=[
+                    _name_with_rating(leader, trip) for leader in trip.leaders.all()
+                ],
+            )
+            for trip in trips
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0041_waitlistsignup_position'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripSummary',
+            fields=[
+                (
+                    'trip',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='summary',
+                        serialize=False,
+                        to='ws.trip',
+                    ),
+                ),
+                ('num_signups', models.PositiveIntegerField(default=0)),
+                ('leaders_with_rating', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(
+                fields=['-trip_date', '-time_created'], name='ws_trip_listing'
+            ),
+        ),
+        migrations.RunPython(summarize_trips, reverse_code=migrations.RunPython.noop),
+    ]
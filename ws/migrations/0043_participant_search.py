@@ -0,0 +1,41 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:03
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0042_trip_summary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='participant',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector(
+                    django.db.models.expressions.Func(
+                        'name',
+                        django.db.models.expressions.Value('\\W+'),
+                        django.db.models.expressions.Value(' '),
+                        django.db.models.expressions.Value('g'),
+                        function='regexp_replace',
+                        output_field=models.TextField(),
+                    ),
+                    django.db.models.expressions.Func(
+                        'email',
+                        django.db.models.expressions.Value('\\W+'),
+                        django.db.models.expressions.Value(' '),
+                        django.db.models.expressions.Value('g'),
+                        function='regexp_replace',
+                        output_field=models.TextField(),
+                    ),
+                    config='simple',
+                ),
+                name='ws_participant_search',
+            ),
+        ),
+    ]
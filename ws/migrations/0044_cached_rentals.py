@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0043_participant_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedRentals',
+            fields=[
+                (
+                    'participant',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='cached_rentals',
+                        serialize=False,
+                        to='ws.participant',
+                    ),
+                ),
+                ('rentals', models.JSONField(blank=True, default=list)),
+                ('last_cached', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'cached rentals',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0044_cached_rentals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MembershipStats',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('members', models.JSONField(blank=True, default=list)),
+                ('last_cached', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'membership stats',
+            },
+        ),
+    ]
@@ -1,3 +1,5 @@
+import re
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Type, Union
 from urllib.parse import urlencode
@@ -6,10 +8,13 @@ from allauth.account.models import EmailAddress
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
-from django.db import models
-from django.db.models import F, Q
+from django.db import models, transaction
+from django.db.models import Count, F, Func, OuterRef, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.utils.safestring import mark_safe
@@ -22,6 +27,7 @@ from phonenumber_field.modelfields import PhoneNumberField
 import ws.utils.dates as date_utils
 from ws import enums
 from ws.utils.avatar import avatar_url
+from ws.utils.rating_index import RatingIndex
 
 alphanum = RegexValidator(
     r'^[a-zA-Z0-9 ]*$', "Only alphanumeric characters and spaces allowed"
@@ -99,6 +105,70 @@ class EmergencyInfo(models.Model):
         )
 
 
+def participant_search_vector() -> SearchVector:
+    """The document that participants are searched by (name & email).
+
+    Punctuation splits words (so 'tim@mit.edu' is 'tim mit edu'), letting any
+    part of an email address be matched by prefix, just like names.
+    """
+    words = [
+        Func(
+            field,
+            Value(r'\W+'),
+            Value(' '),
+            Value('g'),
+            function='regexp_replace',
+            output_field=models.TextField(),
+        )
+        for field in ('name', 'email')
+    ]
+    return SearchVector(*words, config='simple')
+
+
+def _lectures_could_be_missed(year: int) -> bool:
+    """Return if participants can be regarded as missing the year's WS lectures."""
+    if year < 2016:
+        return False  # We lack records for 2014 & 2015; assume present
+    if year == date_utils.ws_year() and not date_utils.ws_lectures_complete():
+        return False  # Lectures aren't over yet, so nobody "missed" lectures
+    return True
+
+
+class ParticipantQuerySet(models.QuerySet):
+    def missed_lectures_for(self, trip) -> 'ParticipantQuerySet':
+        """Return participants regarded as having missed lectures for this trip.
+
+        This is the bulk equivalent of `Participant.missed_lectures_for`.
+        """
+        if trip.program_enum != enums.Program.WINTER_SCHOOL:
+            return self.none()
+        year = trip.trip_date.year
+        if not _lectures_could_be_missed(year):
+            return self.none()
+        return self.exclude(lectureattendance__year=year)
+
+    def search(self, text: str) -> 'ParticipantQuerySet':
+        """Return participants matching every word of the text, best matches first.
+
+        Each word matches any word of the name or email that it begins, making
+        this suitable for autocompletion. The search is indexed (see `Meta`).
+        """
+        words = re.findall(r'\w+', text)
+        if not words:
+            return self.none()
+        query = SearchQuery(
+            ' & '.join(f'{word}:*' for word in words),
+            search_type='raw',
+            config='simple',
+        )
+        vector = participant_search_vector()
+        return (
+            self.annotate(search=vector, search_rank=SearchRank(vector, query))
+            .filter(search=query)
+            .order_by('-search_rank', 'name', 'email')
+        )
+
+
 class LeaderManager(models.Manager):
     def get_queryset(self):
         all_participants = super().get_queryset()
@@ -299,7 +369,7 @@ class Participant(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
-    objects = models.Manager()
+    objects = ParticipantQuerySet.as_manager()
     leaders = LeaderManager()
     name = models.CharField(max_length=255)
     cell_phone = PhoneNumberField(blank=True)  # Hi, Sheep.
@@ -475,11 +545,8 @@ class Participant(models.Model):
 
     def missed_lectures(self, year):
         """Whether the participant missed WS lectures in the given year."""
-        if year < 2016:
-            return False  # We lack records for 2014 & 2015; assume present
-        if year == date_utils.ws_year() and not date_utils.ws_lectures_complete():
-            return False  # Lectures aren't over yet, so nobody "missed" lectures
-
+        if not _lectures_could_be_missed(year):
+            return False
         return not self.attended_lectures(year)
 
     def missed_lectures_for(self, trip):
@@ -594,6 +661,24 @@ class Participant(models.Model):
             ratings = (r for r in ratings if r.time_created > after_time)
         return ratings
 
+    @property
+    def rating_index(self) -> RatingIndex:
+        """Index this participant's ratings for point-in-time lookups.
+
+        When ratings were prefetched, the index is built just once (and rebuilt
+        only if ratings are prefetched anew). Otherwise, ratings are queried.
+        """
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        ratings = prefetched.get('leaderrating_set')
+        if ratings is None:
+            return RatingIndex(self.leaderrating_set.all())
+
+        cached_for, index = getattr(self, '_rating_index', (None, None))
+        if cached_for is not ratings:
+            index = RatingIndex(ratings)
+            self._rating_index = (ratings, index)
+        return index
+
     def name_with_rating(self, trip):
         """Give the leader's name plus rating at the time of the trip.
 
@@ -604,24 +689,14 @@ class Participant(models.Model):
 
         If no rating is found, simply the name will be given.
         """
-        required_activity = trip.program_enum.required_activity()
-        if required_activity is None:
-            return self.name
-
-        day_before = trip.trip_date - timedelta(days=1)
-        rating = self.activity_rating(
-            required_activity.value,
-            at_time=date_utils.late_at_night(day_before),
-            must_be_active=False,
-        )
-        return f"{self.name} ({rating})" if rating else self.name
+        return self.rating_index.name_with_rating(self, trip)
 
     def activity_rating(self, activity, **kwargs):
-        """Return leader's rating for the given activity (if one exists)."""
-        ratings = [r for r in self.ratings(**kwargs) if r.activity == activity]
-        if not ratings:
-            return None
-        return max(ratings, key=lambda rating: rating.time_created).rating
+        """Return leader's rating for the given activity (if one exists).
+
+        Accepts the same filters as `ratings()`.
+        """
+        return self.rating_index.rating_at(self.pk, activity, **kwargs)
 
     @property
     def allowed_programs(self):
@@ -666,6 +741,7 @@ class Participant(models.Model):
 
     class Meta:
         ordering = ['name', 'email']
+        indexes = [GinIndex(participant_search_vector(), name='ws_participant_search')]
 
 
 class MembershipReminder(models.Model):
@@ -721,6 +797,59 @@ class LectureAttendance(models.Model):
     time_created = models.DateTimeField(auto_now_add=True)
 
 
+class CachedRentals(models.Model):
+    """Cached record of all items a participant currently has rented from MITOC.
+
+    The gear database is the authority on rentals, but querying its API can
+    take a while (certainly too long to do while rendering a page). Rentals
+    are instead periodically cached for each participant, under all the
+    participant's verified email addresses (each of which may be a distinct
+    person in the gear database).
+    """
+
+    # Cached rentals are used as-is, but refreshed in the background once stale
+    STALE_AFTER = timedelta(hours=1)
+
+    participant = models.OneToOneField(
+        Participant,
+        primary_key=True,
+        related_name='cached_rentals',
+        on_delete=models.CASCADE,
+    )
+    # One object per item, each with the gear database email that rented it
+    # (Formatted as in `ws.utils.geardb.Rental`, but without overdue status)
+    rentals = models.JSONField(default=list, blank=True)
+    last_cached = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "cached rentals"
+
+    def __str__(self):
+        return f"Rentals for {self.participant}"
+
+    @property
+    def stale(self) -> bool:
+        return self.last_cached < timezone.now() - self.STALE_AFTER
+
+
+class MembershipStats(SingletonModel):
+    """Precomputed statistics about every current MITOC member.
+
+    Computing these requires full scans of both the gear database & all trips
+    participation. Stats are instead computed on a schedule, then served as-is.
+    """
+
+    # One object per member (see `ws.utils.geardb.membership_information`)
+    members = models.JSONField(default=list, blank=True)
+    last_cached = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "membership stats"
+
+    def __str__(self):
+        return f"Stats for {len(self.members)} members"
+
+
 class WinterSchoolSettings(SingletonModel):
     """Stores settings for the current Winter School.
 
@@ -830,6 +959,18 @@ class LeaderRecommendation(BaseRating):
     )
 
 
+def _loaded_fields_except(instance: models.Model, *excluded: str) -> List[str]:
+    """Return the fields that a plain `save()` would write, less those excluded."""
+    deferred = instance.get_deferred_fields()
+    return [
+        field.attname
+        for field in instance._meta.concrete_fields
+        if not field.primary_key
+        and field.attname not in deferred
+        and field.name not in excluded
+    ]
+
+
 class BaseSignUp(models.Model):
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
     trip = models.ForeignKey("Trip", on_delete=models.CASCADE)
@@ -863,17 +1004,124 @@ class SignUp(BaseSignUp):
 
     on_trip = models.BooleanField(default=False)
 
+    # The trip on which this signup held a slot, as of the last `lock_slot()`
+    _held_slot: Optional[int] = None
+    # The (trip, on_trip) values as last loaded from or saved to the database
+    _loaded_slot: Optional[Tuple[int, bool]] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        signup = super().from_db(db, field_names, values)
+        if {'trip_id', 'on_trip'}.issubset(field_names):
+            signup._loaded_slot = (signup.trip_id, signup.on_trip)
+        return signup
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None:
+            self._loaded_slot = (self.trip_id, self.on_trip)
+        elif {'trip', 'trip_id', 'on_trip'} & set(fields):
+            self._loaded_slot = None  # (Only partially refreshed)
+
     # pylint: disable=arguments-differ
-    def save(self, **kwargs):
+    def save(self, slot_reserved=False, **kwargs):
         """Assert that the Participant is not signing up twice.
 
         The AssertionError here should never be thrown - it's a last defense
         against a less-than-obvious implementation of adding Participant
         records after getting a bound form.
+
+        :param slot_reserved: The trip slot was already taken (`Trip.reserve_slot`)
         """
         if not kwargs.pop('commit', True):
             assert self.trip not in self.participant.trip_set.all()
-        super().save(**kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'on_trip', 'trip'} & set(update_fields):
+            super().save(**kwargs)
+            return
+
+        unchanged = self._loaded_slot == (self.trip_id, self.on_trip)
+        if update_fields is None and unchanged and not slot_reserved:
+            # Leave the slot as the row has it (this copy may be stale), sparing locks
+            kwargs['update_fields'] = _loaded_fields_except(self, 'on_trip', 'trip')
+            super().save(**kwargs)
+            return
+
+        with transaction.atomic():
+            held_slot = self.lock_slot()
+            # (Signal receivers may save this signup again, accounting for that save)
+            new_slot = self.trip_id if self.on_trip else None
+            super().save(**kwargs)
+            self._update_slots(held_slot, new_slot, slot_reserved)
+            self._loaded_slot = (self.trip_id, self.on_trip)
+
+    def lock_slot(self) -> Optional[int]:
+        """Lock this signup's row, returning the trip on which it holds a slot.
+
+        The slot is read from the row (not this copy, which may be stale), and
+        other copies of the signup can't be saved until the transaction ends.
+
+        Trips are always locked before their signups (as when queues are
+        updated), so that concurrent changes to a trip can't deadlock. Both
+        the trip in the row and the trip in this copy are locked (in order),
+        since a signup that's being moved holds its slot on the former.
+        """
+        self._held_slot = None
+        if self.pk is None:
+            return None
+
+        row_trip = SignUp.objects.filter(pk=self.pk).values('trip_id')
+        locked_trips = set(
+            Trip.objects.select_for_update()
+            .filter(Q(pk=self.trip_id) | Q(pk__in=row_trip))
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        row = (
+            SignUp.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list('trip_id', 'on_trip')
+            .first()
+        )
+        if row and row[0] not in locked_trips:
+            # Moved (by another transaction) between the two locks. Rare, but the
+            # slot's trip must still be locked before its count is changed.
+            Trip.objects.select_for_update().filter(pk=row[0]).values_list(
+                'pk', flat=True
+            ).first()
+        if row and row[1]:
+            self._held_slot = row[0]
+        return self._held_slot
+
+    def _update_slots(
+        self, held_slot: Optional[int], new_slot: Optional[int], slot_reserved: bool
+    ) -> None:
+        """Keep `Trip.on_trip_count` in step with a save of this signup."""
+        deltas: Dict[int, int] = defaultdict(int)
+        if held_slot is not None:
+            deltas[held_slot] -= 1
+        if new_slot is not None:
+            deltas[new_slot] += 1
+        if slot_reserved:  # (Already counted by `Trip.reserve_slot`)
+            deltas[self.trip_id] -= 1
+
+        for trip_id, delta in deltas.items():
+            if delta:
+                Trip.objects.filter(pk=trip_id).update(
+                    on_trip_count=F('on_trip_count') + delta
+                )
+
+    def release_slot(self):
+        """Give up any slot held on a trip, as of the last `lock_slot()`.
+
+        (Used once the signup is deleted, since only one deletion finds the row)
+        """
+        if self._held_slot is not None:
+            Trip.objects.filter(pk=self._held_slot).update(
+                on_trip_count=F('on_trip_count') - 1
+            )
+        self._held_slot = None
 
     class Meta:
         # When ordering for an individual, should order by priority (i.e. 'order')
@@ -924,6 +1172,54 @@ class TripInfo(models.Model):
     )
 
 
+class TripQuerySet(models.QuerySet):
+    def recount_on_trip(self) -> int:
+        """Count the signups on each trip (needed after bulk signup changes)."""
+        on_trip = (
+            SignUp.objects.filter(trip=OuterRef('pk'), on_trip=True)
+            .order_by()
+            .values('trip')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return self.update(on_trip_count=Coalesce(Subquery(on_trip), 0))
+
+    def refresh_summaries(self) -> None:
+        """Recompute the summary of each trip (as shown in lists of trips)."""
+        trips = (
+            Trip.objects.filter(pk__in=self.values('pk'))
+            .annotate(num_signups=Count('signup'))
+            .prefetch_related('leaders')
+        )
+        # Leaders often lead many trips; index each one's ratings just once.
+        leaders = {leader.pk for trip in trips for leader in trip.leaders.all()}
+        ratings = RatingIndex(LeaderRating.objects.filter(participant_id__in=leaders))
+        summaries = [
+            TripSummary(
+                trip=trip,
+                num_signups=trip.num_signups,
+                leaders_with_rating=[
+                    ratings.name_with_rating(leader, trip)
+                    for leader in trip.leaders.all()
+                ],
+            )
+            for trip in trips
+        ]
+        existing = set(
+            TripSummary.objects.filter(
+                trip_id__in=[summary.trip_id for summary in summaries]
+            ).values_list('trip_id', flat=True)
+        )
+        TripSummary.objects.bulk_update(
+            [summary for summary in summaries if summary.trip_id in existing],
+            ['num_signups', 'leaders_with_rating'],
+        )
+        TripSummary.objects.bulk_create(
+            [summary for summary in summaries if summary.trip_id not in existing],
+            ignore_conflicts=True,
+        )
+
+
 class Trip(models.Model):
     program = models.CharField(
         max_length=255,
@@ -970,6 +1266,8 @@ class Trip(models.Model):
     maximum_participants = models.PositiveIntegerField(
         default=8, verbose_name="Max participants"
     )
+    # Denormalized count of signups on the trip, changed only with atomic updates
+    on_trip_count = models.PositiveIntegerField(default=0, editable=False)
     difficulty_rating = models.CharField(max_length=63)
     level = models.CharField(
         max_length=255,
@@ -1024,9 +1322,49 @@ class Trip(models.Model):
     )
     lottery_log = models.TextField(null=True, blank=True)
 
+    objects = TripQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The (trip date, program) that the trip's summary currently reflects
+        self._summarized_by: Optional[Tuple[date, str]] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        trip = super().from_db(db, field_names, values)
+        if {'trip_date', 'program'}.issubset(field_names):
+            trip._summarized_by = (trip.trip_date, trip.program)
+        return trip
+
     def __str__(self):  # pylint: disable=invalid-str-returned
         return self.name
 
+    def save(self, *args, **kwargs):  # pylint: disable=signature-differs
+        """Save the trip, leaving `on_trip_count` as it stands in the database.
+
+        Signups change the count with their own updates, so this copy may be stale.
+        """
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                kwargs['update_fields'] = _loaded_fields_except(self, 'on_trip_count')
+            else:
+                kwargs['update_fields'] = [
+                    name for name in update_fields if name != 'on_trip_count'
+                ]
+        super().save(*args, **kwargs)
+
+    def reserve_slot(self) -> bool:
+        """Atomically take one open slot on the trip, if any remain.
+
+        Concurrent updates of the trip's row wait on one another, so even a rush
+        of simultaneous signups can never overfill the trip.
+        """
+        reserved = Trip.objects.filter(
+            pk=self.pk, on_trip_count__lt=F('maximum_participants')
+        ).update(on_trip_count=F('on_trip_count') + 1)
+        return bool(reserved)
+
     @property
     def program_enum(self):
         """Convert the string constant value to an instance of the enum."""
@@ -1178,8 +1516,13 @@ class Trip(models.Model):
 
     @property
     def open_slots(self):
-        accepted_signups = self.signup_set.filter(on_trip=True)
-        return self.maximum_participants - accepted_signups.count()
+        # (Signups update the count with their own queries, so this copy may be stale)
+        on_trip_count = (
+            Trip.objects.filter(pk=self.pk)
+            .values_list('on_trip_count', flat=True)
+            .first()
+        )
+        return self.maximum_participants - (on_trip_count or 0)
 
     @property
     def signups_open(self):
@@ -1268,6 +1611,23 @@ class Trip(models.Model):
 
     class Meta:
         ordering = ["-trip_date", "-time_created"]
+        indexes = [
+            models.Index(fields=['-trip_date', '-time_created'], name='ws_trip_listing')
+        ]
+
+
+class TripSummary(models.Model):
+    """What's shown about a trip in lists of trips, kept up to date by signals.
+
+    Counting signups & finding each leader's rating at the time of the trip
+    is expensive when done for every trip at once (e.g. on `/trips/all`).
+    """
+
+    trip = models.OneToOneField(
+        Trip, primary_key=True, related_name='summary', on_delete=models.CASCADE
+    )
+    num_signups = models.PositiveIntegerField(default=0)
+    leaders_with_rating = models.JSONField(default=list)
 
 
 class BygonesManager(models.Manager):
@@ -1424,9 +1784,46 @@ class LotteryAdjustment(models.Model):
         return f"{effect} {self.participant.name} ({self.adjustment}) until {expires}"
 
 
+def waitlist_order():
+    """The waitlist rules: manual order (highest first), then time created."""
+    return [
+        F('manual_order').desc(nulls_last=True),
+        F('time_created').asc(),
+        F('pk').asc(),
+    ]
+
+
+class WaitListSignupQuerySet(models.QuerySet):
+    def reindex(self) -> None:
+        """Evenly space positions on each waitlist with a matched entry.
+
+        Positions are assigned following the waitlist rules, so this is needed
+        only after bulk changes to `manual_order` or `time_created`.
+        """
+        ranked = (
+            WaitListSignup.objects.filter(waitlist__in=self.values('waitlist'))
+            .annotate(
+                rank=Window(
+                    RowNumber(), partition_by=[F('waitlist')], order_by=waitlist_order()
+                )
+            )
+            .values_list('pk', 'rank')
+        )
+        WaitListSignup.objects.bulk_update(
+            [
+                WaitListSignup(pk=pk, position=rank * WaitListSignup.POSITION_GAP)
+                for pk, rank in ranked
+            ],
+            ['position'],
+        )
+
+
 class WaitListSignup(models.Model):
     """Intermediary between initial signup and the trip's waiting list."""
 
+    # Space between adjacent positions, leaving room for entries to be inserted
+    POSITION_GAP = 1024
+
     signup = models.OneToOneField(SignUp, on_delete=models.CASCADE)
     waitlist = models.ForeignKey("WaitList", on_delete=models.CASCADE)
     time_created = models.DateTimeField(auto_now_add=True)
@@ -1435,15 +1832,85 @@ class WaitListSignup(models.Model):
     # Right now, it's descending - which is both confusing & conflicts with SignUp
     manual_order = models.IntegerField(null=True, blank=True)
 
+    # Place on the waitlist (lowest first), kept in step with the waitlist rules
+    # (`manual_order`, then `time_created`) so that the waitlist is never sorted.
+    position = models.IntegerField(default=0, editable=False)
+
+    objects = WaitListSignupQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The (manual order, time created) that `position` currently reflects
+        self._positioned_by: Optional[Tuple[Optional[int], datetime]] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        wl_signup = super().from_db(db, field_names, values)
+        if {'manual_order', 'time_created'}.issubset(field_names):
+            wl_signup._positioned_by = (wl_signup.manual_order, wl_signup.time_created)
+        return wl_signup
+
     def __str__(self):
         return f"{self.signup.participant.name} waitlisted on {self.signup.trip}"
 
+    def save(self, *args, **kwargs):  # pylint: disable=signature-differs
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is not None and not {
+                'manual_order',
+                'time_created',
+            } & set(update_fields):
+                return
+            if self._positioned_by != (self.manual_order, self.time_created):
+                self._reposition()
+
+    def _ahead(self) -> Q:
+        """Entries that come before this one on the waitlist."""
+        earlier = Q(time_created__lt=self.time_created) | Q(
+            time_created=self.time_created, pk__lt=self.pk
+        )
+        if self.manual_order is None:
+            return (
+                Q(manual_order__isnull=False) | Q(manual_order__isnull=True) & earlier
+            )
+        return (
+            Q(manual_order__gt=self.manual_order)
+            | Q(manual_order=self.manual_order) & earlier
+        )
+
+    def _reposition(self):
+        """Move between neighboring entries, renumbering only if there's no gap."""
+        others = WaitListSignup.objects.filter(waitlist_id=self.waitlist_id).exclude(
+            pk=self.pk
+        )
+        before = others.filter(self._ahead()).order_by('-position')
+        after = others.exclude(self._ahead()).order_by('position')
+        prev_pos = before.values_list('position', flat=True).first()
+        next_pos = after.values_list('position', flat=True).first()
+
+        if prev_pos is None and next_pos is None:
+            position = 0
+        elif prev_pos is None:
+            position = next_pos - self.POSITION_GAP
+        elif next_pos is None:
+            position = prev_pos + self.POSITION_GAP
+        elif next_pos - prev_pos > 1:
+            position = (prev_pos + next_pos) // 2
+        else:
+            position = None
+
+        if position is None:
+            WaitListSignup.objects.filter(pk=self.pk).reindex()
+            self.refresh_from_db(fields=['position'])
+        else:
+            WaitListSignup.objects.filter(pk=self.pk).update(position=position)
+            self.position = position
+        self._positioned_by = (self.manual_order, self.time_created)
+
     class Meta:
-        # TODO (Django 2): Use F-expressions. [F('manual_order').desc(nulls_last=True), ...]
-        # TODO (Django 2): Also update WaitList.signups property definition
-        # WARNING: Postgres will put nulls first, not last.
-        ordering = ["-manual_order", "time_created", "pk"]  # NOT CORRECT!
-        # WARNING: This default ordering is not fully correct. Manually call `order_by`)
+        ordering = ["position", "pk"]
+        indexes = [models.Index(fields=['waitlist', 'position'])]
 
 
 class WaitList(models.Model):
@@ -1459,22 +1926,17 @@ class WaitList(models.Model):
         This method is useful because the SignUp object has the useful information
         for display, but the WaitListSignup object has information for ordering.
         """
-        # TODO (Django 2): Just use the below, once we can use F-expressions in `ordering`
-        # return self.unordered_signups.order_by('waitlistsignup')
         return self.unordered_signups.order_by(
-            F('waitlistsignup__manual_order').desc(nulls_last=True),
-            F('waitlistsignup__time_created').asc(),
+            'waitlistsignup__position', 'waitlistsignup__pk'
         )
 
     @property
     def first_of_priority(self):
         """The 'manual_order' value to be first in the waitlist."""
-        # TODO (Django 2): Just use the below, refactor code to avoid extra lookups
-        # first_wl_signup = self.waitlistsignup_set.first()
-        first_signup = self.signups.first()
-        if first_signup is None:
+        first_wl_signup = self.waitlistsignup_set.first()
+        if first_wl_signup is None:
             return 10
-        return (first_signup.waitlistsignup.manual_order or 0) + 1
+        return (first_wl_signup.manual_order or 0) + 1
 
     @property
     def last_of_priority(self):
@@ -1485,19 +1947,30 @@ class WaitList(models.Model):
         waitlist, but to not surpass others who were previously added to the top of the
         waitlist.
         """
-        # TODO (Django 2): Just use the below
-        # last_wl_signup = self.waitlistsignup_set.filter(manual_order__isnull=False).last()
-        last_wl_signup = (
-            self.waitlistsignup_set.filter(manual_order__isnull=False)
-            .order_by(F('manual_order').desc(nulls_last=True))
-            .last()
-        )
+        last_wl_signup = self.waitlistsignup_set.filter(
+            manual_order__isnull=False
+        ).last()
 
         # Larger number == sooner or list
-        if last_wl_signup is None or last_wl_signup.manual_order is None:
+        if last_wl_signup is None:
             return 10
         return last_wl_signup.manual_order - 1
 
+    def position_of(self, signup) -> Optional[int]:
+        """Return the signup's place on the waitlist (1 is next), if waitlisted."""
+        try:
+            wl_signup = signup.waitlistsignup
+        except WaitListSignup.DoesNotExist:
+            return None
+        if wl_signup.waitlist_id != self.pk:
+            return None
+
+        ahead = self.waitlistsignup_set.filter(
+            Q(position__lt=wl_signup.position)
+            | Q(position=wl_signup.position, pk__lt=wl_signup.pk)
+        )
+        return ahead.count() + 1
+
 
 class LeaderApplication(models.Model):
     """Abstract parent class for all leader applications (doubles as a factory)
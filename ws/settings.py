@@ -42,6 +42,8 @@ GEARDB_SECRET_KEY = os.getenv(
     'GEARDB_SECRET_KEY', 'secret shared with the mitoc-gear repo'
 )
 WS_LOTTERY_LOG_DIR = os.getenv('WS_LOTTERY_LOG_DIR', '/tmp/')
+# Also write each lottery's log as JSON lines (in `WS_LOTTERY_LOG_DIR`)
+WS_LOTTERY_STRUCTURED_LOG = bool(os.getenv('WS_LOTTERY_STRUCTURED_LOG'))
 
 # URL to an avatar image that is self-hosted
 # (Users who opt out of Gravatar would prefer to not have requests made to
@@ -136,6 +138,15 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'ws.tasks.purge_old_medical_data',
         'schedule': crontab(minute=0, hour=2, day_of_week=2),
     },
+    'refresh-all-membership-cache': {
+        'task': 'ws.tasks.refresh_all_membership_cache',
+        # Nightly, around 1am EST (ignore DST)
+        'schedule': crontab(minute=0, hour=6),
+    },
+    'update-membership-stats': {
+        'task': 'ws.tasks.update_membership_stats',
+        'schedule': crontab(minute=30, hour='*/4'),
+    },
     'refresh-all-discount-spreadsheets': {
         'task': 'ws.tasks.update_all_discount_sheets',
         'schedule': crontab(minute=0, hour=3),
@@ -154,6 +165,10 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'ws.tasks.send_sole_itineraries',
         'schedule': crontab(minute=0, hour=4),
     },
+    'run-closed-lotteries': {
+        'task': 'ws.tasks.run_closed_lotteries',
+        'schedule': crontab(minute='*/15'),
+    },
     'run-ws-lottery': {
         'task': 'ws.tasks.run_ws_lottery',
         'schedule': crontab(minute=0, hour=14, month_of_year=[1, 2], day_of_week=3),
@@ -164,6 +179,10 @@ CELERY_TIMEZONE = 'UTC'
 
 CRISPY_TEMPLATE_PACK = 'bootstrap3'
 
+# Autocompletion reuses results of the most common participant searches,
+# in each process, for up to a minute. Set to 0 to disable.
+PARTICIPANT_SEARCH_CACHE_SIZE = int(os.getenv('PARTICIPANT_SEARCH_CACHE_SIZE', '256'))
+
 # A list of known "bad" passwords for which we don't want to hit the HIBP API.
 # This will *never* be honored in production -- it's just a local testing tool.
 # (Used to test with garbage passwords, avoiding the "change your password!" flow)
@@ -213,17 +232,21 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'ws.middleware.PrefetchGroupsMiddleware',
-    'ws.middleware.ParticipantMiddleware',
+    'ws.middleware.UserMiddleware',
     'ws.middleware.CustomMessagesMiddleware',
 ]
 if 'debug_toolbar' in INSTALLED_APPS:
     MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
 
 AUTHENTICATION_BACKENDS = (
+    # (Both backends load the user's groups & participant along with the user)
     # Needed to login by username in Django admin, regardless of `allauth`
-    "django.contrib.auth.backends.ModelBackend",
+    "ws.auth_backends.ModelBackend",
     # `allauth` specific authentication methods, such as login by e-mail
+    "ws.auth_backends.AuthenticationBackend",
+    # Sessions record the backend used to log in; these keep older sessions valid.
+    # (Remove once sessions made before the above backends have all expired)
+    "django.contrib.auth.backends.ModelBackend",
     "allauth.account.auth_backends.AuthenticationBackend",
 )
 
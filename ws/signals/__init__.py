@@ -1 +1,6 @@
-from . import auth_signals, signup_signals
+from . import (
+    auth_signals,
+    chair_badge_signals,
+    signup_signals,
+    summary_signals,
+)
@@ -0,0 +1,33 @@
+"""
+Invalidate cached chair badge counts when what's being counted may change.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from ws.models import LeaderApplication, LeaderRating, LeaderRecommendation, Trip
+from ws.utils import chair_badges
+
+
+@receiver(post_save, sender=Trip)
+@receiver(post_delete, sender=Trip)
+def invalidate_unapproved_trips(sender, instance, using, **kwargs):
+    chair_badges.invalidate(instance.activity)
+
+
+@receiver(post_save, sender=LeaderRating)
+@receiver(post_delete, sender=LeaderRating)
+@receiver(post_save, sender=LeaderRecommendation)
+@receiver(post_delete, sender=LeaderRecommendation)
+def invalidate_pending_applications(sender, instance, using, **kwargs):
+    chair_badges.invalidate(instance.activity)
+
+
+def invalidate_for_application(sender, instance, using, **kwargs):
+    chair_badges.invalidate(instance.activity)
+
+
+# Applications are subclassed for each activity, so connect to each one.
+for application_model in LeaderApplication.__subclasses__():
+    post_save.connect(invalidate_for_application, sender=application_model)
+    post_delete.connect(invalidate_for_application, sender=application_model)
@@ -47,9 +47,16 @@ def empty_waitlist(sender, instance, using, **kwargs):
         pass
 
 
+@receiver(pre_delete, sender=SignUp)
+def lock_deleted_signup(sender, instance, using, **kwargs):
+    """Find the slot held by the signup (if it's not already been deleted)."""
+    instance.lock_slot()
+
+
 @receiver(post_delete, sender=SignUp)
 def free_spot_on_trip(sender, instance, using, **kwargs):
     """When a participant deletes a signup, update queues if applicable."""
+    instance.release_slot()
     if not getattr(instance, 'skip_signals', False):
         update_queues_if_trip_open(instance.trip)
 
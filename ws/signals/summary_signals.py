@@ -0,0 +1,89 @@
+"""
+Keep trip summaries (shown in lists of trips) up to date.
+"""
+
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from ws.models import LeaderRating, Participant, SignUp, Trip, TripSummary
+
+
+@receiver(post_save, sender=Trip)
+def refresh_trip_summary(
+    sender, instance, created, raw, using, update_fields, **kwargs
+):
+    """Summarize new trips, and re-summarize if the date or program changed.
+
+    Leaders' ratings depend on only these fields (leaders & signups are
+    handled separately), so most saves (e.g. during lotteries) are skipped.
+    """
+    if raw:
+        return
+    if update_fields is not None and not {'trip_date', 'program'} & update_fields:
+        return
+    summarized_by = (instance.trip_date, instance.program)
+    # pylint: disable=protected-access
+    if created or summarized_by != instance._summarized_by:
+        Trip.objects.filter(pk=instance.pk).refresh_summaries()
+        instance._summarized_by = summarized_by
+
+
+@receiver(post_save, sender=SignUp)
+def count_new_signup(sender, instance, created, raw, using, update_fields, **kwargs):
+    if created and not raw:
+        TripSummary.objects.filter(trip_id=instance.trip_id).update(
+            num_signups=F('num_signups') + 1
+        )
+
+
+@receiver(post_delete, sender=SignUp)
+def count_deleted_signup(sender, instance, using, **kwargs):
+    TripSummary.objects.filter(trip_id=instance.trip_id).update(
+        num_signups=F('num_signups') - 1
+    )
+
+
+@receiver(m2m_changed, sender=Trip.leaders.through)
+def summarize_new_leaders(
+    sender, instance, action, reverse, model, pk_set, using, **kwargs
+):
+    if not reverse:
+        if action in {'post_add', 'post_remove', 'post_clear'}:
+            Trip.objects.filter(pk=instance.pk).refresh_summaries()
+        return
+
+    # A leader's trips were changed (e.g. `participant.trips_led.add(trip)`)
+    if action == 'pre_clear':  # Afterwards, we can't know which trips were cleared
+        instance.cleared_trip_pks = list(
+            instance.trips_led.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        Trip.objects.filter(pk__in=instance.cleared_trip_pks).refresh_summaries()
+    elif action in {'post_add', 'post_remove'}:
+        Trip.objects.filter(pk__in=pk_set).refresh_summaries()
+
+
+@receiver(post_save, sender=LeaderRating)
+def summarize_new_rating(
+    sender, instance, created, raw, using, update_fields, **kwargs
+):
+    """Ratings are shown alongside each leader's name."""
+    if not raw:
+        Trip.objects.filter(leaders=instance.participant_id).refresh_summaries()
+
+
+@receiver(post_delete, sender=LeaderRating)
+def summarize_deleted_rating(sender, instance, using, **kwargs):
+    Trip.objects.filter(leaders=instance.participant_id).refresh_summaries()
+
+
+@receiver(post_save, sender=Participant)
+def summarize_leader_name(
+    sender, instance, created, raw, using, update_fields, **kwargs
+):
+    """Leaders' names are shown in trip summaries."""
+    if raw or created:
+        return
+    if update_fields is None or 'name' in update_fields:
+        Trip.objects.filter(leaders=instance).refresh_summaries()
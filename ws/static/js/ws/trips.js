@@ -1,22 +1,38 @@
 angular.module('ws.trips', [])
-.controller('tripTabManager', function($scope, $window) {
+.controller('tripTabManager', function($scope, $http, $timeout) {
   $scope.$on('tripModified', function() {
     $scope.stale = true;
   });
 
+  // Rentals are served from a cache. If the cache is being refreshed,
+  // ask again shortly (but give up eventually, and just show what's cached).
+  var MAX_RENTAL_REFRESHES = 5;
+  var rentalRefreshes = 0;
+
   /**
-   * Hack: just reload the page, this time telling Django we want a rental table.
-   *
-   * The reason that we control this via a GET argument is so that:
-   *
-   * 1. Leaders can quickly view trips without waiting for the rentals API call.
-   * 2. If the API call fails for any reason, the page won't crash.
-   * 3. We can render a full table
+   * Load (cached) rentals for leaders & participants on the trip.
    *
-   * The proper fix is to build a FE component which does
+   * This is done only once the tab is selected, so that viewing the trip
+   * never waits on rentals (which ultimately come from the gear database).
    */
-  $scope.inlineRentals = function(tripId) {
-    $scope.reloading = true;
-    $window.location.assign('/trips/' + tripId + '?show_rentals_inline=1');
-  }
+  $scope.loadRentals = function(tripId) {
+    if ($scope.rentals && !$scope.refreshingRentals) {
+      return;  // Already loaded!
+    }
+    $scope.loadingRentals = true;
+    $http.get('/trips/' + tripId + '/rentals.json')
+      .then(function(resp) {
+        $scope.rentals = resp.data.rentals;
+        $scope.refreshingRentals = (
+          resp.data.refreshing && rentalRefreshes < MAX_RENTAL_REFRESHES
+        );
+        if ($scope.refreshingRentals) {
+          rentalRefreshes += 1;
+          $timeout(function() { $scope.loadRentals(tripId); }, 3000);
+        }
+      })
+      .finally(function() {
+        $scope.loadingRentals = false;
+      });
+  };
 });
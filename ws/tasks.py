@@ -9,13 +9,17 @@ from celery import group, shared_task
 from django.core.cache import cache
 from django.db import transaction
 
-from ws import cleanup, models, settings
+from ws import cleanup, enums, models, settings
 from ws.email import renew
 from ws.email.sole import send_email_to_funds
 from ws.email.trips import send_trips_summary
-from ws.lottery.run import SingleTripLotteryRunner, WinterSchoolLotteryRunner
+from ws.lottery.run import (
+    SingleTripLotteryRunner,
+    WinterSchoolLotteryRunner,
+    preload_single_trip_participants,
+)
 from ws.utils import dates as date_utils
-from ws.utils import geardb, member_sheets
+from ws.utils import geardb, member_sheets, membership
 
 logger = logging.getLogger(__name__)
 
@@ -152,6 +156,32 @@ def update_participant_affiliation(participant_id):
     geardb.update_affiliation(participant)
 
 
+@mutex_task()
+def refresh_all_membership_cache():
+    """Refresh cached memberships for every participant not refreshed in a week."""
+    membership.refresh_all_membership_cache()
+
+
+@shared_task  # Harmless if we run it twice
+def update_participant_rentals(participant_id: int):
+    """Cache all items which the participant currently has rented."""
+    participant = models.Participant.objects.get(pk=participant_id)
+    geardb.cache_rentals([participant])
+
+
+@mutex_task('update_trip_rentals-{trip_id}')
+def update_trip_rentals(trip_id: int):
+    """Cache all items currently rented by the trip's leaders & participants."""
+    trip = models.Trip.objects.get(pk=trip_id)
+    geardb.cache_rentals(geardb.leaders_and_participants(trip))
+
+
+@mutex_task()
+def update_membership_stats():
+    """Compute statistics about all current members, for the stats page."""
+    geardb.cache_membership_stats()
+
+
 @shared_task  # Locking done at db level to ensure idempotency
 def remind_lapsed_participant_to_renew(participant_id: int):
     """A task which should only be called by `remind_participants_to_renew'.
@@ -256,7 +286,9 @@ def send_sole_itineraries():
 @mutex_task()
 def run_ws_lottery():
     logger.info("Commencing Winter School lottery run")
-    runner = WinterSchoolLotteryRunner()
+    runner = WinterSchoolLotteryRunner(
+        structured_log=settings.WS_LOTTERY_STRUCTURED_LOG
+    )
     runner()
 
 
@@ -275,13 +307,64 @@ def purge_old_medical_data():
 
 
 @mutex_task('single_trip_lottery-{trip_id}')
-def run_lottery(trip_id, lottery_config=None):
+def run_lottery(trip_id, lottery_config=None, participants=None):
     """Run a lottery algorithm for the given trip (idempotent).
 
     If running on a trip that isn't in lottery mode, this won't make
     any changes (making this task idempotent).
+
+    :param participants: Participants signed up for the trip, if already loaded
+        (see `preload_single_trip_participants`)
     """
     logger.info("Running lottery for trip #%d", trip_id)
+    start = monotonic()
     trip = models.Trip.objects.get(pk=trip_id)
-    runner = SingleTripLotteryRunner(trip)
+    runner = SingleTripLotteryRunner(
+        trip, participants, structured_log=settings.WS_LOTTERY_STRUCTURED_LOG
+    )
     runner()
+
+    elapsed = monotonic() - start
+    logger.info("Ran lottery for trip #%d in %.3f seconds", trip_id, elapsed)
+    return {
+        'trip_id': trip_id,
+        'num_participants': None if participants is None else len(participants),
+        'seconds': elapsed,
+    }
+
+
+@mutex_task()
+def run_closed_lotteries():
+    """Run every single-trip lottery whose signups have closed, in parallel.
+
+    Each trip's lottery runs as its own (mutually exclusive) task. Participants
+    for every trip are loaded up front with a single query.
+
+    Trips normally have their lottery scheduled when created; this just ensures
+    that trips closing at the same time are processed together.
+    """
+    start = monotonic()
+    closed_trips = (
+        models.Trip.objects.filter(
+            algorithm='lottery', signups_close_at__lte=date_utils.local_now()
+        )
+        .exclude(program=enums.Program.WINTER_SCHOOL.value)
+        .values_list('pk', flat=True)
+    )
+    participants_by_trip = preload_single_trip_participants(closed_trips)
+    if not participants_by_trip:
+        logger.info("No single-trip lotteries need to be run")
+        return
+
+    group(
+        run_lottery.s(trip_pk, None, participants)
+        for trip_pk, participants in participants_by_trip.items()
+    )()
+
+    num_participants = sum(len(pars) for pars in participants_by_trip.values())
+    logger.info(
+        "Dispatched %d lotteries, for %d signups (in %.3f seconds)",
+        len(participants_by_trip),
+        num_participants,
+        monotonic() - start,
+    )
@@ -10,6 +10,7 @@ from ws.forms import SignUpForm
 from ws.mixins import LotteryPairingMixin
 from ws.utils.dates import local_date
 from ws.utils.membership import reasons_cannot_attend
+from ws.utils.ratings import names_with_rating
 
 register = template.Library()
 
@@ -91,6 +92,8 @@ def signup_for_trip(context, trip, participant, existing_signup):
         'existing_signup': existing_signup,
         'leader_signup_allowed': leader_signup_is_allowed(trip, participant),
     }
+    if existing_signup and not existing_signup.on_trip:
+        context['waitlist_position'] = trip.waitlist.position_of(existing_signup)
 
     if trip.signups_open or context['leader_signup_allowed']:
         context['signup_form'] = SignUpForm(initial={'trip': trip})
@@ -192,7 +195,13 @@ def signup_table(signups, has_notes=False, show_drivers=False, all_participants=
 
 @register.inclusion_tag('for_templatetags/trip_summary.html', takes_context=True)
 def trip_summary(context, trip):
+    leaders = list(trip.leaders.all())
+    shown = leaders or [trip.creator]  # If no leaders, the creator is shown
     return {
+        'has_leaders': bool(leaders),
+        'leaders_with_rating': list(
+            zip(shown, names_with_rating((leader, trip) for leader in shown))
+        ),
         'show_contacts': context['user'].is_authenticated,
         'show_program': trip.program_enum != Program.NONE,
         'show_trip_type': trip.trip_type_enum != TripType.NONE,
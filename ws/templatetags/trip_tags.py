@@ -1,12 +1,14 @@
 from datetime import timedelta
 
 from django import template
-from django.db.models import Case, Count, IntegerField, Sum, When
+from django.db.models import F
+from django.db.models.functions import Coalesce
 
 import ws.utils.dates as date_utils
 import ws.utils.perms as perm_utils
 import ws.utils.ratings as ratings_utils
 from ws import icons, models
+from ws.utils import chair_badges
 
 register = template.Library()
 
@@ -17,16 +19,14 @@ def trip_icon(trip):
 
 
 def annotated_for_trip_list(trips):
-    """Modify a trips queryset to have annotated fields used in tags."""
-    # Each trip will need information about its leaders, so prefetch models
-    trips = trips.prefetch_related('leaders', 'leaders__leaderrating_set')
+    """Modify a trips queryset to have annotated fields used in tags.
 
-    # Django 2.0: Use conditional aggregation instead!
-    signup_on_trip = Case(
-        When(signup__on_trip=True, then=1), default=0, output_field=IntegerField()
-    )
-    return trips.annotate(
-        num_signups=Count('signup'), signups_on_trip=Sum(signup_on_trip)
+    Signup counts & leaders come from each trip's summary, so trips can be
+    listed with just one query, however many there are.
+    """
+    return trips.select_related('summary').annotate(
+        num_signups=Coalesce(F('summary__num_signups'), 0),
+        signups_on_trip=F('on_trip_count'),
     )
 
 
@@ -53,8 +53,13 @@ def trip_list_table(trip_list, approve_mode=False):
 
 @register.inclusion_tag('for_templatetags/feedback_table.html')
 def feedback_table(all_feedback, scramble_contents=False, display_log_notice=False):
+    all_feedback = list(all_feedback)
+    leaders = ratings_utils.names_with_rating(
+        (feedback.leader, feedback.trip) for feedback in all_feedback
+    )
     return {
         'all_feedback': all_feedback,
+        'feedback_with_leader': list(zip(all_feedback, leaders)),
         'scramble_contents': scramble_contents,
         'display_log_notice': display_log_notice,
     }
@@ -81,24 +86,12 @@ def activity_rating(leader, activity):
 
 @register.filter
 def pending_applications_count(chair, activity_enum):
-    """Count applications where:
-
-    - All chairs have given recs, rating is needed
-    - Viewing user hasn't given a rec
-    """
-    manager = ratings_utils.ApplicationManager(
-        chair=chair, activity=activity_enum.value
-    )
-    return len(manager.pending_applications())
+    return chair_badges.pending_applications_count(chair, activity_enum)
 
 
 @register.filter
 def unapproved_trip_count(activity_enum):
-    today = date_utils.local_date()
-    # TODO: Migrate away from legacy activity
-    return models.Trip.objects.filter(
-        trip_date__gte=today, activity=activity_enum.value, chair_approved=False
-    ).count()
+    return chair_badges.unapproved_trip_count(activity_enum)
 
 
 @register.inclusion_tag('for_templatetags/wimp_toolbar.html')
@@ -1,5 +1,8 @@
+import os
 import re
+import unittest
 
+from django.core.cache import cache
 from django.test import TestCase as DjangoTestCase
 
 WHITESPACE = re.compile(r'[\n\s]+')
@@ -9,7 +12,18 @@ def strip_whitespace(text):
     return re.sub(WHITESPACE, ' ', text).strip()
 
 
+# Timing depends on the machine running tests, so benchmarks only run on request.
+benchmark = unittest.skipUnless(
+    os.environ.get('WS_RUN_BENCHMARKS'), "Set WS_RUN_BENCHMARKS=1 to run benchmarks"
+)
+
+
 class TestCase(DjangoTestCase):
     # Don't bother with `geardb` by default unless test explicitly needs it!
     # Though, no tests should be hitting `geardb` at all - we've deprecated support.
     databases = {'default'}
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        # Some counts are cached (e.g. chair badges); they shouldn't outlive a test.
+        cache.clear()
@@ -1,3 +1,9 @@
+import random
+import time
+
+from django.test import SimpleTestCase
+
+from ws import models
 from ws.lottery import graphs
 from ws.tests import TestCase, factories
 
@@ -307,3 +313,76 @@ class GraphTests(TestCase):
 
         for par in all_pars:
             self.assertFalse(graph.isolated_cycles(par))
+
+
+class SyntheticGraphTests(SimpleTestCase):
+    """Exercise large graphs of unsaved participants (without touching the database)."""
+
+    @staticmethod
+    def _random_blocks(rand, num_participants, num_blocks):
+        pars = [
+            models.Participant(pk=pk, name=f"Participant {pk}")
+            for pk in range(1, num_participants + 1)
+        ]
+        blocks = set()
+        while len(blocks) < num_blocks:
+            initiator, recipient = rand.sample(pars, 2)
+            blocks.add((initiator, recipient))
+        return pars, blocks
+
+    @staticmethod
+    def _expected_isolated(blocks, par) -> bool:
+        """Brute force: in a cycle & no participant reachable blocks nobody."""
+        reachable, frontier = set(), [par]
+        while frontier:
+            node = frontier.pop()
+            children = blocks.get(node, set())
+            if not children:
+                return False  # A terminus is reachable
+            for child in children - reachable:
+                reachable.add(child)
+                frontier.append(child)
+        return par in reachable
+
+    def test_matches_brute_force(self):
+        rand = random.Random(42)
+        pars, blocks = self._random_blocks(rand, 60, 90)
+        graph = graphs.SeparationGraph.from_blocks(blocks)
+
+        rand.shuffle(pars)
+        for par in pars:
+            current = graph.current_graph
+            for other in pars:
+                cycles = graph.isolated_cycles(other)
+                self.assertEqual(bool(cycles), self._expected_isolated(current, other))
+                for cycle in cycles:
+                    self.assertIn(other, cycle)
+                    members = list(cycle)
+                    for initiator, recipient in zip(members, members[1:] + members[:1]):
+                        self.assertIn(recipient, current[initiator])
+            graph.remove(par)
+        self.assertTrue(graph.empty)
+
+    def test_five_thousand_participants(self):
+        """Handling every participant in a large lottery is roughly linear.
+
+        Separations are rare; most participants have none, most blocks are mutual.
+        """
+        rand = random.Random(5000)
+        pars, blocks = self._random_blocks(rand, 5000, 1500)
+        blocks |= {(recipient, initiator) for initiator, recipient in blocks}
+        for _ in range(20):  # Some longer chains & cycles, too
+            chain = rand.sample(pars, 6)
+            blocks.update(zip(chain, chain[1:]))
+
+        start = time.perf_counter()
+        graph = graphs.SeparationGraph.from_blocks(blocks)
+        for par in pars:
+            for blocker in graph.blocked_by(par):
+                graph.isolated_cycles(blocker)
+            graph.isolated_cycles(par)
+            graph.remove(par)
+        elapsed = time.perf_counter() - start
+
+        self.assertTrue(graph.empty)
+        self.assertLess(elapsed, 5)
@@ -643,3 +643,61 @@ class WinterSchoolPlacementTests(TestCase, Helpers):
         self._place_participant(main_driver)
 
         self._assert_on_trip(main_driver, trip, on_trip=False)
+
+
+class UnhandledDriverTests(TestCase, Helpers):
+    def setUp(self):
+        self.trip = self._ws_trip(maximum_participants=2)
+        self.other_trip = self._ws_trip(maximum_participants=2)
+        self.drivers = factories.ParticipantFactory.create_batch(2)
+        for driver in self.drivers:
+            factories.LotteryInfoFactory.create(participant=driver, car_status='own')
+            factories.SignUpFactory.create(participant=driver, trip=self.trip)
+        factories.SignUpFactory.create(
+            participant=self.drivers[0], trip=self.other_trip
+        )
+
+        # A driver already on the trip, and a non-driver, are never counted
+        on_trip = factories.SignUpFactory.create(trip=self.other_trip, on_trip=True)
+        factories.LotteryInfoFactory.create(
+            participant=on_trip.participant, car_status='rent'
+        )
+        factories.SignUpFactory.create(trip=self.trip)
+
+        self.runner = run.WinterSchoolLotteryRunner()
+
+    def test_counts_updated_when_handled(self):
+        self.runner.mark_handled(self.drivers[1])  # (Before counting starts)
+        self.runner.track_unhandled_drivers(self.runner.driver_signups())
+        self.assertEqual(
+            self.runner.unhandled_drivers, {self.trip.pk: 1, self.other_trip.pk: 1}
+        )
+
+        self.runner.mark_handled(self.drivers[0])
+        self.runner.mark_handled(self.drivers[0])  # (Idempotent)
+        self.assertEqual(self.runner.unhandled_drivers[self.trip.pk], 0)
+        self.assertEqual(self.runner.unhandled_drivers[self.other_trip.pk], 0)
+
+        self.runner.mark_handled(self.drivers[1], handled=False)
+        self.assertEqual(self.runner.unhandled_drivers[self.trip.pk], 1)
+
+    def test_no_query_once_tracked(self):
+        par = factories.ParticipantFactory.create()
+        signup = factories.SignUpFactory.create(participant=par, trip=self.trip)
+        par_handler = handle.WinterSchoolParticipantHandler(
+            self._with_annotation(par.pk), self.runner
+        )
+
+        # pylint: disable=protected-access
+        self.assertTrue(par_handler._placement_would_jeopardize_driver_bump(signup))
+
+        self.runner.track_unhandled_drivers(self.runner.driver_signups())
+        with self.assertNumQueries(3):  # Open slots, and drivers on the trip
+            self.assertTrue(par_handler._placement_would_jeopardize_driver_bump(signup))
+
+        for driver in self.drivers:
+            self.runner.mark_handled(driver)
+        with self.assertNumQueries(3):
+            self.assertFalse(
+                par_handler._placement_would_jeopardize_driver_bump(signup)
+            )
@@ -0,0 +1,157 @@
+import io
+import logging
+import tempfile
+from datetime import date
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from freezegun import freeze_time
+
+from ws import enums, models, settings
+from ws.lottery import log, run
+from ws.tests import TestCase, factories
+
+
+class JSONLinesFormatterTests(SimpleTestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        handler = logging.StreamHandler(self.stream)
+        handler.setFormatter(log.JSONLinesFormatter())
+        self.logger = logging.getLogger(f'{__name__}.{id(self)}')
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(handler)
+
+    def test_records_with_and_without_events(self):
+        par = models.Participant(pk=8, name="Tim Beaver")
+        trip = models.Trip(pk=22, name="Mt. Washington")
+        self.logger.info("Bumping %s off %s", par.name, trip.name)
+        self.logger.debug(
+            "\nHandling %s", par.name, extra=log.event('handling', par, rank=3)
+        )
+        self.logger.info("Bumped", extra=log.event('bumped', par, trip))
+
+        self.stream.seek(0)
+        self.assertEqual(
+            list(log.read_entries(self.stream)),
+            [
+                {
+                    'level': 'INFO',
+                    'message': "Bumping Tim Beaver off Mt. Washington",
+                    'action': None,
+                    'participant': None,
+                    'trip': None,
+                    'rank': None,
+                },
+                {
+                    'level': 'DEBUG',
+                    'message': "\nHandling Tim Beaver",
+                    'action': 'handling',
+                    'participant': 8,
+                    'trip': None,
+                    'rank': 3,
+                },
+                {
+                    'level': 'INFO',
+                    'message': "Bumped",
+                    'action': 'bumped',
+                    'participant': 8,
+                    'trip': 22,
+                    'rank': None,
+                },
+            ],
+        )
+
+        # Multi-line messages are still just one line of JSON each.
+        self.stream.seek(0)
+        self.assertEqual(len(self.stream.readlines()), 3)
+
+        self.stream.seek(0)
+        self.assertEqual(
+            log.text_log(self.stream),
+            "Bumping Tim Beaver off Mt. Washington\n\nHandling Tim Beaver\nBumped\n",
+        )
+
+
+class SingleTripStructuredLogTests(TestCase):
+    def test_text_log_saved_to_trip(self):
+        trip = factories.TripFactory.create(
+            name="Single Trip", algorithm='lottery', maximum_participants=1
+        )
+        factories.SignUpFactory.create(
+            trip=trip, participant__name="Alice Aaronson", on_trip=False
+        )
+        with tempfile.TemporaryDirectory() as log_dir:
+            with patch.object(settings, 'WS_LOTTERY_LOG_DIR', log_dir):
+                runner = run.SingleTripLotteryRunner(trip, structured_log=True)
+            runner()
+
+            # The structured log is kept, next to other lottery logs
+            self.assertEqual(runner.structured_log_filename.parent, Path(log_dir))
+            with open(runner.structured_log_filename, encoding='utf-8') as jsonl:
+                entries = list(log.read_entries(jsonl))
+        self.assertIn('ranked', [entry['action'] for entry in entries])
+
+        trip.refresh_from_db()
+        self.assertEqual(trip.algorithm, 'fcfs')
+        self.assertTrue(trip.lottery_log.startswith("Randomly ordering"))
+        self.assertIn("  1. Alice Aaronson", trip.lottery_log)
+        self.assertIn(
+            "Single Trip has 1 slot, adding Alice Aaronson\n", trip.lottery_log
+        )
+        self.assertNotIn('{', trip.lottery_log)
+
+    def test_no_file_without_lottery(self):
+        trip = factories.TripFactory.create(algorithm='fcfs')
+        with tempfile.TemporaryDirectory() as log_dir:
+            with patch.object(settings, 'WS_LOTTERY_LOG_DIR', log_dir):
+                run.SingleTripLotteryRunner(trip, structured_log=True)()
+            self.assertEqual(list(Path(log_dir).iterdir()), [])
+
+
+@freeze_time("2020-01-15 09:00:00 EST")
+class WinterSchoolStructuredLogTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.trips = [
+            factories.TripFactory.create(
+                algorithm='lottery',
+                program=enums.Program.WINTER_SCHOOL.value,
+                maximum_participants=2,
+                trip_date=date(2020, 1, 18),
+            )
+            for _ in range(2)
+        ]
+        for i in range(5):
+            par = factories.ParticipantFactory.create()
+            for order, trip in enumerate(self.trips[:: 1 if i % 2 else -1]):
+                factories.SignUpFactory.create(participant=par, trip=trip, order=order)
+
+    def test_text_log_derived_from_structured(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            with patch.object(settings, 'WS_LOTTERY_LOG_DIR', log_dir):
+                runner = run.WinterSchoolLotteryRunner(structured_log=True)
+            runner.simulate()
+            runner.close_log()
+
+            # The structured log is written alongside the usual text log
+            text_path, jsonl_path = runner.log_filename, runner.structured_log_filename
+            self.assertEqual(text_path.suffix, '.log')
+            self.assertEqual(jsonl_path, text_path.with_suffix('.jsonl'))
+            with open(text_path, encoding='utf-8') as text_file:
+                text = text_file.read()
+            with open(jsonl_path, encoding='utf-8') as jsonl_file:
+                self.assertEqual(log.text_log(jsonl_file), text)
+                jsonl_file.seek(0)
+                entries = list(log.read_entries(jsonl_file))
+
+        handled = [entry for entry in entries if entry['action'] == 'handling']
+        self.assertEqual([entry['rank'] for entry in handled], [1, 2, 3, 4, 5])
+
+        # Each trip was filled (and the rest were waitlisted)
+        trip_pks = {trip.pk for trip in self.trips}
+        actions = [(e['action'], e['trip']) for e in entries if e['trip']]
+        self.assertEqual(
+            sorted(act for act, _ in actions), [*(4 * ['placed']), 'waitlisted']
+        )
+        self.assertEqual({trip_pk for _, trip_pk in actions}, trip_pks)
@@ -0,0 +1,113 @@
+import json
+import tempfile
+from datetime import date
+from pathlib import Path
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from freezegun import freeze_time
+
+from ws import enums, models, settings
+from ws.lottery import profiling, run
+from ws.tests import TestCase, factories
+
+
+class PercentileTests(SimpleTestCase):
+    def test_empty(self):
+        self.assertIsNone(profiling.percentile([], 50))
+
+    def test_nearest_rank(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(profiling.percentile(values, 50), 50.0)
+        self.assertEqual(profiling.percentile(values, 99), 99.0)
+        self.assertEqual(profiling.percentile(values, 100), 100.0)
+        self.assertEqual(profiling.percentile([3.0], 0), 3.0)
+
+
+class LotteryProfilerTests(TestCase):
+    def test_queries_and_rows_per_phase(self):
+        factories.ParticipantFactory.create_batch(3)
+        profiler = profiling.LotteryProfiler()
+
+        with profiler.profile():
+            with profiler.phase('read'):
+                list(models.Participant.objects.all())
+                with profiler.phase('count'):
+                    models.Participant.objects.count()
+            with profiler.phase('count'):
+                models.Participant.objects.count()
+
+        report = profiler.report()
+        self.assertEqual(report['queries'], 3)
+        # Outer phases include any nested phases
+        self.assertEqual(report['phases']['read']['queries'], 2)
+        self.assertEqual(report['phases']['read']['rows'], 4)
+        self.assertEqual(report['phases']['count']['calls'], 2)
+        self.assertEqual(report['phases']['count']['queries'], 2)
+
+    def test_queries_only_counted_while_profiling(self):
+        profiler = profiling.LotteryProfiler()
+        with profiler.phase('outside'):
+            models.Participant.objects.count()
+        self.assertEqual(profiler.report()['phases']['outside']['queries'], 0)
+
+    def test_handler_latency(self):
+        profiler = profiling.LotteryProfiler()
+        self.assertEqual(
+            profiler.handler_latency(),
+            {
+                'count': 0,
+                'p50': None,
+                'p90': None,
+                'p95': None,
+                'p99': None,
+                'max': None,
+            },
+        )
+
+        profiler.handler_seconds = [0.3, 0.1, 0.2]
+        latency = profiler.handler_latency()
+        self.assertEqual(latency['count'], 3)
+        self.assertEqual(latency['p50'], 0.2)
+        self.assertEqual(latency['max'], 0.3)
+
+
+@freeze_time("2020-01-15 09:00:00 EST")
+class WinterSchoolProfileReportTests(TestCase):
+    def test_report_written_next_to_log(self):
+        trip = factories.TripFactory.create(
+            algorithm='lottery',
+            program=enums.Program.WINTER_SCHOOL.value,
+            maximum_participants=1,
+            trip_date=date(2020, 1, 18),
+        )
+        factories.SignUpFactory.create_batch(2, trip=trip)
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            with patch.object(settings, 'WS_LOTTERY_LOG_DIR', log_dir):
+                run.WinterSchoolLotteryRunner()()
+            log_path = Path(log_dir, 'ws_2020-01-15T:09:00:00.log')
+            self.assertTrue(log_path.exists())
+            with open(
+                Path(log_dir, 'ws_2020-01-15T:09:00:00.profile.json'), encoding='utf-8'
+            ) as profile:
+                report = json.load(profile)
+
+        self.assertEqual(report['execution_datetime'], '2020-01-15T09:00:00-05:00')
+        self.assertTrue(report['in_memory'])
+        self.assertGreater(report['queries'], 0)
+        self.assertEqual(
+            set(report['phases']),
+            {
+                'assign_trips',
+                'rank',
+                'load',
+                'place',
+                'driver_bump_checks',
+                'waitlist_inserts',
+                'save',
+                'free_for_all',
+            },
+        )
+        self.assertEqual(report['phases']['waitlist_inserts']['calls'], 1)
+        self.assertEqual(report['handler_latency']['count'], 2)
@@ -1,7 +1,7 @@
 import itertools
 import random
 import unittest
-from datetime import date
+from datetime import date, datetime
 from typing import ClassVar, List
 from unittest.mock import patch
 
@@ -10,6 +10,7 @@ from django.db.models import signals
 from django.test import SimpleTestCase
 from freezegun import freeze_time
 
+import ws.utils.dates as date_utils
 from ws import enums, models, settings
 from ws.lottery import rank
 from ws.tests import TestCase
@@ -149,6 +150,41 @@ class SeedTests(unittest.TestCase):
             random.random(), rank.affiliation_weighted_rand(non_affiliate, 'trip-142')
         )
 
+    def test_global_random_state_untouched(self):
+        """Generating keys does not reseed the global PRNG used by other code."""
+        random.seed('some unrelated seed')
+        expected = random.random()
+
+        random.seed('some unrelated seed')
+        rank.affiliation_weighted_rand(
+            models.Participant(pk=12, affiliation='MU'), 'hi'
+        )
+        rank.random_keys([1, 2, 3], 'hi')
+        self.assertEqual(random.random(), expected)
+
+    def test_batch_matches_individual(self):
+        """Keys generated in bulk are identical to those made one at a time."""
+        participants = [
+            models.Participant(pk=12, affiliation='MU'),
+            models.Participant(pk=24, affiliation='NA'),
+            models.Participant(pk=37, affiliation='MG'),
+        ]
+        self.assertEqual(
+            rank.affiliation_weighted_rands(participants, 'ws-2020-01-15'),
+            {
+                par.pk: rank.affiliation_weighted_rand(par, 'ws-2020-01-15')
+                for par in participants
+            },
+        )
+
+        # Raw keys are exactly what's produced by seeding the global PRNG
+        random.seed(rank.seed_for(participants[0], 'trip-142'))
+        self.assertEqual(rank.random_keys([12], 'trip-142'), {12: random.random()})
+
+    def test_batch_requires_saved_participants(self):
+        with self.assertRaises(ValueError):
+            rank.random_keys([12, None], 'trip-142')
+
 
 class ParticipantRankingTests(SimpleTestCase):
     """Test the logic by which we determine users with "first pick" status."""
@@ -416,3 +452,102 @@ class FlakeFactorTests(TestCase):
             rank.TripCounts(attended=0, flaked=1, total=1),
         )
         self.assertEqual(5, self.ranker.flake_factor(self.participant))
+
+
+@freeze_time("Wed, 24 Jan 2018 09:00:00 EST")
+class BulkPriorityKeyTests(TestCase):
+    """Ranking participants in bulk must exactly match ranking them one at a time."""
+
+    @staticmethod
+    def _ws_trip(trip_date, **kwargs):
+        return TripFactory.create(
+            program=enums.Program.WINTER_SCHOOL.value, trip_date=trip_date, **kwargs
+        )
+
+    def setUp(self):
+        self.ranker = rank.WinterSchoolParticipantRanker()
+
+        # Sign everybody up for next weekend's lottery trips
+        upcoming = [self._ws_trip(date(2018, 1, 27), algorithm='lottery')]
+        self.upcoming_trip = upcoming[0]
+        past = [self._ws_trip(date(2018, 1, 13)), self._ws_trip(date(2018, 1, 20))]
+        last_season = self._ws_trip(date(2017, 1, 21))
+
+        self.reliable = ParticipantFactory.create(affiliation='NA')
+        self.flaker = ParticipantFactory.create(affiliation='MU')
+        self.leader = ParticipantFactory.create(affiliation='MG')
+        self.boosted = ParticipantFactory.create(affiliation='NU')
+        self.newcomer = ParticipantFactory.create(affiliation='MA')
+        for par in [self.reliable, self.flaker, self.leader, self.boosted]:
+            SignUpFactory.create(participant=par, trip=upcoming[0])
+
+        # (The newcomer has no history whatsoever)
+        SignUpFactory.create(participant=self.newcomer, trip=upcoming[0])
+
+        for trip in past:
+            SignUpFactory.create(participant=self.reliable, trip=trip, on_trip=True)
+        # Only this season's trips are considered
+        SignUpFactory.create(participant=self.reliable, trip=last_season, on_trip=True)
+
+        # Flaked once while on the trip, once after being removed (twice reported)
+        SignUpFactory.create(participant=self.flaker, trip=past[0], on_trip=True)
+        FeedbackFactory.create(participant=self.flaker, trip=past[0], showed_up=False)
+        FeedbackFactory.create(participant=self.flaker, trip=past[1], showed_up=False)
+        FeedbackFactory.create(participant=self.flaker, trip=past[1], showed_up=False)
+
+        # Led three trips in the last year, attended one.
+        for trip in [*past, self._ws_trip(date(2017, 12, 9))]:
+            trip.leaders.add(self.leader)
+        last_season.leaders.add(self.leader)  # (Just over a year ago)
+        SignUpFactory.create(participant=self.leader, trip=past[0], on_trip=True)
+
+        models.LotteryAdjustment.objects.create(
+            creator=ParticipantFactory.create(),
+            participant=self.boosted,
+            adjustment=-1,
+            expires=date_utils.localize(datetime(2018, 1, 25, 12)),
+        )
+
+    def test_keys_match_individual_ranking(self):
+        participants = list(self.ranker.participants_to_handle())
+        self.assertEqual(len(participants), 5)
+
+        expected = {par.pk: self.ranker.priority_key(par) for par in participants}
+        self.assertEqual(self.ranker.priority_keys(participants), expected)
+
+        # Sanity check: the test data exercises every component of the key
+        self.assertEqual(expected[self.boosted.pk].adjustment, -1)
+        self.assertEqual(expected[self.flaker.pk].flake_factor, 10)
+        self.assertEqual(expected[self.reliable.pk].flake_factor, 0)
+        self.assertEqual(expected[self.leader.pk].leader_bump, -2)
+
+    def test_ranking_order_matches(self):
+        ranked = list(self.ranker)
+        one_at_a_time = sorted(
+            self.ranker.participants_to_handle(), key=self.ranker.priority_key
+        )
+        self.assertEqual([par for par, _ in ranked], one_at_a_time)
+        self.assertEqual(ranked[0][0], self.boosted)
+        self.assertEqual(ranked[-1][0], self.flaker)
+
+    def test_query_count_is_constant(self):
+        participants = list(self.ranker.participants_to_handle())
+        # Adjustments, attendance, flakes, and trips led.
+        with self.assertNumQueries(4):
+            self.ranker.priority_keys(participants)
+
+    def test_lowest_non_driver_uses_cached_keys(self):
+        """Once participants are ranked, finding a driver's bump victim is one query."""
+        LotteryInfoFactory.create(participant=self.flaker, car_status='own')
+        models.SignUp.objects.filter(
+            trip=self.upcoming_trip,
+            participant__in=[self.reliable, self.flaker, self.boosted],
+        ).update(on_trip=True)
+
+        ranked = list(self.ranker)
+        self.assertEqual(ranked[-1][0], self.flaker)
+
+        with self.assertNumQueries(1):
+            signup = self.ranker.lowest_non_driver(self.upcoming_trip)
+        # The flaker is a driver, so can't be bumped (and the boosted participant wins)
+        self.assertEqual(signup.participant, self.reliable)
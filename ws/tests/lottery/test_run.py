@@ -7,7 +7,7 @@ from mitoc_const import affiliations
 
 import ws.utils.dates as date_utils
 from ws import enums, models, settings
-from ws.lottery import run
+from ws.lottery import rank, run
 from ws.tests import TestCase, factories
 
 
@@ -121,6 +121,75 @@ class SingleTripLotteryTests(TestCase):
         self.assertTrue(bob.waitlistsignup)
 
 
+class PreloadedParticipantTests(TestCase):
+    def test_preload_many_trips(self):
+        """Participants for several trips are loaded with one query."""
+        one, two = (
+            factories.TripFactory.create(
+                algorithm='lottery', program=enums.Program.CLIMBING.value
+            )
+            for _ in range(2)
+        )
+        empty = factories.TripFactory.create(
+            algorithm='lottery', program=enums.Program.HIKING.value
+        )
+        bonnie = factories.ParticipantFactory.create(name="Bonnie")
+        clyde = factories.ParticipantFactory.create(name="Clyde")
+        factories.LotteryInfoFactory.create(participant=bonnie, paired_with=clyde)
+        factories.LotteryInfoFactory.create(participant=clyde, paired_with=bonnie)
+        loner = factories.ParticipantFactory.create(name="Loner")
+
+        for par in [bonnie, clyde, loner]:
+            factories.SignUpFactory.create(participant=par, trip=one)
+        factories.SignUpFactory.create(participant=loner, trip=two)
+
+        with self.assertNumQueries(1):
+            by_trip = run.preload_single_trip_participants([one.pk, two.pk, empty.pk])
+
+        self.assertEqual(by_trip[empty.pk], [])
+        self.assertEqual(
+            by_trip[two.pk],
+            [
+                {
+                    'pk': loner.pk,
+                    'name': "Loner",
+                    'email': loner.email,
+                    'affiliation': loner.affiliation,
+                    'reciprocally_paired': False,
+                }
+            ],
+        )
+        self.assertEqual(
+            {par['name']: par['reciprocally_paired'] for par in by_trip[one.pk]},
+            {"Bonnie": True, "Clyde": True, "Loner": False},
+        )
+
+    def test_ranking_unchanged(self):
+        """Preloaded participants are ranked exactly as if queried by the ranker."""
+        trip = factories.TripFactory.create(
+            algorithm='lottery', program=enums.Program.CLIMBING.value
+        )
+        for affiliation in ['MU', 'NA', 'MG', 'NU']:
+            factories.SignUpFactory.create(
+                trip=trip, participant__affiliation=affiliation
+            )
+
+        runner = run.SingleTripLotteryRunner(
+            trip, run.preload_single_trip_participants([trip.pk])[trip.pk]
+        )
+        with self.assertNumQueries(0):
+            preloaded = list(
+                rank.SingleTripParticipantRanker(trip, runner._preloaded_participants())
+            )
+
+        queried = list(rank.SingleTripParticipantRanker(trip))
+        self.assertEqual(
+            [(par.pk, key) for par, key in preloaded],
+            [(par.pk, key) for par, key in queried],
+        )
+        runner.close_log()
+
+
 @freeze_time("2020-01-15 09:00:00 EST")
 class WinterSchoolLotteryTests(TestCase):
     @staticmethod
@@ -0,0 +1,327 @@
+import itertools
+import logging
+import random
+from datetime import date, datetime
+
+from django.db import transaction
+from django.test import SimpleTestCase
+from freezegun import freeze_time
+
+from ws import enums, models
+from ws.lottery import run, simulate
+from ws.tests import TestCase, benchmark, factories
+
+
+class _Rollback(Exception):
+    """Raised to undo a lottery run executed directly against the database."""
+
+
+class LogCapture(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@freeze_time("2020-01-15 09:00:00 EST", tick=True)
+class SimulationEquivalenceTests(TestCase):
+    """The in-memory lottery must place participants exactly as the db-backed one."""
+
+    @staticmethod
+    def _ws_trip(**kwargs):
+        return factories.TripFactory.create(
+            algorithm='lottery', program=enums.Program.WINTER_SCHOOL.value, **kwargs
+        )
+
+    def setUp(self):
+        self.trips = [
+            self._ws_trip(
+                name="Ice", maximum_participants=4, trip_date=date(2020, 1, 18)
+            ),
+            self._ws_trip(
+                name="Hike", maximum_participants=3, trip_date=date(2020, 1, 18)
+            ),
+            self._ws_trip(
+                name="Ski", maximum_participants=2, trip_date=date(2020, 1, 19)
+            ),
+            self._ws_trip(
+                name="Lake", maximum_participants=5, trip_date=date(2020, 1, 19)
+            ),
+        ]
+        leader = factories.ParticipantFactory.create(name="Driving Leader")
+        factories.LotteryInfoFactory.create(participant=leader, car_status='own')
+        self.trips[0].leaders.add(leader)
+
+        rand = random.Random(1234)
+        self.participants = []
+        for i in range(24):
+            par = factories.ParticipantFactory.create(name=f"Participant {i}")
+            self.participants.append(par)
+            if i % 4 == 0:
+                factories.LotteryInfoFactory.create(participant=par, car_status='rent')
+            for order, trip in enumerate(rand.sample(self.trips, 3), start=1):
+                factories.SignUpFactory.create(participant=par, trip=trip, order=order)
+
+        one, two, three = self.participants[1:4]
+        # A reciprocal pair, and a participant whose partner did not reciprocate
+        # (and who did not sign up for any trips)
+        four = factories.ParticipantFactory.create(name="Not Participating")
+        factories.LotteryInfoFactory.create(
+            participant=one, paired_with=two, car_status='none'
+        )
+        factories.LotteryInfoFactory.create(
+            participant=two, paired_with=one, car_status='none'
+        )
+        factories.LotteryInfoFactory.create(
+            participant=three, paired_with=four, car_status='none'
+        )
+
+        # Somebody was already placed on one trip, another already waitlisted
+        signup = models.SignUp.objects.filter(trip=self.trips[2]).first()
+        signup.on_trip = True
+        signup.save()
+        factories.WaitListSignupFactory.create(
+            signup=models.SignUp.objects.filter(
+                trip=self.trips[1], on_trip=False
+            ).last(),
+            manual_order=5,
+        )
+        factories.LotteryAdjustmentFactory.create(
+            participant=self.participants[-1], adjustment=-1
+        )
+
+    def _results(self):
+        placements = dict(
+            models.SignUp.objects.filter(trip__in=self.trips).values_list(
+                'pk', 'on_trip'
+            )
+        )
+        waitlists = {
+            trip.pk: [signup.pk for signup in trip.waitlist.signups]
+            for trip in self.trips
+        }
+        return placements, waitlists
+
+    @staticmethod
+    def _run(in_memory):
+        runner = run.WinterSchoolLotteryRunner(in_memory=in_memory)
+        capture = LogCapture()
+        runner.logger.addHandler(capture)
+        runner.assign_trips()
+        runner.logger.removeHandler(capture)
+        runner.close_log()
+        return capture.messages
+
+    def test_identical_results(self):
+        try:
+            with transaction.atomic():
+                db_log = self._run(in_memory=False)
+                db_results = self._results()
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        in_memory_log = self._run(in_memory=True)
+        placements, waitlists = self._results()
+
+        self.assertEqual(in_memory_log, db_log)
+        self.assertEqual(placements, db_results[0])
+        self.assertEqual(waitlists, db_results[1])
+
+        # Sanity check: the lottery actually did something interesting.
+        self.assertIn(True, placements.values())
+        self.assertTrue(any(len(signups) > 1 for signups in waitlists.values()))
+
+    def test_dry_run_writes_nothing(self):
+        before = self._results()
+        runner = run.WinterSchoolLotteryRunner()
+        simulation = runner.simulate()
+        runner.close_log()
+        self.assertEqual(self._results(), before)
+
+        # The simulation itself reflects the results that would be saved.
+        self.assertNotEqual(simulation.placements(), before[0])
+        simulation.save()
+        self.assertEqual(
+            self._results(), (simulation.placements(), simulation.waitlists())
+        )
+
+    def test_signups_require_a_priority_key(self):
+        runner = run.WinterSchoolLotteryRunner()
+        self.addCleanup(runner.close_log)
+        (par, key), *others = list(runner.ranker)
+
+        # Placements & bumps are never made with a missing (or partial) key
+        for ranked in [others, [(par, None), *others]]:
+            with self.assertRaisesRegex(ValueError, f"Participant {par.pk} has"):
+                simulate.WinterSchoolLotterySimulation(runner, ranked)
+        with self.assertRaisesRegex(ValueError, f"Participant {par.pk} has"):
+            simulate.WinterSchoolLotterySimulation(
+                runner, [(par, key._replace(flake_factor=None)), *others]
+            )
+
+    def test_query_count_independent_of_participants(self):
+        runner = run.WinterSchoolLotteryRunner()
+        with self.assertNumQueries(10):
+            simulation = runner.simulate()
+        runner.close_log()
+
+        for i in range(10):
+            par = factories.ParticipantFactory.create(name=f"Latecomer {i}")
+            factories.SignUpFactory.create(participant=par, trip=self.trips[i % 4])
+
+        runner = run.WinterSchoolLotteryRunner()
+        with self.assertNumQueries(10):
+            simulation = runner.simulate()
+        runner.close_log()
+        self.assertEqual(len(simulation.participants), 35)
+
+
+class LowestNonDriverTests(SimpleTestCase):
+    @staticmethod
+    def _participant(pk, is_driver=False, priority_key=(0, 0, 0, 0.5)):
+        return simulate.LotteryParticipant(
+            pk=pk,
+            name=f"Participant {pk}",
+            email=f"par{pk}@example.com",
+            affiliation='NA',
+            is_driver=is_driver,
+            paired_with_id=None,
+            reciprocally_paired=False,
+            priority_key=priority_key,
+        )
+
+    def _signup(self, trip, participant, on_trip=False):
+        signup = simulate.SimulatedSignUp(
+            pk=participant.pk,
+            participant=participant,
+            trip=trip,
+            order=None,
+            time_created=datetime(2020, 1, 15, 9),
+            on_trip=on_trip,
+        )
+        trip.signups.append(signup)
+        return signup
+
+    def test_heap_tracks_placements_and_bumps(self):
+        trip = simulate.SimulatedTrip(
+            pk=1,
+            name="Ice",
+            maximum_participants=4,
+            waitlist_id=1,
+            num_leader_drivers=0,
+        )
+        self.assertIsNone(trip.lowest_non_driver())
+
+        flaker = self._signup(trip, self._participant(1, priority_key=(0, 5, 0, 0.1)))
+        middling = self._signup(trip, self._participant(2, priority_key=(0, 0, 0, 0.6)))
+        driver = self._signup(
+            trip, self._participant(3, is_driver=True, priority_key=(0, 9, 0, 0.9))
+        )
+        boosted = self._signup(
+            trip, self._participant(4, priority_key=(-1, 0, 0, 0.9)), on_trip=True
+        )
+        self.assertIs(trip.lowest_non_driver(), boosted)
+
+        middling.on_trip = True
+        driver.on_trip = True  # Drivers are never bumped.
+        self.assertIs(trip.lowest_non_driver(), middling)
+
+        flaker.on_trip = True
+        self.assertIs(trip.lowest_non_driver(), flaker)
+
+        # Bumped participants are no longer candidates, but may return.
+        flaker.on_trip = False
+        self.assertIs(trip.lowest_non_driver(), middling)
+        middling.on_trip = False
+        self.assertIs(trip.lowest_non_driver(), boosted)
+        flaker.on_trip = True
+        self.assertIs(trip.lowest_non_driver(), flaker)
+        self.assertEqual(trip.open_slots, 1)
+
+
+class RealisticWeekBenchmark(TestCase):
+    """Placing a typical week of Winter School participants stays fast."""
+
+    @staticmethod
+    def _bulk_participants(num):
+        users = models.User.objects.bulk_create(
+            models.User(username=f'week{i}', email=f'week{i}@example.com')
+            for i in range(num)
+        )
+        contacts = models.EmergencyContact.objects.bulk_create(
+            models.EmergencyContact(
+                name="My Mother", cell_phone="+17815550342", relationship="Mother"
+            )
+            for _ in range(num)
+        )
+        infos = models.EmergencyInfo.objects.bulk_create(
+            models.EmergencyInfo(emergency_contact=contact) for contact in contacts
+        )
+        return models.Participant.objects.bulk_create(
+            models.Participant(
+                user_id=user.pk,
+                name=f"Participant {i}",
+                email=user.email,
+                affiliation=rand_affiliation,
+                emergency_info=info,
+            )
+            for i, (user, info, rand_affiliation) in enumerate(
+                zip(users, infos, itertools.cycle(['MU', 'MG', 'NA', 'ML']))
+            )
+        )
+
+    def setUp(self):
+        super().setUp()
+        rand = random.Random(60)
+        trips = [
+            factories.TripFactory.create(
+                algorithm='lottery',
+                program=enums.Program.WINTER_SCHOOL.value,
+                maximum_participants=rand.randint(8, 14),
+                trip_date=date(2020, 1, 18 + (i % 2)),
+            )
+            for i in range(60)
+        ]
+        participants = self._bulk_participants(1200)
+
+        # One in five participants can drive; most rank three trips
+        models.LotteryInfo.objects.bulk_create(
+            models.LotteryInfo(participant=par, car_status='own')
+            for par in participants[::5]
+        )
+        models.SignUp.objects.bulk_create(
+            models.SignUp(participant=par, trip=trip, order=order)
+            for par in participants
+            for order, trip in enumerate(rand.sample(trips, rand.randint(1, 5)))
+        )
+
+    @staticmethod
+    def _simulate():
+        runner = run.WinterSchoolLotteryRunner()
+        with runner.profiler.profile():  # (Queries are only counted when profiling)
+            simulation = runner.simulate()
+        runner.close_log()
+        return runner, simulation
+
+    @freeze_time("2020-01-15 09:00:00 EST", tick=True)
+    def test_driver_bump_checks(self):
+        runner, simulation = self._simulate()
+
+        checks = runner.profiler.phases['driver_bump_checks']
+        self.assertEqual(runner.profiler.handler_latency()['count'], 1200)
+        self.assertGreater(checks.calls, 1000)
+        self.assertEqual(checks.queries, 0)
+        self.assertGreater(runner.profiler.queries, 0)  # (Ranking & loading query)
+
+        # Every driver was handled by the end of the lottery.
+        self.assertEqual(set(runner.unhandled_drivers.values()), {0})
+        self.assertGreater(sum(simulation.placements().values()), 600)
+
+    @benchmark
+    @freeze_time("2020-01-15 09:00:00 EST", tick=True)
+    def test_driver_bump_check_time(self):
+        runner, _ = self._simulate()
+        self.assertLess(runner.profiler.phases['driver_bump_checks'].seconds, 0.5)
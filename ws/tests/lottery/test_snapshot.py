@@ -0,0 +1,184 @@
+import io
+import json
+import random
+import tempfile
+from contextlib import nullcontext
+from datetime import date, datetime
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+from freezegun import freeze_time
+
+from ws import enums, models, settings
+from ws.lottery import run, snapshot
+from ws.management.commands.lottery_snapshot import Command
+from ws.tests import TestCase, factories
+from ws.utils.dates import localize
+
+
+@freeze_time("2020-01-15 09:00:00 EST", tick=True)
+class SnapshotReplayTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.execution_datetime = localize(datetime(2020, 1, 15, 9, 0))
+        trips = [
+            factories.TripFactory.create(
+                algorithm='lottery',
+                program=enums.Program.WINTER_SCHOOL.value,
+                maximum_participants=3,
+                trip_date=date(2020, 1, 18 + (i % 2)),
+            )
+            for i in range(4)
+        ]
+        leader = factories.ParticipantFactory.create()
+        factories.LotteryInfoFactory.create(participant=leader, car_status='own')
+        trips[0].leaders.add(leader)
+
+        rand = random.Random(15)
+        participants = factories.ParticipantFactory.create_batch(16)
+        for par in participants:
+            for order, trip in enumerate(rand.sample(trips, 2)):
+                factories.SignUpFactory.create(participant=par, trip=trip, order=order)
+        for driver in participants[::5]:
+            factories.LotteryInfoFactory.create(participant=driver, car_status='own')
+        one, two = participants[1:3]
+        factories.LotteryInfoFactory.create(participant=one, paired_with=two)
+        factories.LotteryInfoFactory.create(participant=two, paired_with=one)
+
+        # Past trips inform ranking: one participant flaked, another led a trip.
+        past_trip = factories.TripFactory.create(
+            program=enums.Program.WINTER_SCHOOL.value, trip_date=date(2020, 1, 11)
+        )
+        factories.SignUpFactory.create(
+            participant=participants[3], trip=past_trip, on_trip=True
+        )
+        factories.FeedbackFactory.create(
+            participant=participants[4], trip=past_trip, showed_up=False
+        )
+        past_trip.leaders.add(participants[5])
+        factories.LotteryAdjustmentFactory.create(
+            participant=participants[6], adjustment=-1
+        )
+        factories.LotterySeparationFactory.create(
+            initiator=participants[7], recipient=participants[8]
+        )
+        factories.WaitListSignupFactory.create(
+            signup=models.SignUp.objects.filter(trip=trips[1]).first(),
+            manual_order=3,
+        )
+
+    def _simulate(self):
+        runner = run.WinterSchoolLotteryRunner(self.execution_datetime)
+        simulation = runner.simulate()
+        runner.close_log()
+        return snapshot.summarize(simulation)
+
+    @staticmethod
+    def _clear_database():
+        models.Trip.objects.all().delete()
+        models.Participant.objects.all().delete()
+
+    def test_replay_matches_original(self):
+        expected = self._simulate()
+        data = snapshot.export_snapshot(self.execution_datetime)
+        self._clear_database()
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            with patch.object(settings, 'WS_LOTTERY_LOG_DIR', log_dir):
+                actual = snapshot.replay(data)
+            # Replays don't leave logs alongside those of real lottery runs
+            self.assertEqual(list(Path(log_dir).iterdir()), [])
+        self.assertEqual(snapshot.diff_results(expected, actual), [])
+        self.assertEqual(actual, expected)
+        self.assertTrue(actual['placements'])
+
+        # The replay wrote nothing, so it may be done again.
+        self.assertFalse(models.Participant.objects.exists())
+        self.assertEqual(snapshot.replay(data), expected)
+
+    def test_only_lottery_data_exported(self):
+        unrelated = factories.SignUpFactory.create(
+            trip__program=enums.Program.CLIMBING.value
+        )
+        data = snapshot.export_snapshot(self.execution_datetime)
+
+        par_pks = {row[0] for row in data['participants']}
+        self.assertEqual(len(par_pks), 17)
+        self.assertNotIn(unrelated.participant.pk, par_pks)
+        self.assertEqual(len(data['trips']), 5)
+        self.assertEqual(len(data['signups']), 33)
+        self.assertEqual(len(data['flakes']), 1)
+        self.assertEqual(len(data['adjustments']), 1)
+        self.assertEqual(len(data['separations']), 1)
+        self.assertEqual(len(data['waitlist_signups']), 1)
+
+    def test_command(self):
+        expected = self._simulate()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            snapshot_path = Path(tmpdir, 'snapshot.json')
+            results_path = Path(tmpdir, 'results.json')
+            call_command(
+                'lottery_snapshot',
+                'export',
+                str(snapshot_path),
+                '--at',
+                self.execution_datetime.isoformat(),
+                stdout=io.StringIO(),
+            )
+            self._clear_database()
+            results_path.with_name('expected.json').write_text(json.dumps(expected))
+
+            with patch.object(Command, 'isolated_database', nullcontext):
+                call_command(
+                    'lottery_snapshot',
+                    'replay',
+                    str(snapshot_path),
+                    '--output',
+                    str(results_path),
+                    '--compare',
+                    str(results_path.with_name('expected.json')),
+                    stdout=io.StringIO(),
+                )
+            with open(results_path, encoding='utf-8') as results_file:
+                self.assertEqual(json.load(results_file), expected)
+
+            call_command(
+                'lottery_snapshot',
+                'diff',
+                str(results_path),
+                str(results_path),
+                stdout=io.StringIO(),
+            )
+
+
+class DiffResultsTests(SimpleTestCase):
+    def test_differences(self):
+        expected = {'placements': {'1': [10], '2': [11]}, 'waitlists': {'10': [3, 4]}}
+        actual = {'placements': {'1': [10], '3': [11]}, 'waitlists': {'10': [4, 3]}}
+        self.assertEqual(snapshot.diff_results(expected, expected), [])
+        self.assertEqual(
+            snapshot.diff_results(expected, actual),
+            [
+                "Participant 2 placement: [11] != []",
+                "Participant 3 placement: [] != [11]",
+                "Trip 10 waitlist: [3, 4] != [4, 3]",
+            ],
+        )
+
+    def test_command_fails_on_differences(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            expected = Path(tmpdir, 'expected.json')
+            actual = Path(tmpdir, 'actual.json')
+            expected.write_text(json.dumps({'placements': {'1': [8]}, 'waitlists': {}}))
+            actual.write_text(json.dumps({'placements': {}, 'waitlists': {}}))
+            with self.assertRaises(CommandError):
+                call_command(
+                    'lottery_snapshot',
+                    'diff',
+                    str(expected),
+                    str(actual),
+                    stdout=io.StringIO(),
+                )
@@ -17,7 +17,7 @@ class NotALeaderMessagesTest(MessagesTestCase):
     def test_anonymous_user(self):
         request = self.factory.get('/')
 
-        # Simulate the effects of the ParticipantMiddleware for an anonymous user
+        # Simulate the effects of the UserMiddleware for an anonymous user
         request.user = AnonymousUser()
         request.participant = None
 
@@ -29,7 +29,7 @@ class NotALeaderMessagesTest(MessagesTestCase):
     def test_user_but_no_participant_on_request(self):
         request = self.factory.get('/')
 
-        # Simulate the effects of the ParticipantMiddleware for a known user
+        # Simulate the effects of the UserMiddleware for a known user
         request.user = factories.UserFactory.create()
         request.participant = None
 
@@ -41,7 +41,7 @@ class NotALeaderMessagesTest(MessagesTestCase):
     def test_participant_not_a_leader(self):
         request = self.factory.get('/')
 
-        # Simulate the effects of the ParticipantMiddleware for a known participant
+        # Simulate the effects of the UserMiddleware for a known participant
         participant = factories.ParticipantFactory.create()
         request.participant = participant
         request.user = participant.user
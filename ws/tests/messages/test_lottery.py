@@ -17,7 +17,7 @@ class LotteryMessagesTest(MessagesTestCase):
         """Anonymous users shouldn't receive lottery warnings."""
         request = self.factory.get('/')
 
-        # Simulate the effects of the ParticipantMiddleware for an anonymous user
+        # Simulate the effects of the UserMiddleware for an anonymous user
         request.user = AnonymousUser()
         request.participant = None
 
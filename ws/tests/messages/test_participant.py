@@ -12,7 +12,7 @@ class ParticipantMessagesTest(MessagesTestCase):
         """With no participant object, no messages should be emitted."""
         request = self.factory.get('/')
 
-        # Simulate the effects of the ParticipantMiddleware for an anonymous user
+        # Simulate the effects of the UserMiddleware for an anonymous user
         request.user = AnonymousUser()
         request.participant = None
 
@@ -39,7 +39,7 @@ class ParticipantMessagesTest(MessagesTestCase):
         """Users must have a participant in order to be on trips."""
         request = self.factory.get('/')
 
-        # Simulate the effects of the ParticipantMiddleware for a known user
+        # Simulate the effects of the UserMiddleware for a known user
         request.user = factories.UserFactory.create()
         request.participant = None
 
@@ -19,7 +19,7 @@ class WarnIfPasswordInsecureTests(MessagesTestCase):
     def test_no_user_on_request(self):
         request = self.factory.get('/')
 
-        # Simulate the effects of the ParticipantMiddleware for an anonymous user
+        # Simulate the effects of the UserMiddleware for an anonymous user
         request.user = AnonymousUser()
         request.participant = None
 
@@ -32,7 +32,7 @@ class WarnIfPasswordInsecureTests(MessagesTestCase):
     def test_user_but_no_participant_on_request(self):
         request = self.factory.get('/')
 
-        # Simulate the effects of the ParticipantMiddleware for a known user
+        # Simulate the effects of the UserMiddleware for a known user
         request.user = UserFactory.create()
         request.participant = None
 
@@ -44,7 +44,7 @@ class WarnIfPasswordInsecureTests(MessagesTestCase):
 
     def test_participant_with_secure_password(self):
         request = self.factory.get('/')
-        # Simulate the effects of the ParticipantMiddleware for a known participant
+        # Simulate the effects of the UserMiddleware for a known participant
         quality = PasswordQualityFactory.create(is_insecure=False)
         request.participant = quality.participant
         request.user = quality.participant.user
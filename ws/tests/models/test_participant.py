@@ -1,15 +1,17 @@
 import datetime
-import unittest
+import statistics
+import time
 from datetime import date
 from unittest import mock
 
 from django.contrib.auth.models import AnonymousUser
+from django.db import connection
 from django.test import SimpleTestCase
 from freezegun import freeze_time
 
 import ws.utils.dates as date_utils
 from ws import enums, models
-from ws.tests import TestCase, factories
+from ws.tests import TestCase, benchmark, factories
 
 
 class ParticipantTest(TestCase):
@@ -35,6 +37,112 @@ class ParticipantTest(TestCase):
         self.assertEqual(ada.email_addr, '"Ada Lovelace" <ada@example.com>')
 
 
+class SearchTest(TestCase):
+    def _search(self, text):
+        return [par.name for par in models.Participant.objects.search(text)]
+
+    def test_words_match_by_prefix(self):
+        factories.ParticipantFactory.create(name="Tim Beaver", email="tim@mit.edu")
+        factories.ParticipantFactory.create(
+            name="Timothy O'Brien", email="tob@example.com"
+        )
+        factories.ParticipantFactory.create(name="Jane Doe", email="jd@mit.edu")
+
+        self.assertEqual(self._search('tim'), ['Tim Beaver', "Timothy O'Brien"])
+        self.assertEqual(self._search('TIM BEAV'), ['Tim Beaver'])
+        self.assertEqual(self._search("o'brien"), ["Timothy O'Brien"])
+        # Any part of an email address can be matched
+        self.assertEqual(self._search('mit.ed'), ['Jane Doe', 'Tim Beaver'])
+        self.assertEqual(self._search('example'), ["Timothy O'Brien"])
+        # Words don't match from the middle
+        self.assertEqual(self._search('eaver'), [])
+
+    def test_no_words(self):
+        factories.ParticipantFactory.create()
+        self.assertEqual(self._search(''), [])
+        self.assertEqual(self._search(' & :* !'), [])
+
+    def test_ranked(self):
+        """Participants matching in more places come first."""
+        factories.ParticipantFactory.create(name="Anne Mich", email="am@example.com")
+        factories.ParticipantFactory.create(
+            name="Mich Michaels", email="michaels@example.com"
+        )
+        self.assertEqual(self._search('mich'), ['Mich Michaels', 'Anne Mich'])
+
+    def test_search_is_indexed(self):
+        factories.ParticipantFactory.create(name="Tim Beaver")
+        with connection.cursor() as cursor:
+            # With so few rows, Postgres would otherwise just scan the whole table.
+            cursor.execute('set local enable_seqscan = off')
+        plan = models.Participant.objects.search('beav').explain()
+        self.assertIn('ws_participant_search', plan)
+
+
+@benchmark
+class SearchBenchmark(TestCase):
+    """Autocompletion stays fast (and indexed) even with many participants."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Creating this many rows through the ORM takes ~10 seconds; SQL is faster.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                insert into auth_user
+                  (username, email, password, first_name, last_name,
+                   is_superuser, is_staff, is_active, date_joined)
+                select 'search' || i, 'search' || i || '@example.com', '', '', '',
+                       false, false, true, now()
+                  from generate_series(0, 29999) as i;
+
+                insert into ws_emergencycontact (name, cell_phone, relationship, email)
+                select 'My Mother', '+17815550342', 'Mother', 'mum@example.com'
+                  from generate_series(0, 29999);
+
+                insert into ws_emergencyinfo
+                  (emergency_contact_id, allergies, medications, medical_history)
+                select id, '', '', '' from ws_emergencycontact;
+
+                insert into ws_participant
+                  (user_id, name, email, cell_phone, affiliation, emergency_info_id,
+                   last_updated, profile_last_updated, send_membership_reminder,
+                   gravatar_opt_out)
+                select u.id,
+                       (array['Tim', 'Alex', 'Sam', 'Jordan', 'Casey', 'Riley', 'Morgan'])
+                         [substring(u.username from 7)::int % 7 + 1]
+                         || ' Surname' || substring(u.username from 7),
+                       u.email, '', 'NA', e.id, now(), now(), false, false
+                  from (select *, row_number() over (order by id) as n
+                          from auth_user where username like 'search%') u
+                  join (select *, row_number() over (order by id) as n
+                          from ws_emergencyinfo) e using (n);
+
+                analyze ws_participant;
+                """
+            )
+
+    def test_search_is_indexed(self):
+        plan = models.Participant.objects.search('surname123').explain()
+        self.assertIn('ws_participant_search', plan)
+
+    def test_latency(self):
+        searches = ['s', 'su', 'sur', 'surname1', 'surname12345', 'tim sur', 'search9']
+        timings = []
+        for text in searches:
+            start = time.perf_counter()
+            results = list(models.Participant.objects.search(text)[:21])
+            timings.append(time.perf_counter() - start)
+            self.assertTrue(results)
+        self.assertEqual(
+            [par.name for par in models.Participant.objects.search('surname12345')],
+            ['Casey Surname12345'],
+        )
+        # Generous bounds (for slow CI machines); typical searches take a few ms.
+        self.assertLess(statistics.median(timings), 0.1)
+        self.assertLess(max(timings), 0.5)
+
+
 class ReasonsCannotAttendTest(TestCase):
     def test_is_wimp(self):
         # Note that the participant also has no membership!
@@ -388,7 +496,7 @@ class LeaderTest(TestCase):
         )
 
 
-class MembershipActiveTest(unittest.TestCase):
+class MembershipActiveTest(TestCase):
     def test_no_cached_membership(self):
         """Convenience methods on the participant require membership/waiver!"""
         par = factories.ParticipantFactory.build(membership=None)
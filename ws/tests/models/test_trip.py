@@ -1,10 +1,11 @@
 from datetime import date, datetime
+from unittest.mock import patch
 
 from django.core.exceptions import ValidationError
 from django.test import SimpleTestCase
 from freezegun import freeze_time
 
-from ws import enums
+from ws import enums, models
 from ws.tests import TestCase, factories
 from ws.utils.dates import localize
 
@@ -224,3 +225,80 @@ class TripDatesTest(SimpleTestCase):
 
         next_month_trip = factories.TripFactory.build(trip_date=date(2020, 2, 16))
         self.assertFalse(next_month_trip.less_than_a_week_away)
+
+
+@freeze_time("2019-02-15 12:25:00 EST")
+class TripSummaryTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = factories.TripFactory.create(
+            program=enums.Program.CLIMBING.value, trip_date=date(2019, 2, 23)
+        )
+
+    def _summary(self):
+        return models.TripSummary.objects.get(trip=self.trip)
+
+    def test_signups_counted(self):
+        self.assertEqual(self._summary().num_signups, 0)
+        signups = factories.SignUpFactory.create_batch(3, trip=self.trip)
+        self.assertEqual(self._summary().num_signups, 3)
+        signups[0].delete()
+        self.assertEqual(self._summary().num_signups, 2)
+
+    def test_leaders_with_rating(self):
+        leader = factories.ParticipantFactory.create(name="Tim Beaver")
+        factories.LeaderRatingFactory.create(
+            participant=leader,
+            activity=enums.Activity.CLIMBING.value,
+            rating="Sport",
+        )
+        self.trip.leaders.add(leader)
+        self.assertEqual(self._summary().leaders_with_rating, ["Tim Beaver (Sport)"])
+
+        # Ratings made before the trip are shown
+        with freeze_time("2019-02-20 12:00:00 EST"):
+            factories.LeaderRatingFactory.create(
+                participant=leader,
+                activity=enums.Activity.CLIMBING.value,
+                rating="Multi-pitch",
+            )
+        self.assertEqual(
+            self._summary().leaders_with_rating, ["Tim Beaver (Multi-pitch)"]
+        )
+
+        leader.name = "Timothy Beaver"
+        leader.save()
+        self.assertEqual(
+            self._summary().leaders_with_rating, ["Timothy Beaver (Multi-pitch)"]
+        )
+
+        leader.trips_led.clear()
+        self.assertEqual(self._summary().leaders_with_rating, [])
+
+    def test_resummarized_when_date_changes(self):
+        leader = factories.ParticipantFactory.create(name="Tim Beaver")
+        self.trip.leaders.add(leader)
+        with freeze_time("2019-03-01 12:00:00 EST"):
+            factories.LeaderRatingFactory.create(
+                participant=leader,
+                activity=enums.Activity.CLIMBING.value,
+                rating="Sport",
+            )
+        self.assertEqual(self._summary().leaders_with_rating, ["Tim Beaver"])
+
+        with patch.object(models.TripQuerySet, 'refresh_summaries') as refresh:
+            self.trip.algorithm = 'fcfs'
+            self.trip.save()
+            models.Trip.objects.get(pk=self.trip.pk).save()
+        refresh.assert_not_called()
+
+        self.trip.trip_date = date(2019, 3, 9)
+        self.trip.save()
+        self.assertEqual(self._summary().leaders_with_rating, ["Tim Beaver (Sport)"])
+
+    def test_refresh(self):
+        models.TripSummary.objects.all().delete()
+        factories.SignUpFactory.create(trip=self.trip)
+
+        models.Trip.objects.filter(pk=self.trip.pk).refresh_summaries()
+        self.assertEqual(self._summary().num_signups, 1)
@@ -51,3 +51,87 @@ class OrderingTests(TestCase):
         factories.WaitListSignupFactory.create(signup=spot_4, manual_order=None)
 
         self.assertEqual(list(trip.waitlist.signups), [spot_1, spot_2, spot_3, spot_4])
+
+
+class PositionTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = factories.TripFactory.create()
+        self.waitlist = self.trip.waitlist
+
+    def _waitlist(self, count, **kwargs):
+        return [
+            factories.WaitListSignupFactory.create(
+                signup__trip=self.trip, waitlist=self.waitlist, **kwargs
+            ).signup
+            for _ in range(count)
+        ]
+
+    def _assert_follows_rules(self):
+        """Positions give exactly the order of the waitlist rules."""
+        by_rules = models.WaitListSignup.objects.filter(
+            waitlist=self.waitlist
+        ).order_by(*models.waitlist_order())
+        self.assertEqual(list(self.waitlist.waitlistsignup_set.all()), list(by_rules))
+
+    def test_position_of(self):
+        first, second, third = self._waitlist(3)
+        self.assertEqual(
+            [self.waitlist.position_of(signup) for signup in [first, second, third]],
+            [1, 2, 3],
+        )
+
+        # Not waitlisted, or waitlisted on another trip
+        self.assertIsNone(self.waitlist.position_of(factories.SignUpFactory.create()))
+        other = factories.WaitListSignupFactory.create().signup
+        self.assertIsNone(self.waitlist.position_of(other))
+
+    def test_priority_entries(self):
+        first, second = self._waitlist(2)
+        top = factories.WaitListSignupFactory.create(
+            signup__trip=self.trip,
+            waitlist=self.waitlist,
+            manual_order=self.waitlist.first_of_priority,
+        ).signup
+        below_top = factories.WaitListSignupFactory.create(
+            signup__trip=self.trip,
+            waitlist=self.waitlist,
+            manual_order=self.waitlist.last_of_priority,
+        ).signup
+
+        self.assertEqual(list(self.waitlist.signups), [top, below_top, first, second])
+        self.assertEqual(self.waitlist.position_of(second), 4)
+        self._assert_follows_rules()
+
+        # Changing the manual order moves the entry.
+        wl_signup = second.waitlistsignup
+        wl_signup.manual_order = self.waitlist.first_of_priority
+        wl_signup.save()
+        self.assertEqual(list(self.waitlist.signups), [second, top, below_top, first])
+        self._assert_follows_rules()
+
+    def test_renumbered_when_out_of_room(self):
+        (top,) = self._waitlist(1, manual_order=100)
+        (bottom,) = self._waitlist(1)
+        # Each entry goes just above `bottom`, halving the remaining gap each time
+        middle = self._waitlist(15, manual_order=None)
+        for signup in middle:
+            wl_signup = signup.waitlistsignup
+            wl_signup.manual_order = self.waitlist.last_of_priority
+            wl_signup.save()
+
+        self.assertEqual(list(self.waitlist.signups), [top, *middle, bottom])
+        self._assert_follows_rules()
+
+    def test_reindex(self):
+        signups = self._waitlist(3)
+        models.WaitListSignup.objects.filter(signup=signups[2]).update(manual_order=5)
+        models.WaitListSignup.objects.filter(waitlist=self.waitlist).reindex()
+
+        self.assertEqual(
+            list(self.waitlist.signups), [signups[2], signups[0], signups[1]]
+        )
+        self.assertEqual(
+            list(self.waitlist.waitlistsignup_set.values_list('position', flat=True)),
+            [1024, 2048, 3072],
+        )
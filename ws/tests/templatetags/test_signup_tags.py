@@ -214,6 +214,20 @@ class SignupForTripTests(TestCase):
             )
         )
 
+    def test_waitlisted(self):
+        """Waitlisted participants are shown their place on the waitlist."""
+        trip = self._make_trip(maximum_participants=1)
+        factories.SignUpFactory.create(trip=trip)
+        factories.SignUpFactory.create(trip=trip)
+        signup = factories.SignUpFactory.create(trip=trip)
+        self.assertFalse(signup.on_trip)
+
+        soup = self._render(signup.participant, trip)
+        self.assertEqual(
+            soup.find(class_='alert-info').get_text(' ', strip=True),
+            "You're #2 on the waitlist.",
+        )
+
     def test_signed_up_for_lottery_trip_but_may_drop(self):
         """Participants can always drop off of lottery trips."""
         trip = self._make_trip(algorithm='lottery', let_participants_drop=False)
@@ -1,49 +1,119 @@
 from typing import ClassVar
 from unittest import mock
 
+from django.contrib.auth import get_user
 from django.contrib.auth.models import AnonymousUser
 from django.test import RequestFactory
+from django.utils.functional import SimpleLazyObject
 
-from ws import models
+import ws.utils.perms as perm_utils
+from ws import enums, models
 from ws.messages import security
-from ws.middleware import CustomMessagesMiddleware, ParticipantMiddleware
+from ws.middleware import CustomMessagesMiddleware, UserMiddleware
 from ws.tests import TestCase
 from ws.tests.factories import ParticipantFactory, PasswordQualityFactory, UserFactory
 
 
-class ParticipantMiddlewareTests(TestCase):
+class UserMiddlewareTests(TestCase):
     user: ClassVar[models.User]
 
     def setUp(self):
         def get_response(request):
             return None
 
-        self.pm = ParticipantMiddleware(get_response)
-        self.request = RequestFactory().get('/')
+        self.um = UserMiddleware(get_response)
 
     @classmethod
     def setUpTestData(cls):
         cls.user = UserFactory.create()
 
+    def _request(self, log_in=True):
+        """Return a request, with the session of a (maybe logged-in) client."""
+        if log_in:
+            self.client.force_login(self.user)
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        request.session.items()  # (Sessions load lazily; don't count that query)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        return request
+
     def test_anonymous_user(self):
         """When the user is anonymous, request.participant is None."""
-        self.request.user = AnonymousUser()
-        self.pm(self.request)
-        self.assertEqual(self.request.participant, None)
+        request = self._request(log_in=False)
+        with self.assertNumQueries(0):
+            self.um(request)
+        self.assertEqual(request.participant, None)
+        self.assertFalse(request.user.is_authenticated)
+        self.assertFalse(request.permissions.is_authenticated)
 
     def test_authenticated_user(self):
         """Participant is None when the user hasn't yet created one."""
-        self.request.user = self.user
-        self.pm(self.request)
-        self.assertEqual(self.request.participant, None)
+        request = self._request()
+        with self.assertNumQueries(2):  # (User & participant joined, then groups)
+            self.um(request)
+        self.assertEqual(request.user, self.user)
+        self.assertEqual(request.participant, None)
 
     def test_user_with_participant(self):
         """When the user has created a participant, it's injected into the request."""
-        self.request.user = self.user
         participant = ParticipantFactory.create(user_id=self.user.pk)
-
-        self.pm(self.request)
-        self.assertEqual(self.request.participant, participant)
+        PasswordQualityFactory.create(participant=participant, is_insecure=True)
+        perm_utils.make_chair(self.user, enums.Activity.CLIMBING)
+
+        # User, participant, membership & password quality (joined), then groups
+        request = self._request()
+        with self.assertNumQueries(2):
+            self.um(request)
+            self.assertEqual(request.user, self.user)
+            self.assertEqual(request.participant, participant)
+            self.assertEqual(request.participant.membership, participant.membership)
+            self.assertTrue(request.participant.passwordquality.is_insecure)
+            self.assertTrue(request.permissions.is_chair(enums.Activity.CLIMBING))
+
+    def test_allauth_backend(self):
+        """Users who logged in with allauth (e.g. by email) are loaded the same way."""
+        ParticipantFactory.create(user_id=self.user.pk)
+        self.client.force_login(
+            self.user, backend='ws.auth_backends.AuthenticationBackend'
+        )
+        request = self._request(log_in=False)
+        with self.assertNumQueries(2):
+            self.um(request)
+            self.assertEqual(request.participant.user, self.user)
+
+    def test_changes_apply_to_next_request(self):
+        """Nothing is cached, so changes made elsewhere (e.g. another process) apply."""
+        participant = ParticipantFactory.create(user_id=self.user.pk, name='Old Name')
+        perm_utils.make_chair(self.user, enums.Activity.HIKING)
+        request = self._request()
+        self.um(request)
+        self.assertTrue(request.permissions.is_chair(enums.Activity.HIKING))
+
+        # Bypass signals, as would happen with changes made in another process
+        models.Participant.objects.filter(pk=participant.pk).update(name='New Name')
+        models.User.groups.through.objects.filter(user_id=self.user.pk).delete()
+        request = self._request(log_in=False)
+        self.um(request)
+        self.assertEqual(request.participant.name, 'New Name')
+        self.assertFalse(request.permissions.is_chair(enums.Activity.HIKING))
+
+        models.User.objects.filter(pk=self.user.pk).update(is_active=False)
+        request = self._request(log_in=False)
+        self.um(request)
+        self.assertFalse(request.user.is_authenticated)
+        self.assertEqual(request.participant, None)
+
+    def test_password_change_ends_session(self):
+        """Like Django, we invalidate sessions made before the password changed."""
+        request = self._request()
+        self.um(request)
+
+        self.user.set_password('new password')
+        self.user.save()
+        request = self._request(log_in=False)  # (Same session, new request)
+        self.um(request)
+        self.assertFalse(request.user.is_authenticated)
+        self.assertEqual(request.participant, None)
 
 
 class CustomMessagesMiddlewareTests(TestCase):
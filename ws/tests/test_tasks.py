@@ -1,4 +1,6 @@
+import tempfile
 from datetime import date, datetime
+from pathlib import Path
 from unittest import mock
 from unittest.mock import patch
 
@@ -9,9 +11,11 @@ from django.test import SimpleTestCase
 from freezegun import freeze_time
 from mitoc_const import affiliations
 
-from ws import models, tasks
+from ws import enums, models, settings, tasks
 from ws.email import renew
+from ws.lottery.run import preload_single_trip_participants
 from ws.tests import TestCase, factories
+from ws.utils import dates as date_utils
 from ws.utils import member_sheets
 
 
@@ -165,6 +169,83 @@ class TaskTests(TestCase):
         mock_cache.add.assert_called_with(expected_lock_id, 'true', 600)
 
 
+@freeze_time("Fri, 25 Jan 2019 12:00:00 EST")
+class RunClosedLotteriesTest(TestCase):
+    @staticmethod
+    def _lottery_trip(**kwargs):
+        return factories.TripFactory.create(
+            algorithm='lottery', program=enums.Program.CLIMBING.value, **kwargs
+        )
+
+    def test_no_closed_lotteries(self):
+        self._lottery_trip(
+            signups_close_at=date_utils.localize(datetime(2019, 1, 26, 9))
+        )
+        with patch('ws.tasks.group') as group:
+            tasks.run_closed_lotteries()
+        group.assert_not_called()
+
+    def test_dispatches_closed_lotteries(self):
+        closed_at = date_utils.localize(datetime(2019, 1, 25, 9))
+        closed = self._lottery_trip(signups_close_at=closed_at)
+        no_signups = self._lottery_trip(signups_close_at=closed_at)
+
+        # None of these trips should have their lottery run.
+        self._lottery_trip(  # Signups still open
+            signups_close_at=date_utils.localize(datetime(2019, 1, 26, 9))
+        )
+        factories.TripFactory.create(algorithm='fcfs', signups_close_at=closed_at)
+        factories.TripFactory.create(
+            algorithm='lottery',
+            program=enums.Program.WINTER_SCHOOL.value,
+            signups_close_at=closed_at,
+        )
+
+        signup = factories.SignUpFactory.create(trip=closed)
+
+        with patch('ws.tasks.group') as group:
+            tasks.run_closed_lotteries()
+
+        group.assert_called_once()
+        (signatures,) = group.call_args.args
+        by_trip = {sig.args[0]: sig.args[2] for sig in signatures}
+        self.assertEqual(set(by_trip), {closed.pk, no_signups.pk})
+        self.assertEqual(by_trip[no_signups.pk], [])
+        self.assertEqual(
+            [par['pk'] for par in by_trip[closed.pk]], [signup.participant.pk]
+        )
+
+    def test_run_with_preloaded_participants(self):
+        """Each lottery run reports on its timing."""
+        trip = self._lottery_trip(
+            signups_close_at=date_utils.localize(datetime(2019, 1, 25, 9))
+        )
+        signup = factories.SignUpFactory.create(trip=trip)
+        participants = preload_single_trip_participants([trip.pk])[trip.pk]
+
+        result = tasks.run_lottery(trip.pk, None, participants)
+
+        self.assertEqual(result['trip_id'], trip.pk)
+        self.assertEqual(result['num_participants'], 1)
+        signup.refresh_from_db()
+        self.assertTrue(signup.on_trip)
+        trip.refresh_from_db()
+        self.assertEqual(trip.algorithm, 'fcfs')
+
+    def test_structured_log_enabled(self):
+        trip = self._lottery_trip(
+            signups_close_at=date_utils.localize(datetime(2019, 1, 25, 9))
+        )
+        factories.SignUpFactory.create(trip=trip)
+        with tempfile.TemporaryDirectory() as log_dir:
+            with patch.object(settings, 'WS_LOTTERY_LOG_DIR', log_dir):
+                with patch.object(settings, 'WS_LOTTERY_STRUCTURED_LOG', True):
+                    tasks.run_lottery(trip.pk)
+            (jsonl,) = Path(log_dir).iterdir()
+        self.assertTrue(jsonl.name.startswith(f'trip_{trip.pk}_'))
+        self.assertEqual(jsonl.suffix, '.jsonl')
+
+
 class DiscountsWithoutGaKeyTest(TestCase):
     """Test our handling of discounts which opt out of the Google Sheets flow."""
 
@@ -358,3 +439,36 @@ class RemindIndividualParticipantsToRenewTest(TestCase):
 
         # We don't record a successful reminder being sent.
         self.assertFalse(models.MembershipReminder.objects.exists())
+
+
+class UpdateRentalsTest(TestCase):
+    def test_update_participant_rentals(self):
+        par = factories.ParticipantFactory.create()
+        with mock.patch.object(tasks.geardb, 'cache_rentals') as cache_rentals:
+            tasks.update_participant_rentals(par.pk)
+        cache_rentals.assert_called_once_with([par])
+
+    def test_update_trip_rentals(self):
+        trip = factories.TripFactory.create()
+        leader = factories.ParticipantFactory.create()
+        trip.leaders.add(leader)
+        signup = factories.SignUpFactory.create(trip=trip, on_trip=True)
+        factories.SignUpFactory.create(trip=trip, on_trip=False)
+
+        with mock.patch.object(tasks.geardb, 'cache_rentals') as cache_rentals:
+            tasks.update_trip_rentals(trip.pk)
+        cache_rentals.assert_called_once_with([leader, signup.participant])
+
+
+class RefreshAllMembershipCacheTest(SimpleTestCase):
+    def test_refreshes_in_bulk(self):
+        with patch.object(tasks.membership, 'refresh_all_membership_cache') as refresh:
+            tasks.refresh_all_membership_cache()
+        refresh.assert_called_once_with()
+
+
+class UpdateMembershipStatsTest(SimpleTestCase):
+    def test_stats_cached(self):
+        with patch.object(tasks.geardb, 'cache_membership_stats') as cache_stats:
+            tasks.update_membership_stats()
+        cache_stats.assert_called_once_with()
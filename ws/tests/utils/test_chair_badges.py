@@ -0,0 +1,79 @@
+from datetime import date
+from unittest.mock import patch
+
+from freezegun import freeze_time
+
+from ws import enums
+from ws.tests import TestCase, factories
+from ws.utils import chair_badges
+
+
+@freeze_time("2019-01-15 12:00:00 EST")
+class UnapprovedTripCountTest(TestCase):
+    def test_cached_until_trips_change(self):
+        trip = factories.TripFactory.create(
+            trip_date=date(2019, 1, 19), activity='winter_school', chair_approved=False
+        )
+        # Past trips don't need approval
+        factories.TripFactory.create(
+            trip_date=date(2019, 1, 12), activity='winter_school', chair_approved=False
+        )
+        activity = enums.Activity.WINTER_SCHOOL
+
+        self.assertEqual(chair_badges.unapproved_trip_count(activity), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(chair_badges.unapproved_trip_count(activity), 1)
+
+        trip.chair_approved = True
+        trip.save()
+        self.assertEqual(chair_badges.unapproved_trip_count(activity), 0)
+
+        factories.TripFactory.create(
+            trip_date=date(2019, 1, 26), activity='winter_school', chair_approved=False
+        )
+        self.assertEqual(chair_badges.unapproved_trip_count(activity), 1)
+
+    def test_other_activities_unaffected(self):
+        factories.TripFactory.create(
+            trip_date=date(2019, 1, 19), activity='climbing', chair_approved=False
+        )
+        self.assertEqual(
+            chair_badges.unapproved_trip_count(enums.Activity.WINTER_SCHOOL), 0
+        )
+        factories.TripFactory.create(
+            trip_date=date(2019, 1, 19), activity='hiking', chair_approved=False
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                chair_badges.unapproved_trip_count(enums.Activity.WINTER_SCHOOL), 0
+            )
+
+
+class PendingApplicationsCountTest(TestCase):
+    def test_cached_until_applications_or_ratings_change(self):
+        chair = factories.ParticipantFactory.create()
+        activity = enums.Activity.CLIMBING
+
+        self.assertEqual(chair_badges.pending_applications_count(chair, activity), 0)
+        with self.assertNumQueries(0):
+            chair_badges.pending_applications_count(chair, activity)
+
+        with freeze_time("2019-01-15 12:00:00 EST"):
+            application = factories.ClimbingLeaderApplicationFactory.create()
+        self.assertEqual(chair_badges.pending_applications_count(chair, activity), 1)
+
+        with freeze_time("2019-01-16 12:00:00 EST"):
+            factories.LeaderRatingFactory.create(
+                participant=application.participant, activity=activity.value
+            )
+        self.assertEqual(chair_badges.pending_applications_count(chair, activity), 0)
+
+    def test_other_models_ignored(self):
+        with patch.object(chair_badges, 'invalidate') as invalidate:
+            participant = factories.ParticipantFactory.create()
+            participant.delete()
+        invalidate.assert_not_called()
+
+        with patch.object(chair_badges, 'invalidate') as invalidate:
+            factories.HikingLeaderApplicationFactory.create()
+        invalidate.assert_called_once_with(enums.Activity.HIKING.value)
@@ -1,4 +1,5 @@
 import unittest
+from datetime import date, datetime, timezone
 from unittest import mock
 
 import jwt
@@ -7,6 +8,8 @@ from django.contrib.auth.models import AnonymousUser
 from django.test import SimpleTestCase
 from freezegun import freeze_time
 
+from ws import models
+from ws.tests import TestCase, factories
 from ws.utils import geardb
 
 
@@ -50,55 +53,86 @@ class JwtTest(unittest.TestCase):
 
 
 class ApiTest(SimpleTestCase):
-    def test_bad_status_code(self):
-        fake_response = mock.Mock(spec=requests.Response)
-        fake_response.status_code = 404
-
-        with mock.patch.object(requests, 'get') as fake_get:
-            fake_get.return_value = fake_response
-            with self.assertRaises(geardb.APIError):
-                geardb.query_api('/credentials', user='admin')
-
-    @mock.patch.object(geardb, 'settings')
-    def test_query_api(self, settings):
-        settings.GEARDB_SECRET_KEY = 'sooper.secret'
+    def setUp(self):
+        super().setUp()
+        self.client = geardb.GearApiClient()
+        patched = mock.patch.object(self.client.session, 'get')
+        self.fake_get = patched.start()
+        self.addCleanup(patched.stop)
 
+    @staticmethod
+    def _response(results, next_url=None, status_code=200):
         fake_response = mock.Mock(spec=requests.Response)
-        fake_response.status_code = 200
+        fake_response.status_code = status_code
         fake_response.json.return_value = {
-            "count": 1,
-            "next": None,
+            "count": len(results),
+            "next": next_url,
             "previous": None,
-            "results": [{'user': 'admin', 'password': 'plaintext.auth.rules'}],
+            "results": results,
         }
+        return fake_response
+
+    def test_bad_status_code(self):
+        self.fake_get.return_value = self._response([], status_code=404)
+        with self.assertRaises(geardb.APIError):
+            list(self.client.query('/credentials', user='admin'))
 
-        with mock.patch.object(requests, 'get') as fake_get:
-            fake_get.return_value = fake_response
-            results = geardb.query_api('/credentials', user='admin')
+    def test_connection_error(self):
+        self.fake_get.side_effect = requests.ConnectionError
+        with self.assertRaises(geardb.APIError):
+            list(self.client.query('/credentials', user='admin'))
+
+    def test_retries_transient_failures(self):
+        adapter = self.client.session.get_adapter('https://mitoc-gear.mit.edu/')
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+
+    @mock.patch.object(geardb, 'settings')
+    def test_query(self, settings):
+        settings.GEARDB_SECRET_KEY = 'sooper.secret'
+        self.fake_get.return_value = self._response(
+            [{'user': 'admin', 'password': 'plaintext.auth.rules'}]
+        )
+
+        with freeze_time("2020-01-15 14:45:00 EST"):
+            results = list(self.client.query('/credentials', user='admin'))
+            token = geardb.gear_bearer_jwt(user='admin')
         self.assertEqual(
             results, [{'user': 'admin', 'password': 'plaintext.auth.rules'}]
         )
+        self.fake_get.assert_called_once_with(
+            'https://mitoc-gear.mit.edu/credentials',
+            headers={'Authorization': token},
+            params={'user': 'admin'},
+            timeout=geardb.GearApiClient.TIMEOUT,
+        )
 
-    def test_pagination_not_handled(self):
-        """At present, we don't handle any pagination of results."""
-        fake_response = mock.Mock(spec=requests.Response)
-        fake_response.status_code = 200
-        fake_response.json.return_value = {
-            "count": 10,
-            "next": 'https://mitoc-gear.mit.edu/api-auth/v1/credentials?page=2',
-            "previous": None,
-            "results": [{'user': 'admin', 'password': 'plaintext.auth.rules'}],
-        }
+    def test_pagination(self):
+        """Pages are requested one at a time, as results are consumed."""
+        next_url = 'https://mitoc-gear.mit.edu/api-auth/v1/credentials?page=2'
+        self.fake_get.side_effect = [
+            self._response([{'user': 'admin'}], next_url=next_url),
+            self._response([{'user': 'root'}]),
+        ]
+
+        results = self.client.query('/credentials', user='admin')
+        self.assertEqual(next(results), {'user': 'admin'})
+        self.assertEqual(self.fake_get.call_count, 1)
+
+        self.assertEqual(list(results), [{'user': 'root'}])
+        self.assertEqual(self.fake_get.call_count, 2)
+        self.assertEqual(self.fake_get.call_args.args, (next_url,))
+        self.assertIsNone(self.fake_get.call_args.kwargs['params'])
+
+    def test_batching(self):
+        emails = [f'{i}@example.com' for i in range(250)]
+        self.fake_get.side_effect = [self._response([{'batch': i}]) for i in range(3)]
 
-        with mock.patch.object(requests, 'get') as fake_get:
-            fake_get.return_value = fake_response
-            with mock.patch.object(geardb.logger, 'error') as log_error:
-                results = geardb.query_api('/credentials', user='admin')
+        results = list(self.client.query_batched('rentals/', 'email', emails))
+        self.assertEqual(results, [{'batch': 0}, {'batch': 1}, {'batch': 2}])
         self.assertEqual(
-            results, [{'user': 'admin', 'password': 'plaintext.auth.rules'}]
-        )
-        log_error.assert_called_once_with(
-            "Results are paginated; this is not expected or handled."
+            [call.kwargs['params']['email'] for call in self.fake_get.call_args_list],
+            [emails[:100], emails[100:200], emails[200:]],
         )
 
 
@@ -114,3 +148,327 @@ class NoUserTests(SimpleTestCase):
         """Test users with no email addresses."""
         self.assertEqual(geardb.verified_emails(AnonymousUser()), [])
         self.assertEqual(geardb.verified_emails(None), [])
+
+
+@freeze_time("2020-01-20 12:00:00 EST")
+class CacheRentalsTest(TestCase):
+    @staticmethod
+    def _rental(email, checkedout, gear_id='BK-19-04', name='Backpack'):
+        return geardb.Rental(
+            email=email,
+            id=gear_id,
+            name=name,
+            cost=1.5,
+            checkedout=checkedout,
+            overdue=False,
+        )
+
+    def test_no_participants(self):
+        with mock.patch.object(geardb, 'outstanding_items') as outstanding_items:
+            geardb.cache_rentals([])
+        outstanding_items.assert_not_called()
+        self.assertFalse(models.CachedRentals.objects.exists())
+
+    def test_caches_under_verified_emails(self):
+        renter = factories.ParticipantFactory.create()
+        factories.EmailFactory.create(
+            user_id=renter.user_id, email='renter@example.com', primary=False
+        )
+        factories.EmailFactory.create(
+            user_id=renter.user_id,
+            email='unverified@example.com',
+            verified=False,
+            primary=False,
+        )
+        non_renter = factories.ParticipantFactory.create()
+
+        with mock.patch.object(geardb, 'outstanding_items') as outstanding_items:
+            outstanding_items.return_value = [
+                self._rental('renter@example.com', date(2020, 1, 1)),
+            ]
+            geardb.cache_rentals([renter, non_renter])
+        outstanding_items.assert_called_once()
+        (emails,) = outstanding_items.call_args.args
+        self.assertCountEqual(
+            emails, [renter.email, 'renter@example.com', non_renter.email]
+        )
+
+        self.assertEqual(
+            models.CachedRentals.objects.get(participant=renter).rentals,
+            [
+                {
+                    'email': 'renter@example.com',
+                    'id': 'BK-19-04',
+                    'name': 'Backpack',
+                    'cost': 1.5,
+                    'checkedout': '2020-01-01',
+                }
+            ],
+        )
+        self.assertEqual(
+            models.CachedRentals.objects.get(participant=non_renter).rentals, []
+        )
+
+    def test_replaces_cached_rentals(self):
+        par = factories.ParticipantFactory.create()
+        models.CachedRentals.objects.create(
+            participant=par, rentals=[{'id': 'returned'}]
+        )
+        long_ago = datetime(2019, 1, 1, tzinfo=timezone.utc)
+        models.CachedRentals.objects.filter(participant=par).update(
+            last_cached=long_ago
+        )
+        with mock.patch.object(geardb, 'outstanding_items') as outstanding_items:
+            outstanding_items.return_value = []
+            geardb.cache_rentals([par])
+        cached = models.CachedRentals.objects.get(participant=par)
+        self.assertEqual(cached.rentals, [])
+        self.assertGreater(cached.last_cached, long_ago)
+
+    def test_cached_at_the_same_time(self):
+        """Another task may cache the same participant first; that's no error."""
+        par = factories.ParticipantFactory.create()
+        bulk_update = models.CachedRentals.objects.bulk_update
+
+        def cache_elsewhere_first(*args, **kwargs):
+            models.CachedRentals.objects.create(participant=par, rentals=[])
+            return bulk_update(*args, **kwargs)
+
+        with mock.patch.object(geardb, 'outstanding_items') as outstanding_items:
+            outstanding_items.return_value = []
+            with mock.patch.object(
+                models.CachedRentals.objects,
+                'bulk_update',
+                side_effect=cache_elsewhere_first,
+            ):
+                geardb.cache_rentals([par])
+        self.assertEqual(models.CachedRentals.objects.get(participant=par).rentals, [])
+
+    def test_api_failure_keeps_cache(self):
+        par = factories.ParticipantFactory.create()
+        models.CachedRentals.objects.create(participant=par, rentals=[])
+        with mock.patch.object(
+            geardb.api_client, 'query_batched', side_effect=geardb.APIError
+        ):
+            with self.assertRaises(geardb.APIError):
+                geardb.cache_rentals([par])
+        self.assertTrue(models.CachedRentals.objects.filter(participant=par).exists())
+
+
+@freeze_time("2020-01-20 12:00:00 EST")
+class CachedTripRentalsTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = factories.TripFactory.create(trip_date=date(2020, 1, 25))
+        self.leader = factories.ParticipantFactory.create(name="Lead")
+        self.trip.leaders.add(self.leader)
+        self.participant = factories.SignUpFactory.create(
+            trip=self.trip, on_trip=True
+        ).participant
+
+    @staticmethod
+    def _cache(par, *checkout_dates):
+        return models.CachedRentals.objects.create(
+            participant=par,
+            rentals=[
+                {
+                    'email': par.email,
+                    'id': f'BK-{i}',
+                    'name': 'Backpack',
+                    'cost': 1.5,
+                    'checkedout': checkedout.isoformat(),
+                }
+                for i, checkedout in enumerate(checkout_dates)
+            ],
+        )
+
+    def test_nothing_cached(self):
+        with self.assertNumQueries(3):
+            rentals_by_par, stale = geardb.cached_trip_rentals(self.trip)
+        self.assertEqual(rentals_by_par, [])
+        self.assertTrue(stale)
+
+    def test_leaders_first(self):
+        self._cache(self.participant, date(2020, 1, 2))
+        self._cache(self.leader, date(2019, 10, 1), date(2020, 1, 26))
+
+        rentals_by_par, stale = geardb.cached_trip_rentals(self.trip)
+        self.assertFalse(stale)
+        self.assertEqual(
+            rentals_by_par,
+            [
+                (
+                    self.leader,
+                    # The item checked out after the trip is omitted
+                    [
+                        geardb.Rental(
+                            email=self.leader.email,
+                            id='BK-0',
+                            name='Backpack',
+                            cost=1.5,
+                            checkedout=date(2019, 10, 1),
+                            overdue=True,
+                        )
+                    ],
+                ),
+                (
+                    self.participant,
+                    [
+                        geardb.Rental(
+                            email=self.participant.email,
+                            id='BK-0',
+                            name='Backpack',
+                            cost=1.5,
+                            checkedout=date(2020, 1, 2),
+                            overdue=False,
+                        )
+                    ],
+                ),
+            ],
+        )
+
+    def test_stale(self):
+        self._cache(self.leader)
+        with freeze_time("2020-01-20 10:00:00 EST"):
+            self._cache(self.participant)
+        self.assertEqual(geardb.cached_trip_rentals(self.trip), ([], True))
+
+
+class MembershipCacheTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.membership_cache = geardb.MembershipCache()
+        self.active = {
+            'membership': {
+                'expires': date(2020, 3, 18),
+                'active': True,
+                'email': 'tim@mit.edu',
+            },
+            'waiver': {'expires': date(2020, 3, 9), 'active': True},
+            'status': 'Active',
+        }
+
+    def _matching_memberships(self, emails):
+        with mock.patch.object(geardb, 'matching_memberships') as matches:
+            matches.return_value = {'tim@mit.edu': self.active}
+            results = self.membership_cache.matching_memberships(emails)
+        return results, matches
+
+    def test_cached_by_email(self):
+        results, matches = self._matching_memberships(['tim@mit.edu', 'no@mit.edu'])
+        self.assertEqual(results, {'tim@mit.edu': self.active})
+        matches.assert_called_once_with(['tim@mit.edu', 'no@mit.edu'])
+        self.assertEqual(
+            (self.membership_cache.hits, self.membership_cache.misses), (0, 2)
+        )
+
+        # Both the membership & the absence of a membership are cached
+        results, matches = self._matching_memberships(['TIM@mit.edu', 'no@mit.edu'])
+        self.assertEqual(results, {'TIM@mit.edu': self.active})
+        matches.assert_not_called()
+        self.assertEqual(
+            (self.membership_cache.hits, self.membership_cache.misses), (2, 2)
+        )
+
+    def test_only_misses_queried(self):
+        self._matching_memberships(['tim@mit.edu'])
+        results, matches = self._matching_memberships(['tim@mit.edu', 'new@mit.edu'])
+        self.assertEqual(results, {'tim@mit.edu': self.active})
+        matches.assert_called_once_with(['new@mit.edu'])
+
+    def test_updated_since_cached(self):
+        """Memberships updated since being cached (e.g. in another process) are stale."""
+        with freeze_time("2020-01-20 12:00:00 EST"):
+            self._matching_memberships(['tim@mit.edu', 'no@mit.edu'])
+
+        with mock.patch.object(geardb, 'matching_memberships') as matches:
+            matches.return_value = {}
+            self.membership_cache.matching_memberships(
+                ['tim@mit.edu', 'no@mit.edu'],
+                updated_at={
+                    'tim@mit.edu': datetime(2020, 1, 20, 17, 1, tzinfo=timezone.utc),
+                    'no@mit.edu': datetime(2020, 1, 20, 16, 59, tzinfo=timezone.utc),
+                },
+            )
+        matches.assert_called_once_with(['tim@mit.edu'])
+
+    def test_invalidate(self):
+        self._matching_memberships(['tim@mit.edu', 'no@mit.edu'])
+        self.membership_cache.invalidate(['Tim@mit.edu'])
+        _, matches = self._matching_memberships(['tim@mit.edu', 'no@mit.edu'])
+        matches.assert_called_once_with(['tim@mit.edu'])
+
+
+class TripsInformationTest(TestCase):
+    def test_counts_by_email(self):
+        par = factories.ParticipantFactory.create(email='tim@mit.edu')
+        factories.EmailFactory.create(
+            user=par.user, email='Tim@Example.com', primary=False
+        )
+        factories.EmailFactory.create(
+            user=par.user, email='unverified@example.com', verified=False, primary=False
+        )
+        par.discounts.add(factories.DiscountFactory.create())
+
+        factories.SignUpFactory.create(participant=par, on_trip=True)
+        factories.SignUpFactory.create(participant=par, on_trip=True)
+        factories.SignUpFactory.create(participant=par, on_trip=False)
+        factories.TripFactory.create().leaders.add(par)
+
+        # Users without a participant are omitted; participants can have no activity
+        factories.UserFactory.create(email='just-a-user@example.com')
+        factories.ParticipantFactory.create(email='new@mit.edu')
+
+        expected = {'num_trips_attended': 2, 'num_trips_led': 1, 'num_discounts': 1}
+        with self.assertNumQueries(1):
+            info = dict(geardb.trips_information())
+        self.assertEqual(info['tim@mit.edu'], expected)
+        self.assertEqual(info['tim@example.com'], expected)
+        self.assertNotIn('unverified@example.com', info)
+        self.assertNotIn('just-a-user@example.com', info)
+        self.assertEqual(
+            info['new@mit.edu'],
+            {'num_trips_attended': 0, 'num_trips_led': 0, 'num_discounts': 0},
+        )
+
+
+class MembershipInformationTest(TestCase):
+    def test_trips_info_under_any_email(self):
+        factories.ParticipantFactory.create(email='alternate@example.com')
+        factories.SignUpFactory.create(participant__email='main@mit.edu', on_trip=True)
+        active_members = [
+            (
+                1,
+                {'last_known_affiliation': 'MIT affiliate', 'num_rentals': 3},
+                ['main@example.com', 'alternate@example.com'],
+            ),
+            (
+                2,
+                {'last_known_affiliation': 'MIT undergrad', 'num_rentals': 0},
+                ['main@mit.edu'],
+            ),
+            (3, {'last_known_affiliation': 'Unknown', 'num_rentals': 1}, []),
+        ]
+        with mock.patch.object(geardb, '_stats_only_all_active_members') as members:
+            members.return_value = iter(active_members)
+            stats = geardb.cache_membership_stats()
+
+        expected = [
+            {
+                'last_known_affiliation': 'MIT affiliate',
+                'num_rentals': 3,
+                'num_trips_attended': 0,
+                'num_trips_led': 0,
+                'num_discounts': 0,
+            },
+            {
+                'last_known_affiliation': 'MIT undergrad',
+                'num_rentals': 0,
+                'num_trips_attended': 1,
+                'num_trips_led': 0,
+                'num_discounts': 0,
+            },
+            {'last_known_affiliation': 'Unknown', 'num_rentals': 1},
+        ]
+        self.assertEqual(stats.members, expected)
+        self.assertEqual(models.MembershipStats.load().members, expected)
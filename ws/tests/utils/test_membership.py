@@ -72,6 +72,21 @@ class UpdateMembershipCacheTest(TestCase):
         self.assertIsNone(participant.membership.membership_expires)
         self.assertIsNone(participant.membership.waiver_expires)
 
+
+@freeze_time("2019-03-19 14:30:00 EST")
+class RefreshAllMembershipCacheTest(TestCase):
+    @staticmethod
+    def _membership(email, membership_expires, waiver_expires):
+        return {
+            'membership': {
+                'expires': membership_expires,
+                'active': bool(membership_expires),
+                'email': email,
+            },
+            'waiver': {'expires': waiver_expires, 'active': bool(waiver_expires)},
+            'status': 'Active',
+        }
+
     def test_refresh_targets(self):
         """We refresh any participant without a membership or with a stale cache."""
         # Participant has no cached membership!
@@ -92,46 +107,85 @@ class UpdateMembershipCacheTest(TestCase):
         )
         factories.ParticipantFactory.create(membership=cached_now)
 
-        with mock.patch.object(membership, 'update_membership_cache') as update_cache:
-            membership.refresh_all_membership_cache()
+        with mock.patch.object(geardb, 'matching_memberships') as matches:
+            matches.return_value = {}
+            self.assertEqual(membership.refresh_all_membership_cache(), 2)
 
-        update_cache.assert_has_calls(
-            [mock.call(stale_participant), mock.call(no_membership_participant)],
-            any_order=True,
+        # Only the stale participants were looked up (recent participant was omitted!)
+        matches.assert_called_once()
+        self.assertCountEqual(
+            matches.call_args.args[0],
+            [stale_participant.email, no_membership_participant.email],
         )
-        self.assertEqual(update_cache.call_count, 2)  # recent participant was omitted!
 
+        # Nothing was found, but both were still marked as freshly cached
+        no_membership_participant.refresh_from_db()
+        new_membership = no_membership_participant.membership
+        self.assertIsNone(new_membership.membership_expires)
+        self.assertIsNone(new_membership.waiver_expires)
 
-@freeze_time("2019-03-19 14:30:00 EST")
-class RefreshAllMembershipCacheTest(TestCase):
-    def test_refresh_targets(self):
-        """We refresh any participant without a membership or with a stale cache."""
-        # Participant has no cached membership!
-        no_membership_participant = factories.ParticipantFactory.create(membership=None)
-
-        # Participant was cached a bit over a week ago
-        with freeze_time("2019-03-12 11:31:22 EST"):
-            active_but_cached_last_week = factories.MembershipFactory.create(
-                membership_expires=date(2020, 3, 18), waiver_expires=date(2020, 3, 18)
-            )
-        stale_participant = factories.ParticipantFactory.create(
-            membership=active_but_cached_last_week
+        active_but_cached_last_week.refresh_from_db()
+        self.assertEqual(
+            active_but_cached_last_week.last_cached, new_membership.last_cached
+        )
+        # Dates we knew of were not cleared
+        self.assertEqual(
+            active_but_cached_last_week.membership_expires, date(2020, 3, 18)
         )
 
-        # Participant has no waiver & an expired membership, but that's recently true!
-        cached_now = factories.MembershipFactory.create(
-            membership_expires=None, waiver_expires=date(2019, 1, 1)
+    def test_most_recent_membership_under_any_email(self):
+        user = factories.UserFactory.create(email='primary@example.com')
+        factories.EmailFactory.create(
+            user=user, email='secondary@example.com', verified=True, primary=False
         )
-        factories.ParticipantFactory.create(membership=cached_now)
+        participant = factories.ParticipantFactory.create(membership=None, user=user)
 
-        with mock.patch.object(membership, 'update_membership_cache') as update_cache:
+        with mock.patch.object(geardb, 'matching_memberships') as matches:
+            matches.return_value = {
+                'primary@example.com': self._membership(
+                    'primary@example.com', date(2019, 1, 1), date(2020, 1, 1)
+                ),
+                'secondary@example.com': self._membership(
+                    'secondary@example.com', date(2020, 2, 2), None
+                ),
+            }
             membership.refresh_all_membership_cache()
 
-        update_cache.assert_has_calls(
-            [mock.call(stale_participant), mock.call(no_membership_participant)],
-            any_order=True,
-        )
-        self.assertEqual(update_cache.call_count, 2)  # recent participant was omitted!
+        participant.refresh_from_db()
+        self.assertEqual(participant.membership.membership_expires, date(2020, 2, 2))
+        self.assertIsNone(participant.membership.waiver_expires)
+
+    def test_gear_database_queried_in_chunks(self):
+        participants = [
+            factories.ParticipantFactory.create(membership=None) for _ in range(5)
+        ]
+
+        def matching_memberships(emails):
+            return {
+                email: self._membership(email, date(2020, 3, 18), date(2020, 3, 18))
+                for email in emails
+            }
+
+        with mock.patch.object(geardb, 'matching_memberships') as matches:
+            matches.side_effect = matching_memberships
+            membership.refresh_all_membership_cache(chunk_size=2)
+        self.assertEqual([len(c.args[0]) for c in matches.call_args_list], [2, 2, 1])
+
+        for par in participants:
+            par.refresh_from_db()
+            self.assertEqual(par.membership.membership_expires, date(2020, 3, 18))
+
+    def test_writes_in_bulk(self):
+        for _ in range(2):
+            factories.ParticipantFactory.create(membership=None)
+        with freeze_time("2019-03-01 12:00:00 EST"):
+            factories.ParticipantFactory.create()
+
+        with mock.patch.object(geardb, 'matching_memberships') as matches:
+            matches.return_value = {}
+            # Participants & emails, then bulk writes (within a savepoint)
+            with self.assertNumQueries(7):
+                self.assertEqual(membership.refresh_all_membership_cache(), 3)
 
 
 @freeze_time("2018-11-19 12:00:00 EST")
@@ -1,6 +1,7 @@
 from typing import ClassVar
 
 from django.contrib.auth.models import AnonymousUser
+from django.db.models import prefetch_related_objects
 
 from ws import enums, models
 from ws.tests import TestCase, factories
@@ -111,3 +112,34 @@ class SuperUserTestCase(TestCase):
     def test_admin_not_counted_in_list(self):
         """The admin isn't considered in the count of chairs."""
         self.assertFalse(perm_utils.activity_chairs(enums.Activity.CLIMBING))
+
+
+class PermissionContextTests(TestCase):
+    def test_reused_while_groups_prefetched(self):
+        user = UserFactory.create()
+        perm_utils.make_chair(user, enums.Activity.CLIMBING)
+        user = models.User.objects.prefetch_related('groups').get(pk=user.pk)
+
+        context = perm_utils.permissions(user)
+        with self.assertNumQueries(0):
+            self.assertIs(perm_utils.permissions(user), context)
+            self.assertTrue(perm_utils.is_chair(user, enums.Activity.CLIMBING))
+            self.assertFalse(perm_utils.is_leader(user))
+            self.assertEqual(
+                perm_utils.chair_activities(user), [enums.Activity.CLIMBING]
+            )
+
+        # Prefetching groups again builds a new context from those groups.
+        perm_utils.make_chair(user, enums.Activity.HIKING)
+        user.refresh_from_db()  # (Clears prefetched objects)
+        prefetch_related_objects([user], 'groups')
+        self.assertIsNot(perm_utils.permissions(user), context)
+        self.assertTrue(perm_utils.is_chair(user, enums.Activity.HIKING))
+
+    def test_not_reused_without_prefetch(self):
+        """Without prefetched groups, groups are always queried fresh."""
+        user = UserFactory.create()
+        self.assertIsNot(perm_utils.permissions(user), perm_utils.permissions(user))
+        self.assertFalse(perm_utils.is_chair(user, enums.Activity.CLIMBING))
+        perm_utils.make_chair(user, enums.Activity.CLIMBING)
+        self.assertTrue(perm_utils.is_chair(user, enums.Activity.CLIMBING))
@@ -0,0 +1,99 @@
+from datetime import date, datetime
+
+from django.test import SimpleTestCase
+
+from ws import enums, models
+from ws.utils.dates import localize
+from ws.utils.rating_index import RatingIndex
+
+
+def _rating(activity, rating, created, active=False, participant_id=37):
+    return models.LeaderRating(
+        participant_id=participant_id,
+        activity=activity.value,
+        rating=rating,
+        active=active,
+        time_created=localize(created),
+    )
+
+
+class RatingIndexTest(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        # Given out of order, to show that creation time is what matters.
+        self.index = RatingIndex(
+            [
+                _rating(enums.Activity.CLIMBING, 'Sport', datetime(2019, 6, 1)),
+                _rating(enums.Activity.CLIMBING, 'Trad', datetime(2020, 6, 1), True),
+                _rating(enums.Activity.CLIMBING, 'Co-leader', datetime(2018, 6, 1)),
+                _rating(enums.Activity.HIKING, 'Leader', datetime(2020, 1, 1), True),
+                _rating(
+                    enums.Activity.CLIMBING,
+                    'Other participant',
+                    datetime(2021, 1, 1),
+                    participant_id=42,
+                ),
+            ]
+        )
+
+    def _climbing(self, **kwargs):
+        return self.index.rating_at(37, enums.Activity.CLIMBING.value, **kwargs)
+
+    def test_current_rating(self):
+        self.assertEqual(self._climbing(), 'Trad')
+        self.assertEqual(self._climbing(must_be_active=False), 'Trad')
+        self.assertIsNone(self.index.rating_at(37, enums.Activity.BIKING.value))
+        self.assertIsNone(self.index.rating_at(99, enums.Activity.CLIMBING.value))
+
+    def test_rating_at_time(self):
+        def at(*args):
+            return self._climbing(
+                must_be_active=False, at_time=localize(datetime(*args))
+            )
+
+        self.assertIsNone(at(2018, 1, 1))
+        self.assertEqual(at(2018, 6, 1), 'Co-leader')  # (Inclusive of the time)
+        self.assertEqual(at(2019, 12, 31), 'Sport')
+        self.assertEqual(at(2022, 1, 1), 'Trad')
+
+        # Past ratings are no longer active
+        self.assertIsNone(
+            self._climbing(
+                must_be_active=True, at_time=localize(datetime(2019, 12, 31))
+            )
+        )
+
+    def test_rating_after_time(self):
+        def after(*args):
+            return self._climbing(
+                must_be_active=False, after_time=localize(datetime(*args))
+            )
+
+        self.assertEqual(after(2019, 1, 1), 'Trad')
+        self.assertIsNone(after(2020, 6, 1))  # (Exclusive of the time)
+        self.assertIsNone(
+            self._climbing(
+                must_be_active=False,
+                after_time=localize(datetime(2018, 1, 1)),
+                at_time=localize(datetime(2018, 3, 1)),
+            )
+        )
+
+    def test_name_with_rating(self):
+        leader = models.Participant(pk=37, name='Tim Beaver')
+
+        def name_for(program, trip_date):
+            trip = models.Trip(program=program.value, trip_date=trip_date)
+            return self.index.name_with_rating(leader, trip)
+
+        self.assertEqual(
+            name_for(enums.Program.CLIMBING, date(2019, 6, 2)), 'Tim Beaver (Sport)'
+        )
+        # Ratings given the day of the trip came too late to lead it.
+        self.assertEqual(
+            name_for(enums.Program.CLIMBING, date(2020, 6, 1)), 'Tim Beaver (Sport)'
+        )
+        self.assertEqual(
+            name_for(enums.Program.HIKING, date(2020, 6, 1)), 'Tim Beaver (Leader)'
+        )
+        self.assertEqual(name_for(enums.Program.CIRCUS, date(2020, 6, 1)), 'Tim Beaver')
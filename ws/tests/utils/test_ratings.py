@@ -1,8 +1,11 @@
 from contextlib import contextmanager
+from datetime import date
 from unittest import mock
 
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
 
 import ws.utils.perms as perm_utils
@@ -217,3 +220,35 @@ class DeactivateRatingsTest(TestCase):
         for rating, is_active in expectations:
             rating.refresh_from_db()
             self.assertEqual(rating.active, is_active)
+
+
+class NamesWithRatingTest(TestCase):
+    def test_one_query_for_all_leaders(self):
+        leaders = factories.ParticipantFactory.create_batch(3)
+        with freeze_time("2019-11-01 12:00:00 EST"):
+            for leader in leaders:
+                factories.LeaderRatingFactory.create(
+                    participant=leader,
+                    activity=enums.Activity.CLIMBING.value,
+                    rating='Sport',
+                )
+        trips = [
+            factories.TripFactory.create(
+                program=program.value, trip_date=date(2019, 12, 1)
+            )
+            for program in [enums.Program.CLIMBING, enums.Program.CIRCUS]
+        ]
+        pairs = [(leader, trip) for leader in leaders for trip in trips]
+
+        with CaptureQueriesContext(connection) as queries:
+            names = ratings.names_with_rating([*pairs, (leaders[0], None)])
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            names,
+            [
+                name
+                for leader in leaders
+                for name in [f'{leader.name} (Sport)', leader.name]
+            ]
+            + [leaders[0].name],
+        )
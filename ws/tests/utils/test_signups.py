@@ -1,7 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
 from unittest.mock import PropertyMock, patch
 
 from django.contrib import messages
-from django.test import RequestFactory, SimpleTestCase
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
 from ws import models
 from ws.tests import TestCase, factories
@@ -257,3 +261,195 @@ class UpdateQueuesTest(TestCase):
 
         wl_signup = models.WaitListSignup.objects.get(signup__trip=trip)
         self.assertEqual(wl_signup.signup, two)
+
+    @staticmethod
+    def _resize(trip, maximum_participants):
+        # Update, explicitly avoiding signals, then update queues.
+        models.Trip.objects.filter(pk=trip.pk).update(
+            maximum_participants=maximum_participants
+        )
+        trip.refresh_from_db()
+        with CaptureQueriesContext(connection) as queries:
+            signup_utils.update_queues_if_trip_open(trip)
+        trip.refresh_from_db()
+        return len(queries)
+
+    def test_queries_do_not_grow_with_changes(self):
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=1)
+        signups = factories.SignUpFactory.create_batch(12, trip=trip)
+        prioritized = signups[-1]
+        signup_utils.add_to_waitlist(prioritized, prioritize=True)
+
+        self.assertEqual(self._resize(trip, 3), self._resize(trip, 11))
+        # The prioritized signup came off the waitlist first
+        on_trip = [signups[0], prioritized, *signups[1:10]]
+        self.assertEqual(list(trip.signup_set.filter(on_trip=True)), on_trip)
+        self.assertEqual(list(trip.waitlist.signups), [signups[10]])
+        self.assertEqual(trip.on_trip_count, 11)
+
+        self.assertEqual(self._resize(trip, 9), self._resize(trip, 2))
+        # Those bumped are at the top of the waitlist, in their order on the trip
+        self.assertEqual(list(trip.signup_set.filter(on_trip=True)), on_trip[:2])
+        self.assertEqual(list(trip.waitlist.signups), [*on_trip[2:], signups[10]])
+        self.assertEqual(trip.on_trip_count, 2)
+
+
+class OnTripCountTests(TestCase):
+    def _on_trip_count(self, trip):
+        trip.refresh_from_db()
+        return trip.on_trip_count
+
+    def test_count_follows_signups(self):
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=2)
+        one, two, three = factories.SignUpFactory.create_batch(3, trip=trip)
+        for signup in [one, two, three]:
+            signup.refresh_from_db()
+        self.assertEqual([one.on_trip, two.on_trip, three.on_trip], [True, True, False])
+        self.assertEqual(self._on_trip_count(trip), 2)
+
+        # Saving a stale copy of the trip doesn't clobber the count
+        stale_trip = models.Trip.objects.get(pk=trip.pk)
+        two.delete()  # The waitlisted signup takes the spot
+        self.assertEqual(self._on_trip_count(trip), 2)
+        stale_trip.on_trip_count = 0
+        stale_trip.save()
+        self.assertEqual(self._on_trip_count(trip), 2)
+
+        signup_utils.add_to_waitlist(models.SignUp.objects.get(pk=one.pk))
+        self.assertEqual(self._on_trip_count(trip), 1)
+
+        # Signups loaded without `on_trip` still keep the count accurate
+        deferred = models.SignUp.objects.only('pk', 'trip').get(pk=three.pk)
+        deferred.on_trip = False
+        deferred.save()
+        self.assertEqual(self._on_trip_count(trip), 0)
+
+    def test_stale_copies_of_signups(self):
+        """Changes are counted from the signup's row, not the copy being saved."""
+        trip = factories.TripFactory.create(algorithm='lottery')
+        signup = factories.SignUpFactory.create(trip=trip, on_trip=False)
+        copy_one, copy_two = (models.SignUp.objects.get(pk=signup.pk) for _ in '12')
+
+        for copy in [copy_one, copy_two]:
+            copy.on_trip = True
+            copy.save()
+        self.assertEqual(self._on_trip_count(trip), 1)
+
+        copy_one.on_trip = False
+        copy_one.save()
+        copy_two.delete()
+        self.assertEqual(self._on_trip_count(trip), 0)
+
+    def test_unchanged_slot_takes_no_locks(self):
+        trip = factories.TripFactory.create(algorithm='lottery')
+        signup = factories.SignUpFactory.create(trip=trip, on_trip=True)
+        stale = models.SignUp.objects.get(pk=signup.pk)
+        signup.on_trip = False
+        signup.save()
+
+        stale.notes = "Bringing extra crampons"
+        with CaptureQueriesContext(connection) as context:
+            stale.save()
+        self.assertFalse(
+            any('FOR UPDATE' in q['sql'] for q in context.captured_queries)
+        )
+
+        # The stale copy doesn't clobber the slot given up by the other copy
+        stale.refresh_from_db()
+        self.assertEqual(stale.notes, "Bringing extra crampons")
+        self.assertFalse(stale.on_trip)
+        self.assertEqual(self._on_trip_count(trip), 0)
+
+    def test_signup_moved_between_trips(self):
+        """Both trips are locked before the signup, and each keeps its count."""
+        one, two = factories.TripFactory.create_batch(2, algorithm='lottery')
+        signup = factories.SignUpFactory.create(trip=one, on_trip=True)
+        stale = models.SignUp.objects.get(pk=signup.pk)
+
+        signup.trip = two
+        with CaptureQueriesContext(connection) as context:
+            signup.save()
+        locked = [q['sql'] for q in context.captured_queries if 'FOR UPDATE' in q['sql']]
+        self.assertEqual(len(locked), 2)
+        self.assertIn('FROM "ws_trip"', locked[0])
+        self.assertIn('FROM "ws_signup"', locked[1])
+        self.assertEqual((self._on_trip_count(one), self._on_trip_count(two)), (0, 1))
+
+        # A stale copy (still on the first trip) gives up the slot held on the second
+        stale.on_trip = False
+        stale.save()
+        self.assertEqual((self._on_trip_count(one), self._on_trip_count(two)), (0, 0))
+
+    def test_deleted_trip_not_saved_again(self):
+        """Saves only ever update the trip, leaving `on_trip_count` untouched."""
+        trip = factories.TripFactory.create()
+        copy = models.Trip.objects.get(pk=trip.pk)
+        models.Trip.objects.filter(pk=trip.pk).delete()
+        with self.assertRaises(DatabaseError):
+            copy.save()
+
+    def test_trip_locked_before_signup(self):
+        """Saves lock rows in the same order as queue updates (avoiding deadlocks)."""
+        trip = factories.TripFactory.create(algorithm='lottery')
+        signup = factories.SignUpFactory.create(trip=trip, on_trip=False)
+        signup.on_trip = True
+        with CaptureQueriesContext(connection) as context:
+            signup.save()
+        locked = [q['sql'] for q in context.captured_queries if 'FOR UPDATE' in q['sql']]
+        self.assertEqual(len(locked), 2)
+        self.assertIn('FROM "ws_trip"', locked[0])
+        self.assertIn('FROM "ws_signup"', locked[1])
+
+    def test_open_slots(self):
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=3)
+        factories.SignUpFactory.create(trip=trip)
+        self.assertEqual(trip.open_slots, 2)
+
+        # The count is read from the database, not this (stale) copy of the trip
+        models.Trip.objects.filter(pk=trip.pk).update(on_trip_count=3)
+        self.assertEqual(trip.open_slots, 0)
+
+    def test_full_trip_cannot_be_reserved(self):
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=1)
+        self.assertTrue(trip.reserve_slot())
+        self.assertFalse(trip.reserve_slot())
+        self.assertEqual(self._on_trip_count(trip), 1)
+
+    def test_recount(self):
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=5)
+        factories.SignUpFactory.create_batch(3, trip=trip)
+        models.SignUp.objects.filter(trip=trip).update(on_trip=False)
+
+        self.assertEqual(models.Trip.objects.filter(pk=trip.pk).recount_on_trip(), 1)
+        self.assertEqual(self._on_trip_count(trip), 0)
+
+
+class SignupRushTests(TransactionTestCase):
+    databases = {'default'}
+
+    def test_simultaneous_signups_never_overfill(self):
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=12)
+        participants = factories.ParticipantFactory.create_batch(200)
+        num_threads = 20
+        barrier = Barrier(num_threads)
+
+        def sign_up(participants):
+            barrier.wait()
+            try:
+                for participant in participants:
+                    models.SignUp.objects.create(trip=trip, participant=participant)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            futures = [
+                executor.submit(sign_up, participants[i::num_threads])
+                for i in range(num_threads)
+            ]
+        for future in futures:
+            future.result()
+
+        trip.refresh_from_db()
+        self.assertEqual(trip.on_trip_count, 12)
+        self.assertEqual(trip.signup_set.filter(on_trip=True).count(), 12)
+        self.assertEqual(trip.waitlist.signups.count(), 188)
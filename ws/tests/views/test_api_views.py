@@ -1,12 +1,16 @@
+import json
 import time
+from datetime import date
 from unittest import mock
 
 import jwt
+from django.contrib.auth.models import Group
 from freezegun import freeze_time
 
 import ws.utils.perms as perm_utils
-from ws import enums, settings
+from ws import api_views, enums, models, settings, tasks
 from ws.tests import TestCase, factories
+from ws.utils import geardb
 
 
 class JWTSecurityTest(TestCase):
@@ -239,6 +243,104 @@ class JsonProgramLeadersViewTest(TestCase):
         )
 
 
+class JsonTripsViewTest(TestCase):
+    def _get_page(self, **params):
+        response = self.client.get('/trips.json', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return json.loads(b''.join(response.streaming_content))
+
+    def _page_through(self, **params):
+        """Yield the IDs of each page of trips, following cursors to the end."""
+        page = self._get_page(page_size=2, **params)
+        yield [trip['id'] for trip in page['trips']]
+        while page['next']:
+            page = self._get_page(page_size=2, cursor=page['next'], **params)
+            yield [trip['id'] for trip in page['trips']]
+
+    def test_no_trips(self):
+        self.assertEqual(self._get_page(), {'trips': [], 'next': None})
+
+    def test_describes_trips(self):
+        trip = factories.TripFactory.create(
+            name='Mt. Washington', trip_date='2020-01-18', maximum_participants=8
+        )
+        factories.SignUpFactory.create(trip=trip, on_trip=True)
+        factories.SignUpFactory.create(trip=trip, on_trip=False)
+        trip.leaders.add(factories.ParticipantFactory.create(name='Tim Beaver'))
+
+        trips = self._get_page()['trips']
+        self.assertEqual(
+            trips,
+            [
+                {
+                    'id': trip.pk,
+                    'name': 'Mt. Washington',
+                    'program': trip.program,
+                    'trip_type': trip.trip_type,
+                    'trip_date': '2020-01-18',
+                    'level': trip.level,
+                    'maximum_participants': 8,
+                    'num_signups': 2,
+                    'signups_on_trip': 1,
+                    'leaders': ['Tim Beaver'],
+                }
+            ],
+        )
+
+    def test_pages_through_all_trips(self):
+        # Several trips share a date (and some even share a creation time)
+        with freeze_time("2019-12-01 12:00:00 EST"):
+            same_time = factories.TripFactory.create_batch(3, trip_date='2020-01-18')
+        older = factories.TripFactory.create(trip_date='2020-01-18')
+        newer = factories.TripFactory.create(trip_date='2020-01-18')
+        past = factories.TripFactory.create(trip_date='2019-06-01')
+        future = factories.TripFactory.create(trip_date='2020-02-01')
+
+        pages = list(self._page_through())
+        self.assertEqual(
+            pages,
+            [
+                [future.pk, newer.pk],
+                [older.pk, same_time[2].pk],
+                [same_time[1].pk, same_time[0].pk],
+                [past.pk],
+            ],
+        )
+
+    def test_new_trips_do_not_shift_pages(self):
+        trips = factories.TripFactory.create_batch(3, trip_date='2020-01-18')
+        first_page = self._get_page(page_size=2)
+        self.assertEqual(
+            [trip['id'] for trip in first_page['trips']], [trips[2].pk, trips[1].pk]
+        )
+
+        # An offset would now re-serve `trips[1]`; a cursor doesn't.
+        factories.TripFactory.create(trip_date='2020-01-19')
+        next_page = self._get_page(page_size=2, cursor=first_page['next'])
+        self.assertEqual(next_page, {'trips': [mock.ANY], 'next': None})
+        self.assertEqual(next_page['trips'][0]['id'], trips[0].pk)
+
+    def test_filter_by_date(self):
+        factories.TripFactory.create(trip_date='2019-06-01')
+        later = factories.TripFactory.create(trip_date='2020-01-18')
+        self.assertEqual(list(self._page_through(after='2019-12-01')), [[later.pk]])
+
+    def test_page_size_is_bounded(self):
+        factories.TripFactory.create_batch(3)
+        self.assertEqual(len(self._get_page(page_size=0)['trips']), 1)
+        self.assertEqual(len(self._get_page(page_size='all')['trips']), 3)
+
+    def test_bad_arguments(self):
+        response = self.client.get('/trips.json?after=2020-13-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'Invalid date'})
+
+        response = self.client.get('/trips.json?cursor=WyIyMDIwLTAxLTE4Il0')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'message': 'Invalid cursor'})
+
+
 class JsonParticipantsTest(TestCase):
     def setUp(self):
         super().setUp()
@@ -290,14 +392,36 @@ class JsonParticipantsTest(TestCase):
         # Search everybody matching 'mich' (matches all but Aaron)
         response = self.client.get('/participants.json?search=Mich')
         matches = response.json()['participants']
-        # TODO: Once using FTS or something, assert order.
-        # For now, we just return in any given order.
-        self.assertCountEqual(matches, [searcher, *others])
+        # Each matches just once, so they're ordered by name
+        self.assertEqual(matches, [*others, searcher])
 
         # Exclude self when searching
         response = self.client.get('/participants.json?search=Mich&exclude_self=1')
         no_self_matches = response.json()['participants']
-        self.assertCountEqual(no_self_matches, others)
+        self.assertEqual(no_self_matches, others)
+
+        # Multiple words must all match
+        response = self.client.get('/participants.json?search=Michele+ital')
+        self.assertEqual(response.json()['participants'], [self._expect(michele)])
+
+    def test_common_searches_cached(self):
+        factories.ParticipantFactory.create(name="Michaela the MITOCer")
+        with mock.patch.object(api_views.participant_search_cache, 'maxsize', 8):
+            api_views.participant_search_cache.clear()
+            first = self.client.get('/participants.json?search=Mich').json()
+            factories.ParticipantFactory.create(name="Michele da Italia")
+            # Matches only come from the cache (the new participant isn't found)
+            second = self.client.get('/participants.json?search=mich ').json()
+            self.assertEqual(first, second)
+            self.assertEqual(len(first['participants']), 2)
+            self.assertEqual(api_views.participant_search_cache.hits, 1)
+
+            # Excluding self still works on cached results
+            response = self.client.get(
+                '/participants.json?search=Mich&exclude_self=1'
+            ).json()
+            self.assertEqual(len(response['participants']), 1)
+            api_views.participant_search_cache.clear()
 
     def test_exact_id(self):
         """Participants can be queried by an exact ID."""
@@ -355,3 +479,346 @@ class ApproveTripViewTest(TestCase):
         self._approve(trip, approved=False)
         trip.refresh_from_db()
         self.assertFalse(trip.chair_approved)
+
+
+@freeze_time("2020-01-25 12:00:00 EST")
+class AdminTripSignupsViewTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.leader = factories.ParticipantFactory.create()
+        self.client.force_login(self.leader.user)
+        self.trip = factories.TripFactory.create(
+            program=enums.Program.WINTER_SCHOOL.value,
+            trip_date=date(2020, 1, 26),
+        )
+        self.trip.leaders.add(self.leader)
+        # A completed WS trip means lectures are over.
+        factories.TripFactory.create(
+            program=enums.Program.WINTER_SCHOOL.value, trip_date=date(2020, 1, 18)
+        )
+
+    def _sign_up(self, **kwargs):
+        """Sign up a participant with feedback, lottery info, and another trip."""
+        signup = factories.SignUpFactory.create(trip=self.trip, **kwargs)
+        par = signup.participant
+        factories.FeedbackFactory.create(participant=par)
+        factories.LotteryInfoFactory.create(participant=par)
+        factories.LectureAttendanceFactory.create(participant=par, year=2020)
+        factories.SignUpFactory.create(
+            participant=par,
+            on_trip=True,
+            trip=factories.TripFactory.create(trip_date=date(2020, 1, 27)),
+        )
+        return signup
+
+    def _get(self):
+        response = self.client.get(f'/trips/{self.trip.pk}/admin/signups/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_describes_signups(self):
+        on_trip = factories.SignUpFactory.create(trip=self.trip, on_trip=True)
+        waitlisted = factories.SignUpFactory.create(trip=self.trip, notes="Hi!")
+        factories.WaitListSignupFactory.create(signup=waitlisted)
+
+        factories.LectureAttendanceFactory.create(
+            participant=on_trip.participant, year=2020
+        )
+        feedback = factories.FeedbackFactory.create(
+            participant=waitlisted.participant, showed_up=False
+        )
+        factories.LotteryInfoFactory.create(
+            participant=on_trip.participant, paired_with=waitlisted.participant
+        )
+        factories.LotteryInfoFactory.create(
+            participant=waitlisted.participant,
+            paired_with=on_trip.participant,
+            car_status='own',
+            number_of_passengers=3,
+        )
+        other_trip = factories.TripFactory.create(trip_date=date(2020, 1, 24))
+        other_trip.leaders.add(waitlisted.participant)
+
+        signups = self._get()['signups']
+        self.assertEqual(
+            signups,
+            [
+                {
+                    'id': on_trip.pk,
+                    'participant': {
+                        'id': on_trip.participant.pk,
+                        'name': on_trip.participant.name,
+                        'email': on_trip.participant.email,
+                    },
+                    'missed_lectures': False,
+                    'feedback': [],
+                    'also_on': [],
+                    'paired_with': {
+                        'id': waitlisted.participant.pk,
+                        'name': waitlisted.participant.name,
+                    },
+                    'car_status': 'rent',
+                    'number_of_passengers': None,
+                    'notes': '',
+                },
+                {
+                    'id': waitlisted.pk,
+                    'participant': {
+                        'id': waitlisted.participant.pk,
+                        'name': waitlisted.participant.name,
+                        'email': waitlisted.participant.email,
+                    },
+                    'missed_lectures': True,
+                    'feedback': [
+                        {
+                            'showed_up': False,
+                            'leader': feedback.leader.name,
+                            'comments': feedback.comments,
+                            'trip': {
+                                'id': feedback.trip.pk,
+                                'name': feedback.trip.name,
+                            },
+                        }
+                    ],
+                    'also_on': [{'id': other_trip.pk, 'name': other_trip.name}],
+                    'paired_with': {
+                        'id': on_trip.participant.pk,
+                        'name': on_trip.participant.name,
+                    },
+                    'car_status': 'own',
+                    'number_of_passengers': 3,
+                    'notes': 'Hi!',
+                },
+            ],
+        )
+
+    def test_own_feedback_hidden(self):
+        signup = factories.SignUpFactory.create(
+            trip=self.trip, participant=self.leader, on_trip=True
+        )
+        factories.FeedbackFactory.create(participant=self.leader)
+        (description,) = self._get()['signups']
+        self.assertEqual(description['id'], signup.pk)
+        self.assertEqual(description['feedback'], [])
+
+    def test_query_count_is_constant(self):
+        """The number of queries doesn't grow with the number of signups."""
+        self._sign_up(on_trip=True)
+        self._get()  # (Loads & caches the participant)
+        with self.assertNumQueries(14):
+            self.assertEqual(len(self._get()['signups']), 1)
+
+        for _ in range(4):
+            self._sign_up(on_trip=True)
+        for _ in range(4):
+            factories.WaitListSignupFactory.create(signup=self._sign_up())
+        with self.assertNumQueries(14):
+            self.assertEqual(len(self._get()['signups']), 9)
+
+
+@freeze_time("2020-01-20 12:00:00 EST")
+class TripRentalsViewTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = factories.TripFactory.create(trip_date=date(2020, 1, 25))
+        self.participant = factories.SignUpFactory.create(
+            trip=self.trip, on_trip=True
+        ).participant
+
+    def _get(self):
+        return self.client.get(f'/trips/{self.trip.pk}/rentals.json')
+
+    def test_participants_cannot_view(self):
+        self.client.force_login(self.participant.user)
+        response = self._get()
+        self.assertEqual(response.status_code, 403)
+
+    def test_cached_rentals(self):
+        leader = factories.ParticipantFactory.create()
+        self.trip.leaders.add(leader)
+        self.client.force_login(leader.user)
+        models.CachedRentals.objects.create(participant=leader)
+        models.CachedRentals.objects.create(
+            participant=self.participant,
+            rentals=[
+                {
+                    'email': self.participant.email,
+                    'id': 'BK-19-04',
+                    'name': 'Backpack',
+                    'cost': 1.5,
+                    'checkedout': '2020-01-18',
+                }
+            ],
+        )
+
+        with mock.patch.object(tasks.update_trip_rentals, 'delay') as delay:
+            response = self._get()
+        delay.assert_not_called()
+        self.assertEqual(
+            response.json(),
+            {
+                'rentals': [
+                    {
+                        'participant': {
+                            'id': self.participant.pk,
+                            'name': self.participant.name,
+                        },
+                        'items': [
+                            {
+                                'id': 'BK-19-04',
+                                'name': 'Backpack',
+                                'cost': 1.5,
+                                'checkedout': '2020-01-18',
+                                'overdue': False,
+                            }
+                        ],
+                    }
+                ],
+                'refreshing': False,
+            },
+        )
+
+    def test_missing_rentals_refreshed_in_background(self):
+        leader = factories.ParticipantFactory.create()
+        perm_utils.make_chair(leader.user, enums.Activity.WINTER_SCHOOL)
+        self.client.force_login(leader.user)
+
+        with mock.patch.object(tasks.update_trip_rentals, 'delay') as delay:
+            response = self._get()
+        delay.assert_called_once_with(self.trip.pk)
+        self.assertEqual(response.json(), {'rentals': [], 'refreshing': True})
+
+
+class UpdateRentalsViewTest(TestCase):
+    def _post(self, email):
+        year_2525 = 17514144000
+        token = jwt.encode(
+            {'exp': year_2525, 'email': email},
+            algorithm='HS256',
+            key=settings.MEMBERSHIP_SECRET_KEY,
+        )
+        return self.client.post('/data/rentals/', HTTP_AUTHORIZATION=f'Bearer: {token}')
+
+    def test_unknown_participant(self):
+        with mock.patch.object(tasks.update_participant_rentals, 'delay') as delay:
+            response = self._post('nobody@example.com')
+        self.assertEqual(response.status_code, 200)
+        delay.assert_not_called()
+
+    def test_rentals_updated(self):
+        par = factories.ParticipantFactory.create()
+        with mock.patch.object(tasks.update_participant_rentals, 'delay') as delay:
+            response = self._post(par.email)
+        self.assertEqual(response.status_code, 202)
+        delay.assert_called_once_with(par.pk)
+
+
+@freeze_time("2020-01-20 12:00:00 EST", tick=True)
+class MembershipStatusesViewTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        leader = factories.ParticipantFactory.create()
+        leader.user.groups.add(Group.objects.get(name='leaders'))
+        self.client.force_login(leader.user)
+        self.participant = factories.ParticipantFactory.create()
+
+    def _statuses(self):
+        membership = {
+            'membership': {
+                'expires': '2020-12-12',
+                'active': True,
+                'email': self.participant.email,
+            },
+            'waiver': {'expires': '2020-12-12', 'active': True},
+            'status': 'Active',
+        }
+        with mock.patch.object(geardb, 'matching_memberships') as matches:
+            matches.return_value = {self.participant.email: membership}
+            response = self.client.post(
+                '/participants/membership_statuses/',
+                {'participant_ids': [self.participant.pk]},
+                content_type='application/json',
+            )
+        self.assertEqual(
+            response.json(), {'memberships': {str(self.participant.pk): membership}}
+        )
+        return matches
+
+    def test_repeated_loads_cached(self):
+        self._statuses().assert_called_once_with([self.participant.email])
+        self._statuses().assert_not_called()
+
+    def test_membership_updates_invalidate(self):
+        self._statuses()
+
+        year_2525 = 17514144000
+        token = jwt.encode(
+            {
+                'exp': year_2525,
+                'email': self.participant.email,
+                'membership_expires': '2020-12-12',
+            },
+            algorithm='HS256',
+            key=settings.MEMBERSHIP_SECRET_KEY,
+        )
+        response = self.client.post(
+            '/data/membership/', HTTP_AUTHORIZATION=f'Bearer: {token}'
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self._statuses().assert_called_once_with([self.participant.email])
+
+    def test_updates_in_other_processes(self):
+        """Membership updates invalidate the cache, though received elsewhere."""
+        self._statuses()
+        self._statuses().assert_not_called()
+
+        # Another process received the update (so didn't invalidate our cache)
+        self.participant.update_membership(membership_expires=date(2020, 12, 12))
+        self._statuses().assert_called_once_with([self.participant.email])
+        self._statuses().assert_not_called()
+
+
+class RawMembershipStatsViewTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.leader = factories.ParticipantFactory.create()
+        self.client.force_login(self.leader.user)
+        self.members = [{'last_known_affiliation': 'MIT undergrad', 'num_rentals': 2}]
+
+    def test_leaders_only(self):
+        response = self.client.get('/stats/membership.json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_computed_later_when_never_cached(self):
+        self.leader.user.groups.add(Group.objects.get(name='leaders'))
+
+        with mock.patch.object(tasks.update_membership_stats, 'delay') as delay:
+            response = self.client.get('/stats/membership.json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '60')
+        delay.assert_called_once_with()
+
+    def test_conditional_responses(self):
+        self.leader.user.groups.add(Group.objects.get(name='leaders'))
+        models.MembershipStats(members=self.members).save()
+
+        with mock.patch.object(geardb, 'cache_membership_stats') as cache_membership:
+            response = self.client.get('/stats/membership.json')
+            self.assertEqual(response.json(), {'members': self.members})
+            self.assertEqual(response['Cache-Control'], 'private, no-cache')
+            etag = response['ETag']
+
+            not_modified = self.client.get(
+                '/stats/membership.json', HTTP_IF_NONE_MATCH=etag
+            )
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified.content, b'')
+        cache_membership.assert_not_called()
+
+        # Once stats are computed anew, they're sent again
+        models.MembershipStats(members=[]).save()
+        response = self.client.get('/stats/membership.json', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'members': []})
+        self.assertNotEqual(response['ETag'], etag)
@@ -2,7 +2,9 @@ import re
 from datetime import date
 
 from bs4 import BeautifulSoup
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
 
 import ws.utils.perms as perm_utils
@@ -162,6 +164,45 @@ class AllTripsViewTest(TestCase, Helpers):
         self._expect_past_trips(response, [expected_trip.pk])
         self._expect_link_for_date(soup, '2016-11-15')
 
+    def test_queries_do_not_grow_with_trips(self):
+        """Counts & leaders for every trip come from one query of summaries."""
+
+        def num_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self._get('/trips/all/')
+            # Neither signups nor ratings are read at all
+            tables = ('"ws_signup"', '"ws_leaderrating"')
+            for query in queries:
+                self.assertFalse(any(table in query['sql'] for table in tables))
+            return len(queries)
+
+        def make_trip(trip_date):
+            trip = factories.TripFactory.create(
+                trip_date=trip_date, program=enums.Program.CLIMBING.value
+            )
+            trip.leaders.add(
+                factories.LeaderRatingFactory.create(
+                    activity=enums.Activity.CLIMBING.value
+                ).participant
+            )
+            factories.SignUpFactory.create_batch(2, trip=trip)
+
+        make_trip('2019-02-22')
+        make_trip('2019-01-15')
+        expected_queries = num_queries()
+
+        for _ in range(5):
+            make_trip('2019-02-22')
+            make_trip('2019-01-15')
+        self.assertEqual(num_queries(), expected_queries)
+
+        _, soup = self._get('/trips/all/')
+        row = soup.find('tbody').find('tr')
+        self.assertEqual(
+            [cell.get_text(strip=True) for cell in row.find_all('td')[3:]],
+            ['2 / 8', '8', 'Test Participant (Full leader)'],
+        )
+
 
 class CreateTripViewTest(TestCase, Helpers):
     @freeze_time("2019-12-15 12:25:00 EST")
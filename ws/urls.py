@@ -377,6 +377,7 @@ urlpatterns = [
         api_views.JsonProgramLeadersView.as_view(),
         name='json-program-leaders',
     ),
+    path('trips.json', api_views.JsonTripsView.as_view(), name='json-trips'),
     path(
         'participants.json',
         api_views.JsonParticipantsView.as_view(),
@@ -402,6 +403,11 @@ urlpatterns = [
         api_views.SimpleSignupsView.as_view(),
         name='json-signups',
     ),
+    path(
+        'trips/<int:pk>/rentals.json',
+        api_views.TripRentalsView.as_view(),
+        name='json-trip_rentals',
+    ),
     path('stats/', views.StatsView.as_view(), name='stats'),
     path('stats/leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
     path(
@@ -426,6 +432,11 @@ urlpatterns = [
         api_views.UpdateMembershipView.as_view(),
         name='update_membership',
     ),
+    path(
+        'data/rentals/',
+        api_views.UpdateRentalsView.as_view(),
+        name='update_rentals',
+    ),
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
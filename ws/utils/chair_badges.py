@@ -0,0 +1,63 @@
+"""
+Counts of items awaiting action by activity chairs.
+
+Chairs see these counts as badges in the navigation menu on every page, so
+they're cached briefly instead of being queried with each page load. Whenever
+something that may change a count is saved, all counts for the activity are
+invalidated.
+"""
+from django.core.cache import cache
+
+from ws import models
+from ws.utils.dates import local_date
+from ws.utils.ratings import ApplicationManager
+
+# Counts are invalidated on change, but expire soon regardless (e.g. at midnight).
+BADGE_TTL = 60
+
+
+def _generation_key(activity: str) -> str:
+    return f'chair_badges:{activity}'
+
+
+def _cache_key(activity: str, name: str) -> str:
+    generation = cache.get_or_set(_generation_key(activity), 0, timeout=None)
+    return f'chair_badges:{activity}:{generation}:{name}'
+
+
+def invalidate(activity: str) -> None:
+    """Discard all cached counts for the activity."""
+    try:
+        cache.incr(_generation_key(activity))
+    except ValueError:  # Nothing was cached for the activity
+        pass
+
+
+def unapproved_trip_count(activity_enum) -> int:
+    """Count upcoming trips awaiting chair approval."""
+
+    def count():
+        # TODO: Migrate away from legacy activity
+        return models.Trip.objects.filter(
+            trip_date__gte=local_date(),
+            activity=activity_enum.value,
+            chair_approved=False,
+        ).count()
+
+    key = _cache_key(activity_enum.value, 'unapproved_trips')
+    return cache.get_or_set(key, count, BADGE_TTL)
+
+
+def pending_applications_count(chair, activity_enum) -> int:
+    """Count applications where:
+
+    - All chairs have given recs, rating is needed
+    - Viewing chair hasn't given a rec
+    """
+
+    def count():
+        manager = ApplicationManager(chair=chair, activity=activity_enum.value)
+        return len(manager.pending_applications())
+
+    key = _cache_key(activity_enum.value, f'pending_applications:{chair and chair.pk}')
+    return cache.get_or_set(key, count, BADGE_TTL)
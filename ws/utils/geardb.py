@@ -10,14 +10,31 @@ externally-hosted MySQL database.
 import logging
 import typing
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional, TypedDict
+from itertools import chain, groupby
+from operator import itemgetter
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypedDict,
+)
 from urllib.parse import urljoin
 
 import requests
-from django.db import connections
-from django.db.models import Case, Count, IntegerField, Sum, When
-from django.db.models.functions import Lower
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Lower
+from django.utils import timezone
 from mitoc_const import affiliations
+from MySQLdb.cursors import SSCursor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from ws import models, settings
 from ws.utils import api as api_util
@@ -36,6 +53,9 @@ AFFILIATION_MAPPING['N'] = affiliations.NON_AFFILIATE.VALUE
 
 API_BASE = 'https://mitoc-gear.mit.edu/api-auth/v1/'
 
+# Members are streamed from the gear database in batches of this many rows
+STATS_FETCH_SIZE = 1000
+
 JsonDict = Dict[str, Any]
 
 
@@ -79,26 +99,77 @@ def gear_bearer_jwt(**payload) -> str:
     return api_util.bearer_jwt(settings.GEARDB_SECRET_KEY, **payload)
 
 
-def query_api(route: str, **params: Any) -> List[JsonDict]:
-    """Request results from the API on mitoc-gear.mit.edu."""
-    response = requests.get(
-        urljoin(API_BASE, route),
-        # NOTE: We sign the payload here, even though current implementations only use query params.
-        # This does technically mean that anyone with a valid token can use the token to query any data.
-        # However, tokens aren't given to end users, only used on the systems which already have the secret.
-        headers={'Authorization': gear_bearer_jwt(**params)},
-        params=params,
-    )
-    if response.status_code != 200:
-        raise APIError()
+class GearApiClient:
+    """A client for the API on mitoc-gear.mit.edu.
+
+    Connections are pooled (and kept alive) between requests, requests time
+    out rather than hang, and transient failures are retried with backoff.
+    """
+
+    # (Seconds to connect, seconds to wait for each response)
+    TIMEOUT = (3.05, 30)
+
+    # Emails (or other values) are passed in the query string, which has a
+    # practical limit on its length. Larger lists are split across requests.
+    BATCH_SIZE = 100
+
+    def __init__(self, base_url: str = API_BASE, retries: int = 3) -> None:
+        self.base_url = base_url
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,  # (Give back the last response; we raise)
+        )
+        self.session.mount('https://', HTTPAdapter(max_retries=retry))
+
+    def _get(self, url: str, params: Optional[Dict[str, Any]], **payload) -> JsonDict:
+        try:
+            response = self.session.get(
+                url,
+                # NOTE: We sign the payload here, even though current implementations only use query params.
+                # This does technically mean that anyone with a valid token can use the token to query any data.
+                # However, tokens aren't given to end users, only used on the systems which already have the secret.
+                headers={'Authorization': gear_bearer_jwt(**payload)},
+                params=params,
+                timeout=self.TIMEOUT,
+            )
+        except requests.RequestException as err:
+            raise APIError() from err
+        if response.status_code != 200:
+            raise APIError()
+        body: JsonDict = response.json()
+        return body
+
+    def query(self, route: str, **params: Any) -> Iterator[JsonDict]:
+        """Yield every result from the route, requesting each page as needed."""
+        body = self._get(urljoin(self.base_url, route), params, **params)
+        yield from body['results']
+        while body['next']:
+            # (The URL to the next page includes the original query params)
+            body = self._get(body['next'], None, **params)
+            yield from body['results']
+
+    def query_batched(
+        self, route: str, key: str, values: List[Any], **params: Any
+    ) -> Iterator[JsonDict]:
+        """Yield every result from the route for all values of a list parameter.
+
+        Values are split into batches, with one query (of however many pages)
+        for each batch.
+        """
+        for i in range(0, len(values), self.BATCH_SIZE):
+            batch = values[i : i + self.BATCH_SIZE]
+            yield from self.query(route, **{key: batch}, **params)
+
 
-    body = response.json()
-    results: List[JsonDict] = body['results']
+api_client = GearApiClient()
 
-    if body['next'] or len(results) != body['count']:
-        logger.error("Results are paginated; this is not expected or handled.")
 
-    return results
+def _overdue(checkout_date: date, today: date) -> bool:
+    return today - checkout_date > timedelta(weeks=10)
 
 
 class Rental(typing.NamedTuple):
@@ -147,13 +218,10 @@ def repr_blank_membership() -> MembershipDict:
     }
 
 
-def membership_expiration(emails):
-    """Return the most recent expiration date for the given emails.
-
-    The method is intended to allow looking up a single user's membership where
-    they have multiple email addresses.
+def most_recent_membership(memberships: Iterable[MembershipDict]) -> MembershipDict:
+    """Return the one membership to regard as current among a person's memberships.
 
-    It also calculates whether or not the membership has expired.
+    Memberships may be under any of a person's email addresses.
     """
 
     def expiration_date(info):
@@ -164,20 +232,36 @@ def membership_expiration(emails):
         waiver_expires = info['waiver']['expires']
         return (waiver_expires is not None, waiver_expires)
 
-    # Find all memberships under one or more of the participant's emails
-    memberships_by_email = matching_memberships(emails)
-    if not memberships_by_email:
-        return repr_blank_membership()
+    memberships = list(memberships)
 
     # The most recent account should be considered as their one membership
-    most_recent = max(memberships_by_email.values(), key=expiration_date)
+    most_recent = max(memberships, key=expiration_date)
 
     # If there's an older membership with an active waiver, use that!
     if not most_recent['membership']['active']:
-        last_waiver = max(memberships_by_email.values(), key=waiver_date)
+        last_waiver = max(memberships, key=waiver_date)
         if last_waiver['waiver']['active']:
             most_recent = last_waiver
 
+    return most_recent
+
+
+def membership_expiration(emails):
+    """Return the most recent expiration date for the given emails.
+
+    The method is intended to allow looking up a single user's membership where
+    they have multiple email addresses.
+
+    It also calculates whether or not the membership has expired.
+    """
+
+    # Find all memberships under one or more of the participant's emails
+    memberships_by_email = matching_memberships(emails)
+    if not memberships_by_email:
+        return repr_blank_membership()
+
+    most_recent = most_recent_membership(memberships_by_email.values())
+
     # Since we fetched the most current information from the db, update cache
     # TODO: Should probably refactor this method so it doesn't have unclear side effects
     email = most_recent['membership']['email']
@@ -324,6 +408,88 @@ def matching_memberships(emails: Iterable[str]) -> Dict[str, MembershipDict]:
     return dict(_yield_matches())
 
 
+class MembershipCache:
+    """A short-lived cache of the memberships found under each email address.
+
+    Leaders check the memberships of everybody on a trip whenever they load
+    the trip, and multiple leaders of the same trip do so repeatedly. Caching
+    briefly makes those repeated checks free of gear database queries.
+
+    Emails are cached even when no membership is found under them. The cache
+    is local to each process, so `invalidate()` only reaches the process that
+    received a membership update. Instead, callers pass when each membership
+    was last updated (`Membership.last_cached`, shared by all processes), and
+    anything cached before then is looked up again.
+    """
+
+    TTL = 5 * 60
+
+    def __init__(self) -> None:
+        # (Counted in this process only, so these are mostly useful in tests)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _cache_key(email: str) -> str:
+        return f'geardb_membership:{email.lower()}'
+
+    def matching_memberships(
+        self,
+        emails: Iterable[str],
+        updated_at: Optional[Dict[str, datetime]] = None,
+    ) -> Dict[str, MembershipDict]:
+        """Return the same results as `matching_memberships()`, cached.
+
+        :param updated_at: When the membership for each email was last known
+            to change (memberships cached before then are not used)
+        """
+        updated_at = updated_at or {}
+        key_by_email = {email: self._cache_key(email) for email in emails}
+        entries = cache.get_many(key_by_email.values())
+
+        cached: Dict[str, MembershipDict] = {}
+        for email, key in key_by_email.items():
+            entry = entries.get(key)
+            if entry and not (
+                email in updated_at and entry['cached_at'] <= updated_at[email]
+            ):
+                cached[email] = entry['membership']
+
+        missed = [email for email in key_by_email if email not in cached]
+        self.hits += len(cached)
+        self.misses += len(missed)
+        logger.debug("Membership cache: %d hits, %d misses", len(cached), len(missed))
+
+        # (Taken before querying, so an update made meanwhile invalidates results)
+        cached_at = timezone.now()
+        found = matching_memberships(missed) if missed else {}
+        # (An empty membership records that none was found for the email)
+        cache.set_many(
+            {
+                key_by_email[email]: {
+                    'cached_at': cached_at,
+                    'membership': found.get(email, {}),
+                }
+                for email in missed
+            },
+            self.TTL,
+        )
+
+        matches = {}
+        for email in key_by_email:
+            membership = found[email] if email in found else cached.get(email)
+            if membership:
+                matches[email] = membership
+        return matches
+
+    def invalidate(self, emails: Iterable[str]) -> None:
+        """Discard cached memberships (in this process) for the given emails."""
+        cache.delete_many([self._cache_key(email) for email in emails])
+
+
+membership_cache = MembershipCache()
+
+
 def outstanding_items(emails: List[str]) -> Iterator[Rental]:
     """Return all items that are currently checked out to one or more members.
 
@@ -351,7 +517,8 @@ def outstanding_items(emails: List[str]) -> Iterator[Rental]:
 
     today = local_date()
 
-    for result in query_api('rentals/', email=emails):  # One row per item
+    # One row per item
+    for result in api_client.query_batched('rentals/', 'email', emails):
         person, gear = result['person'], result['gear']
 
         # Map from the person record back to the requested email address
@@ -369,7 +536,7 @@ def outstanding_items(emails: List[str]) -> Iterator[Rental]:
             name=gear['type']['type_name'],
             cost=float(gear['type']['rental_amount']),
             checkedout=checkout_date,
-            overdue=(today - checkout_date > timedelta(weeks=10)),
+            overdue=_overdue(checkout_date, today),
         )
 
 
@@ -386,6 +553,108 @@ def user_rentals(user) -> List[Rental]:
     return list(outstanding_items(verified_emails(user)))
 
 
+def leaders_and_participants(trip: models.Trip) -> List[models.Participant]:
+    """Return the trip's leaders, then its participants (in default signup ordering)."""
+    on_trip = trip.signup_set.filter(on_trip=True).select_related('participant')
+    # (Leaders may be signed up as participants too, but are only given once)
+    return list(dict.fromkeys([*trip.leaders.all(), *(s.participant for s in on_trip)]))
+
+
+def cache_rentals(participants: Iterable[models.Participant]) -> None:
+    """Cache all items currently rented by the participants (see `CachedRentals`).
+
+    Items for all participants are fetched with just one API call.
+    """
+    par_by_user_id = {par.user_id: par for par in participants}
+    if not par_by_user_id:
+        return
+
+    emails = models.EmailAddress.objects.filter(
+        verified=True, user_id__in=par_by_user_id
+    )
+    participant_by_email = {addr.email: par_by_user_id[addr.user_id] for addr in emails}
+    rentals_by_par: Dict[int, List[JsonDict]] = {
+        par.pk: [] for par in par_by_user_id.values()
+    }
+    for item in outstanding_items(list(participant_by_email)):
+        rentals_by_par[participant_by_email[item.email].pk].append(
+            {
+                'email': item.email,
+                'id': item.id,
+                'name': item.name,
+                'cost': item.cost,
+                'checkedout': item.checkedout.isoformat(),
+            }
+        )
+
+    now = timezone.now()
+    caches = [
+        models.CachedRentals(participant_id=par_pk, rentals=rentals, last_cached=now)
+        for par_pk, rentals in rentals_by_par.items()
+    ]
+    # Other tasks may cache the same participants at once (e.g. for their trip).
+    # Update existing rows (locked), and leave new rows to whichever task is first.
+    with transaction.atomic():
+        existing = set(
+            models.CachedRentals.objects.select_for_update()
+            .filter(participant_id__in=rentals_by_par)
+            .values_list('participant_id', flat=True)
+        )
+        models.CachedRentals.objects.bulk_update(
+            [cached for cached in caches if cached.participant_id in existing],
+            ['rentals', 'last_cached'],
+        )
+        models.CachedRentals.objects.bulk_create(
+            [cached for cached in caches if cached.participant_id not in existing],
+            ignore_conflicts=True,
+        )
+
+
+def cached_trip_rentals(
+    trip: models.Trip,
+) -> Tuple[List[Tuple[models.Participant, List[Rental]]], bool]:
+    """Return items rented by the trip's leaders & participants, as last cached.
+
+    Items are given for each person (leaders first) who had rented items on or
+    before the trip date. Also return if rentals for anybody on the trip were
+    never cached, or are stale (in which case, they should be cached anew).
+
+    This makes no API calls, so it's suitable for use while handling a request.
+    """
+    people = leaders_and_participants(trip)
+    cached_by_par_pk = {
+        cached.participant_id: cached
+        for cached in models.CachedRentals.objects.filter(participant__in=people)
+    }
+    stale = any(
+        par.pk not in cached_by_par_pk or cached_by_par_pk[par.pk].stale
+        for par in people
+    )
+
+    today = local_date()
+    rentals_by_par = []
+    for par in people:
+        cached = cached_by_par_pk.get(par.pk)
+        rentals = []
+        for rental in cached.rentals if cached else []:
+            checkout_date = date.fromisoformat(rental['checkedout'])
+            if checkout_date > trip.trip_date:
+                continue  # This item definitely wasn't rented for the trip
+            rentals.append(
+                Rental(
+                    email=rental['email'],
+                    id=rental['id'],
+                    name=rental['name'],
+                    cost=rental['cost'],
+                    checkedout=checkout_date,
+                    overdue=_overdue(checkout_date, today),
+                )
+            )
+        if rentals:
+            rentals_by_par.append((par, rentals))
+    return rentals_by_par, stale
+
+
 # NOTE: This is the last (frequently-called) method which hits the db directly.
 # We should replace this with an API call.
 def update_affiliation(participant):
@@ -471,85 +740,102 @@ def update_affiliation(participant):
         )
 
 
-def _stats_only_all_active_members():
-    """Yield emails and rental activity for all members with current dues."""
-    cursor = connections['geardb'].cursor()
-    cursor.execute(
-        '''
-        -- NOTE: Will have one or more rows per active member
-        select p.id as person_id,
-               coalesce(p.affiliation, 'Unknown') as last_known_affiliation,
-               lower(p.email) as email,
-               lower(pe.alternate_email) as alternate_email,
-               count(r.id) as num_rentals
-          from people p
-               join people_memberships       pm on p.id = pm.person_id
-               left join geardb_peopleemails pe on p.id = pe.person_id
-               left join rentals             r  on p.id = r.person_id
-         where pm.expires > now()
-         group by p.id, p.affiliation, p.email, pe.alternate_email
-        '''
-    )
+def _stats_only_all_active_members() -> Iterator[Tuple[int, JsonDict, List[str]]]:
+    """Yield each member with current dues, their rental activity, and all emails.
 
-    for person_id, affiliation, main, alternate_email, num_rentals in cursor.fetchall():
-        known_emails = (e for e in (main, alternate_email) if e)
-        for email in known_emails:
-            info = {
-                # NOTE: Anyone with >1 alternate email will have multiple rows!
-                # (We'll use multiple emails to look up). Ensure we enforce uniqueness
-                'person_id': person_id,
-                'last_known_affiliation': affiliation,
-                'num_rentals': num_rentals,
-            }
-            yield email, info
+    Rows are streamed from a server-side cursor (in order of person), so only
+    one batch of rows is ever held in memory, however many members there are.
+    """
+    db = connections['geardb']
+    db.ensure_connection()
+    cursor = db.connection.cursor(SSCursor)
+    try:
+        cursor.execute(
+            '''
+            -- NOTE: Will have one or more rows per active member (one per alternate email)
+            select p.id as person_id,
+                   coalesce(p.affiliation, 'Unknown') as last_known_affiliation,
+                   lower(p.email) as email,
+                   lower(pe.alternate_email) as alternate_email,
+                   (select count(*) from rentals r where r.person_id = p.id) as num_rentals
+              from people p
+                   left join geardb_peopleemails pe on p.id = pe.person_id
+             where exists (
+                     select 1
+                       from people_memberships pm
+                      where pm.person_id = p.id
+                        and pm.expires > now()
+                   )
+             order by p.id
+            '''
+        )
+        rows = iter(lambda: cursor.fetchmany(STATS_FETCH_SIZE), ())
+        for person_id, person_rows in groupby(chain.from_iterable(rows), itemgetter(0)):
+            emails: List[str] = []
+            for _, affiliation, main, alternate_email, num_rentals in person_rows:
+                emails.extend(
+                    e for e in (main, alternate_email) if e and e not in emails
+                )
+            info = {'last_known_affiliation': affiliation, 'num_rentals': num_rentals}
+            yield person_id, info, emails
+    finally:
+        cursor.close()
+
+
+def _count_per_participant(queryset, field: str = 'participant_id') -> Coalesce:
+    """Count rows for the participant of each outer `EmailAddress`, as a subquery."""
+    counts = (
+        queryset.filter(**{field: OuterRef('user__participant')})
+        .order_by()
+        .values(field)
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
 
 
-def trips_information():
-    """Give important counts, indexed by user IDs.
+def trips_information() -> Iterator[Tuple[str, Dict[str, int]]]:
+    """Give important counts for each participant, by (lowercase) verified email.
 
     Each participant has a singular underlying user. This user has one or more
     email addresses, which form the link back to the gear database.
-    The user database lives separately from the participant database, so we'll
-    need to make a separate query for user information anyway.
+    All counts are made by the database, in just one query.
     """
     # TODO: Last year only?
-    signup_on_trip = Case(
-        When(signup__on_trip=True, then=1), default=0, output_field=IntegerField()
-    )
-
-    trips_per_participant = dict(
-        models.Participant.objects.all()
-        .annotate(
-            # NOTE: Adding other annotations results in double-counting signups
-            # (We do multiple JOINs, and can't easily pass a DISTINCT to the Sum)
-            num_trips_attended=Sum(signup_on_trip)
+    emails = (
+        models.EmailAddress.objects.filter(
+            verified=True, user__participant__isnull=False
         )
-        .values_list('pk', 'num_trips_attended')
-    )
-
-    additional_stats = (
-        models.Participant.objects.all()
         .annotate(
-            num_discounts=Count('discounts', distinct=True),
-            num_trips_led=Count('trips_led', distinct=True),
+            lower_email=Lower('email'),
+            num_trips_attended=_count_per_participant(
+                models.SignUp.objects.filter(on_trip=True)
+            ),
+            num_trips_led=_count_per_participant(models.Trip.leaders.through.objects),
+            num_discounts=_count_per_participant(
+                models.Participant.discounts.through.objects
+            ),
+        )
+        .values_list(
+            'lower_email', 'num_trips_attended', 'num_trips_led', 'num_discounts'
         )
-        .values_list('pk', 'user_id', 'num_discounts', 'num_trips_led')
     )
 
-    for (pk, user_id, num_discounts, num_trips_led) in additional_stats:
+    for (email, num_trips_attended, num_trips_led, num_discounts) in emails.iterator():
         info = {
-            'num_trips_attended': trips_per_participant[pk],
+            'num_trips_attended': num_trips_attended,
             'num_trips_led': num_trips_led,
             'num_discounts': num_discounts,
         }
-        yield user_id, info
+        yield email, info
 
 
 # NOTE: This method is only used for the (leaders-only, hacky, `/stats` endpoint)
-# We of course should avoid direct database access, but I'm okay with this not being tested.
-# Worst case, it just breaks a stats-reporting page that I wrote as a one-off.
+# We of course should avoid direct database access, but I'm okay with the gear
+# database half of this not being tested. Worst case, it just breaks a
+# stats-reporting page that I wrote as a one-off.
 # I should make better dashboards in the long run anyway.
-def membership_information():
+def membership_information() -> List[JsonDict]:
     """All current active members, annotated with additional info.
 
     For each paying member, we also mark if they:
@@ -557,43 +843,23 @@ def membership_information():
     - have led any trips
     - have rented gear
     - make use MITOC discounts
+
+    This takes full scans of both databases; see `cache_membership_stats()`.
     """
-    # Get trips information indexed by Trips user ID's
-    info_by_user_id = dict(trips_information())
-
-    # Bridge from a lowercase email address to a Trips user ID
-    email_to_user_id = dict(
-        models.EmailAddress.objects.filter(verified=True)
-        .annotate(lower_email=Lower('email'))
-        .values_list('lower_email', 'user_id')
-    )
+    info_by_email = dict(trips_information())
+
+    all_members = []
+    for _person_id, info, emails in _stats_only_all_active_members():
+        # We might only have trips info under an alternate email
+        for email in emails:
+            info.update(info_by_email.get(email, {}))
+        all_members.append(info)
+    return all_members
 
-    def trips_info_for(email):
-        try:
-            user_id = email_to_user_id[email]
-        except KeyError:  # No Trips account
-            return {}
 
-        try:
-            return info_by_user_id[user_id]
-        except KeyError:  # User, but no corresponding Participant
-            return {}
-
-    # Map from the gear database's person ID to stats about the member
-    all_members = {}
-
-    for email, info in _stats_only_all_active_members():
-        existing_record = all_members.get(info['person_id'])
-
-        if existing_record:
-            # We already recorded them as a member, don't report twice
-            # However, we might only have trips info under an alternate email
-            existing_record.update(trips_info_for(email))
-            continue
-
-        all_members[info['person_id']] = {
-            'last_known_affiliation': info['last_known_affiliation'],
-            'num_rentals': info['num_rentals'],
-            **trips_info_for(email),
-        }
-    return all_members
+def cache_membership_stats() -> models.MembershipStats:
+    """Compute statistics about all current members anew (see `MembershipStats`)."""
+    stats = models.MembershipStats(members=membership_information())
+    stats.save()
+    logger.info("Cached stats for %s current members", len(stats.members))
+    return stats
@@ -1,26 +1,128 @@
+import logging
+from collections import defaultdict
 from datetime import timedelta
+from time import monotonic
+from typing import Dict, List, Optional
 
+from django.db import transaction
 from django.db.models import Q
 from django.db.utils import OperationalError
+from django.utils import timezone
 from sentry_sdk import capture_exception
 
 from ws import enums, models
 from ws.utils import geardb
 from ws.utils.dates import local_now
 
+logger = logging.getLogger(__name__)
 
-def refresh_all_membership_cache():
+# Query the gear database for memberships under this many emails at a time
+EMAILS_PER_QUERY = 2000
+
+
+def refresh_all_membership_cache(chunk_size: int = EMAILS_PER_QUERY) -> int:
     """Refresh all membership caches in the system.
 
     After this is run, every participant in the system will have membership
     information that is no more than a week old.
+
+    All stale participants are refreshed together: their verified emails are
+    fetched at once, the gear database is queried for a chunk of emails at a
+    time, and memberships are then written in bulk.
+
+    Returns the number of participants whose membership was refreshed.
     """
+    started = monotonic()
     last_week = local_now() - timedelta(weeks=1)
     needs_update = Q(membership__isnull=True) | Q(membership__last_cached__lt=last_week)
-
-    all_participants = models.Participant.objects.select_related('membership')
-    for par in all_participants.filter(needs_update):
-        update_membership_cache(par)
+    stale_participants = models.Participant.objects.filter(needs_update)
+
+    par_by_user_id = {
+        par.user_id: par for par in stale_participants.select_related('membership')
+    }
+    if not par_by_user_id:
+        return 0
+
+    emails_by_user_id = defaultdict(list)
+    for email, user_id in models.EmailAddress.objects.filter(
+        verified=True, user_id__in=stale_participants.values('user_id')
+    ).values_list('email', 'user_id'):
+        if user_id in par_by_user_id:  # (In case of participants created since)
+            emails_by_user_id[user_id].append(email)
+    user_id_by_email = {
+        email: user_id
+        for user_id, emails in emails_by_user_id.items()
+        for email in emails
+    }
+
+    # Participants may have memberships under any (or all!) of their emails
+    memberships_by_user_id = defaultdict(list)
+    all_emails = list(user_id_by_email)
+    for i in range(0, len(all_emails), chunk_size):
+        chunk = all_emails[i : i + chunk_size]
+        for email, membership in geardb.matching_memberships(chunk).items():
+            memberships_by_user_id[user_id_by_email[email]].append(membership)
+        logger.info(
+            "Queried gear database for %d of %d emails (%.0f emails/second)",
+            i + len(chunk),
+            len(all_emails),
+            (i + len(chunk)) / max(monotonic() - started, 0.001),
+        )
+
+    _update_memberships(
+        {
+            par: geardb.most_recent_membership(memberships_by_user_id[user_id])
+            if user_id in memberships_by_user_id
+            else None
+            for user_id, par in par_by_user_id.items()
+        }
+    )
+
+    elapsed = monotonic() - started
+    logger.info(
+        "Refreshed memberships for %d participants in %.1f seconds (%.0f/second)",
+        len(par_by_user_id),
+        elapsed,
+        len(par_by_user_id) / max(elapsed, 0.001),
+    )
+    return len(par_by_user_id)
+
+
+def _update_memberships(
+    most_recent_by_par: Dict[models.Participant, Optional[geardb.MembershipDict]]
+) -> None:
+    """Cache each participant's most recent membership (if any) in bulk.
+
+    Like `Participant.update_membership`, expiration dates are only ever
+    advanced, never cleared (but the membership is marked as freshly cached).
+    """
+    now = timezone.now()
+    to_update: List[models.Membership] = []
+    to_create: Dict[models.Participant, models.Membership] = {}
+    for par, most_recent in most_recent_by_par.items():
+        acct = par.membership or models.Membership()
+        if most_recent and most_recent['membership']['expires']:
+            acct.membership_expires = most_recent['membership']['expires']
+        if most_recent and most_recent['waiver']['expires']:
+            acct.waiver_expires = most_recent['waiver']['expires']
+        acct.last_cached = now
+        if par.membership:
+            to_update.append(acct)
+        else:
+            to_create[par] = acct
+
+    with transaction.atomic():
+        models.Membership.objects.bulk_update(
+            to_update,
+            ['membership_expires', 'waiver_expires', 'last_cached'],
+            batch_size=1000,
+        )
+        models.Membership.objects.bulk_create(to_create.values(), batch_size=1000)
+        for par, acct in to_create.items():
+            par.membership = acct
+        models.Participant.objects.bulk_update(
+            to_create, ['membership'], batch_size=1000
+        )
 
 
 def update_membership_cache(participant):
@@ -42,6 +42,65 @@ def chair_group(activity_enum):
     return activity_enum.value + '_chair'
 
 
+class PermissionContext:
+    """Everything needed to answer permission questions about one user.
+
+    Group names (and what they imply) are computed just once, so that
+    templates & views can ask about the user's permissions as often as they
+    like while handling a request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.is_authenticated = bool(user and user.is_authenticated)
+        self.is_superuser = self.is_authenticated and user.is_superuser
+        self.groups = user.groups.all() if self.is_authenticated else []
+        # Do this in raw Python to avoid n+1 queries
+        self.group_names = frozenset(g.name for g in self.groups)
+        self._chair_activities = {}
+
+    def in_any_group(self, group_names, allow_superusers=True):
+        if not self.is_authenticated:
+            return False
+        if allow_superusers and self.is_superuser:
+            search_groups = all_group_names()
+        else:
+            search_groups = self.group_names
+        return any(g in group_names for g in search_groups)
+
+    def is_chair(self, activity_enum, allow_superusers=True):
+        if activity_enum is None:  # (e.g. when the required activity is None)
+            return False
+        return self.in_any_group([chair_group(activity_enum)], allow_superusers)
+
+    def chair_activities(self, allow_superusers=False):
+        if allow_superusers not in self._chair_activities:
+            self._chair_activities[allow_superusers] = [
+                activity_enum
+                for activity_enum in enums.Activity
+                if self.is_chair(activity_enum, allow_superusers)
+            ]
+        return self._chair_activities[allow_superusers]
+
+
+def permissions(user) -> PermissionContext:
+    """Return the permission context for the user.
+
+    When the user's groups were prefetched (as `UserMiddleware` does
+    for each request), the context is built only once and reused. Otherwise,
+    groups are queried anew (they may have just changed).
+    """
+    prefetched = getattr(user, '_prefetched_objects_cache', {}).get('groups')
+    if prefetched is None:
+        return PermissionContext(user)
+
+    context = getattr(user, '_permission_context', None)
+    if context is None or context.groups is not prefetched:
+        context = PermissionContext(user)
+        user._permission_context = context  # pylint: disable=protected-access
+    return context
+
+
 def in_any_group(user, group_names, allow_superusers=True):
     """Return if the user belongs to any of the passed groups.
 
@@ -49,15 +108,7 @@ def in_any_group(user, group_names, allow_superusers=True):
     use groups already present on the `user` object, or a cached list of all
     group names. This will reduce needless queries.
     """
-    if not (user and user.is_authenticated):
-        return False
-
-    if allow_superusers and user.is_superuser:
-        search_groups = all_group_names()
-    else:
-        # Do this in raw Python to avoid n+1 queries
-        search_groups = {g.name for g in user.groups.all()}
-    return any(g in group_names for g in search_groups)
+    return permissions(user).in_any_group(group_names, allow_superusers)
 
 
 def make_chair(user, activity_enum):
@@ -74,7 +125,7 @@ def is_chair(user, activity_enum, allow_superusers=True):
     """
     if activity_enum is None:  # (e.g. when the required activity is None)
         return False
-    return in_any_group(user, [chair_group(activity_enum)], allow_superusers)
+    return permissions(user).is_chair(activity_enum, allow_superusers)
 
 
 def chair_or_admin(user, activity_enum):
@@ -93,8 +144,4 @@ def activity_chairs(activity_enum) -> QuerySet[User]:
 
 def chair_activities(user, allow_superusers=False):
     """All activities for which the user is the chair."""
-    return [
-        activity_enum
-        for activity_enum in enums.Activity
-        if is_chair(user, activity_enum, allow_superusers)
-    ]
+    return permissions(user).chair_activities(allow_superusers)
@@ -0,0 +1,60 @@
+"""
+An in-process cache of results for the most common search prefixes.
+
+Autocompletion issues a search on every keystroke, and the first few
+keystrokes (e.g. 'j', 'jo', 'joh') are the same for many searches. Results for
+those prefixes can be reused briefly, without any queries.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Tuple
+
+
+def normalize(text: str) -> str:
+    """Reduce text to the words that are searched (see `Participant.objects.search`)."""
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+class PrefixCache:
+    """A thread-safe LRU cache of search results, each kept for a short while.
+
+    A cache with a `maxsize` of 0 caches nothing.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._results: 'OrderedDict[str, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_search(self, text: str, search: Callable[[str], Any]) -> Any:
+        """Return cached results for the text, else `search(text)` (then cached)."""
+        if self.maxsize <= 0:  # (Caching is disabled)
+            return search(text)
+
+        key = normalize(text)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._results.get(key)
+            if cached and cached[0] > now:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        results = search(text)
+        with self._lock:
+            self._results[key] = (now + self.ttl, results)
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = 0
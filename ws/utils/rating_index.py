@@ -0,0 +1,73 @@
+"""
+Point-in-time lookups of leader ratings.
+
+A leader's rating for an activity changes over the years, and we often need
+the rating they held at some past moment (e.g. the day before each trip they
+led). Rather than scanning every rating on every lookup, ratings are indexed
+once per (participant, activity) in order of creation, then found by bisection.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import ws.utils.dates as date_utils
+
+
+class RatingIndex:
+    """Index leader ratings (any objects shaped like `LeaderRating`) for lookup."""
+
+    def __init__(self, ratings: Iterable) -> None:
+        by_key = defaultdict(list)
+        for rating in ratings:
+            by_key[rating.participant_id, rating.activity].append(
+                (rating.time_created, rating.rating, rating.active)
+            )
+
+        self._times: Dict[Tuple[int, str], List[datetime]] = {}
+        self._ratings: Dict[Tuple[int, str], List[Tuple[str, bool]]] = {}
+        for key, entries in by_key.items():
+            entries.sort(key=lambda entry: entry[0])
+            self._times[key] = [time_created for time_created, _, _ in entries]
+            self._ratings[key] = [(rating, active) for _, rating, active in entries]
+
+    def rating_at(
+        self,
+        participant_id: int,
+        activity: str,
+        must_be_active: bool = True,
+        at_time: Optional[datetime] = None,
+        after_time: Optional[datetime] = None,
+    ) -> Optional[str]:
+        """Return the most recent matching rating (same filters as `ratings()`)."""
+        key = (participant_id, activity)
+        times = self._times.get(key)
+        if not times:
+            return None
+
+        start = bisect_right(times, after_time) if after_time else 0
+        end = bisect_right(times, at_time) if at_time else len(times)
+        ratings = self._ratings[key]
+        for i in range(end - 1, start - 1, -1):
+            rating, active = ratings[i]
+            if active or not must_be_active:
+                return rating
+        return None
+
+    def name_with_rating(self, leader, trip) -> str:
+        """Give the leader's name plus rating at the time of the trip.
+
+        See `Participant.name_with_rating` for details.
+        """
+        required_activity = trip.program_enum.required_activity()
+        if required_activity is None:
+            return leader.name
+
+        day_before = trip.trip_date - timedelta(days=1)
+        rating = self.rating_at(
+            leader.pk,
+            required_activity.value,
+            must_be_active=False,
+            at_time=date_utils.late_at_night(day_before),
+        )
+        return f"{leader.name} ({rating})" if rating else leader.name
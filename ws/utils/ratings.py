@@ -1,5 +1,5 @@
 import functools
-from typing import List, Type
+from typing import Iterable, List, Optional, Tuple, Type
 
 from django import db
 from django.contrib.auth.models import User
@@ -7,6 +7,7 @@ from django.db.models import Case, F, IntegerField, Q, QuerySet, Sum, When
 
 import ws.utils.perms as perm_utils
 from ws import enums, models
+from ws.utils.rating_index import RatingIndex
 
 
 def deactivate_ratings(participant, activity):
@@ -17,6 +18,25 @@ def deactivate_ratings(participant, activity):
         existing.save()
 
 
+def names_with_rating(
+    leaders_and_trips: Iterable[Tuple[models.Participant, Optional[models.Trip]]]
+) -> List[str]:
+    """Give each leader's name plus rating at the time of the trip (if any).
+
+    Ratings for every leader are loaded in just one query, so this should be
+    preferred over `Participant.name_with_rating` when listing many leaders.
+    """
+    pairs = list(leaders_and_trips)
+    leader_ids = {leader.pk for leader, _ in pairs}
+    index = RatingIndex(
+        models.LeaderRating.objects.filter(participant_id__in=leader_ids)
+    )
+    return [
+        index.name_with_rating(leader, trip) if trip else leader.name
+        for leader, trip in pairs
+    ]
+
+
 class LeaderApplicationMixin:
     """Some common tools for interacting with LeaderApplication objects.
 
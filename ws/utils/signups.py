@@ -1,6 +1,9 @@
+from datetime import timedelta
+
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
 
 from ws import models
 
@@ -76,47 +79,124 @@ def trip_or_wait(
             messages.error(request, "Trip is not an open first-come, first-serve trip")
         return signup
 
-    if not trip.open_slots:  # Trip is full, add to the waiting list
-        add_to_waitlist(signup, request, prioritize, top_spot)
-        return signup
+    with transaction.atomic():
+        # Lock the trip, then the signup (as do `SignUp.save` and queue updates)
+        if signup.lock_slot() == trip.pk:  # Placed by a concurrent request
+            signup.on_trip = True
+            return signup
 
-    signup.on_trip = True
-    signup.save()
-    if request:
-        messages.success(request, "Signed up!")
+        if not trip.reserve_slot():  # Trip is full, add to the waiting list
+            add_to_waitlist(signup, request, prioritize, top_spot)
+            return signup
 
-    # Since the participant is now on the trip, we should be sure to remove any waitlist
-    try:
-        signup.waitlistsignup.delete()
-    except models.WaitListSignup.DoesNotExist:
-        pass
+        signup.on_trip = True
+        signup.save(slot_reserved=True)
+
+        # Since the participant is now on the trip, be sure to remove any waitlist
+        try:
+            signup.waitlistsignup.delete()
+        except models.WaitListSignup.DoesNotExist:
+            pass
 
+    if request:
+        messages.success(request, "Signed up!")
     return signup
 
 
+@transaction.atomic
 def update_queues_if_trip_open(trip):
     """Update queues if the trip is an open, first-come, first-serve trip.
 
     This is intended to be used when the trip size changes (either from changing
     the maximum participants, or from somebody else dropping off).
+
+    However many signups move, this takes a fixed number of queries.
     """
     if not (trip.signups_open and trip.algorithm == 'fcfs'):
         return
 
-    on_trip = trip.signup_set.filter(on_trip=True)
-    diff = trip.maximum_participants - on_trip.count()
+    # Lock the trip so that new signups wait until the queues are settled.
+    # (Always before any signups, like `SignUp.lock_slot`, to avoid deadlocks)
+    locked_trip = models.Trip.objects.select_for_update().get(pk=trip.pk)
+    diff = locked_trip.maximum_participants - locked_trip.on_trip_count
 
-    waitlisted = models.WaitListSignup.objects.filter(signup__trip=trip)
     if diff > 0:  # Trip is growing, add waitlisted participants if applicable
-        for waitlist_signup in waitlisted[:diff]:
-            trip_or_wait(waitlist_signup.signup)
+        _promote_from_waitlist(trip, diff)
     elif diff < 0:  # Trip is shrinking, move lowest signups to waitlist
-        for _ in range(abs(diff)):
-            last = trip.signup_set.filter(on_trip=True).last()
-            last.on_trip = False
-            last.save()
-            # Make sure they're at the top!
-            add_to_waitlist(last, prioritize=True, top_spot=True)
+        _demote_to_waitlist(trip, abs(diff))
+
+
+def _ordered_by_time(signup_pks, now):
+    """Give each signup a distinct `last_updated`, preserving the given order.
+
+    Signups on a trip are ordered by when they were last updated.
+    """
+    return Case(
+        *(
+            When(pk=pk, then=Value(now + timedelta(microseconds=i)))
+            for i, pk in enumerate(signup_pks)
+        )
+    )
+
+
+def _promote_from_waitlist(trip, num_slots):
+    """Move the first signups on the waitlist onto the trip."""
+    promoted = list(
+        models.SignUp.objects.filter(waitlistsignup__waitlist__trip=trip)
+        .order_by(
+            F('waitlistsignup__manual_order').desc(nulls_last=True),
+            F('waitlistsignup__time_created').asc(),
+        )
+        .values_list('pk', flat=True)[:num_slots]
+    )
+    if not promoted:
+        return
+
+    models.SignUp.objects.filter(pk__in=promoted).update(
+        on_trip=True, last_updated=_ordered_by_time(promoted, timezone.now())
+    )
+    models.WaitListSignup.objects.filter(signup_id__in=promoted).delete()
+    models.Trip.objects.filter(pk=trip.pk).update(
+        on_trip_count=F('on_trip_count') + len(promoted)
+    )
+
+
+def _demote_to_waitlist(trip, num_signups):
+    """Move the last signups on the trip to the top of the waitlist.
+
+    Demoted signups keep their order relative to one another (the last on the
+    trip is the last of them on the waitlist).
+    """
+    demoted = list(
+        trip.signup_set.filter(on_trip=True)
+        .reverse()
+        .values_list('pk', flat=True)[:num_signups]
+    )
+    if not demoted:
+        return
+
+    waitlist = trip.waitlist
+    first = waitlist.waitlistsignup_set.exclude(signup_id__in=demoted).first()
+    first_of_priority = 10 if first is None else (first.manual_order or 0) + 1
+    top_position = 0 if first is None else first.position
+
+    models.SignUp.objects.filter(pk__in=demoted).update(
+        on_trip=False,
+        last_updated=_ordered_by_time(demoted, timezone.now()),
+    )
+    models.WaitListSignup.objects.filter(signup_id__in=demoted).delete()
+    models.WaitListSignup.objects.bulk_create(
+        models.WaitListSignup(
+            signup_id=pk,
+            waitlist=waitlist,
+            manual_order=first_of_priority + i,
+            position=top_position - (i + 1) * models.WaitListSignup.POSITION_GAP,
+        )
+        for i, pk in enumerate(demoted)
+    )
+    models.Trip.objects.filter(pk=trip.pk).update(
+        on_trip_count=F('on_trip_count') - len(demoted)
+    )
 
 
 def non_trip_participants(trip):
@@ -384,7 +384,6 @@ class LeaderApplicationView(ApplicationManager, FormMixin, DetailView):  # type:
             models.Feedback.everything.filter(participant=self.object.participant)
             .exclude(participant=self.chair)
             .select_related('leader', 'trip')
-            .prefetch_related('leader__leaderrating_set')
             .annotate(
                 display_date=Least('trip__trip_date', Cast('time_created', DateField()))
             )
@@ -392,7 +392,6 @@ class ParticipantView(
         context['participant'] = participant
         if not user_viewing:
             feedback = participant.feedback_set.select_related('trip', 'leader')
-            feedback = feedback.prefetch_related('leader__leaderrating_set')
             context['all_feedback'] = feedback
         context['ratings'] = participant.ratings(must_be_active=True)
 
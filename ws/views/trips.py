@@ -4,7 +4,6 @@ Trip views.
 A "trip" is any official trip registered in the system - created by leaders, to be
 attended by any interested participants.
 """
-from collections import defaultdict
 from datetime import date, timedelta
 
 from django.contrib import messages
@@ -31,7 +30,6 @@ from ws.lottery.run import SingleTripLotteryRunner
 from ws.mixins import TripLeadersOnlyView
 from ws.templatetags.trip_tags import annotated_for_trip_list
 from ws.utils.dates import is_currently_iap, local_date
-from ws.utils.geardb import outstanding_items
 
 
 class TripView(DetailView):
@@ -59,43 +57,6 @@ class TripView(DetailView):
         trip = trip or self.get_object()
         return self.request.participant.signup_set.filter(trip=trip).first()
 
-    @staticmethod
-    def rentals_by_participant(trip):
-        """Yield all items rented by leaders & participants on this trip.
-
-        WARNING: This makes an API call and can block page load.
-        We should probably make this method into its own view, or instead make
-        a frontend component do the fetching asynchronously.
-
-        Alternately, we could introduce a caching layer to make this viable hitting
-        the database directly (like we do with the Membership model).
-        """
-        on_trip = trip.signup_set.filter(on_trip=True).select_related('participant')
-        trip_participants = [s.participant for s in on_trip]
-        leaders = list(trip.leaders.all())
-
-        par_by_user_id = {par.user_id: par for par in trip_participants + leaders}
-        if not par_by_user_id:  # No leaders or participants on the trip
-            return
-
-        emails = models.EmailAddress.objects.filter(
-            verified=True, user_id__in=par_by_user_id
-        )
-        participant_by_email = {
-            addr.email: par_by_user_id[addr.user_id] for addr in emails
-        }
-        gear_per_participant = defaultdict(list)
-        for item in outstanding_items(list(participant_by_email)):
-            if item.checkedout > trip.trip_date:
-                continue  # This item definitely wasn't rented for the trip
-            participant = participant_by_email[item.email]
-            gear_per_participant[participant].append(item)
-
-        # Yield in order of leaders & default signup ordering
-        for par in leaders + trip_participants:
-            if par in gear_per_participant:
-                yield par, gear_per_participant[par]
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
         trip = self.object
@@ -107,15 +68,11 @@ class TripView(DetailView):
             self.request.user, trip.required_activity_enum()
         )
 
+        # (Rentals are loaded separately; see `TripRentalsView`)
         context['can_see_rentals'] = context['can_admin'] or perm_utils.is_leader(
             self.request.user
         )
 
-        if context['can_admin'] or perm_utils.is_leader(self.request.user):
-            context['show_rentals_inline'] = 'show_rentals_inline' in self.request.GET
-            if context['show_rentals_inline']:
-                context['rentals_by_par'] = list(self.rentals_by_participant(trip))
-
         return context
 
     def post(self, request, *args, **kwargs):